@@ -4,3 +4,12 @@ from django.apps import AppConfig
 class BlogappConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "blogapp"
+
+    def ready(self):
+        from mysite import model_versions
+        from .models import Article, Author, Category, Tag
+
+        model_versions.register(Category)
+        model_versions.register(Tag)
+        model_versions.register(Author, depends_on=[Article])
+        model_versions.register(Article, depends_on=[Author, Category, Tag])
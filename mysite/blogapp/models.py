@@ -34,6 +34,7 @@ class Article(models.Model):
     title = models.CharField(verbose_name=gettext_lazy("Заголовок"), max_length=200)
     content = models.TextField(verbose_name=gettext_lazy("Содержание"))
     pub_date = models.DateTimeField(verbose_name=gettext_lazy("Дата создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name=gettext_lazy("Дата изменения"), auto_now=True, db_index=True)
     author = models.ForeignKey(
         Author,
         verbose_name=gettext_lazy("Автор"),
@@ -43,11 +44,13 @@ class Article(models.Model):
     category = models.ForeignKey(
         Category,
         verbose_name=gettext_lazy("Категория"),
-        on_delete=models.CASCADE
+        on_delete=models.CASCADE,
+        related_name="articles",
     )
     tags = models.ManyToManyField(
         Tag,
-        verbose_name=gettext_lazy("Теги")
+        verbose_name=gettext_lazy("Теги"),
+        related_name="articles",
     )
     created_by = models.ForeignKey(
         User,
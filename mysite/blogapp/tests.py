@@ -1,3 +1,71 @@
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils.translation import override
 
-# Create your tests here.
+from mysite.querycount import QueryBudgetExceeded, query_budget
+
+from .models import Article, Author, Category, Tag
+
+
+class BlogListViewsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = User.objects.create_user(username='test_user', password='test_password')
+        tags = Tag.objects.bulk_create([Tag(name=f'Тег {index}') for index in range(3)])
+        for index in range(5):
+            author = Author.objects.create(name=f'Автор {index}')
+            category = Category.objects.create(name=f'Категория {index}')
+            article = Article.objects.create(
+                title=f'Статья {index}', content='Текст', author=author, category=category, created_by=user,
+            )
+            article.tags.set(tags)
+
+    def test_list_views_fit_query_budget(self):
+        # Бюджеты представлений проверяются декоратором query_budget.
+        for name in ('authors', 'category', 'tags', 'articles'):
+            with self.subTest(name=name), override('ru'):
+                response = self.client.get(reverse(f'blogapp:{name}'))
+                self.assertEqual(response.status_code, 200)
+                self.assertContains(response, 'Статья 4')
+
+    def test_article_detail_conditional_get(self):
+        article = Article.objects.get(title='Статья 0')
+        with override('ru'):
+            url = reverse('blogapp:article_detail', kwargs={'pk': article.pk})
+        response = self.client.get(url)
+        self.assertContains(response, 'Статья 0')
+        self.assertTrue(response.has_header('Last-Modified'))
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+        article.title = 'Статья 0 (новая)'
+        article.save()
+        response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertContains(response, 'Статья 0 (новая)')
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_related_save_invalidates_article_list(self):
+        cache.clear()
+        with override('ru'):
+            url = reverse('blogapp:articles')
+        self.assertContains(self.client.get(url), 'Автор 0')
+        with self.assertNumQueries(0):
+            self.assertContains(self.client.get(url), 'Автор 0')
+        author = Author.objects.get(name='Автор 0')
+        author.name = 'Автор 0 (новый)'
+        with self.captureOnCommitCallbacks(execute=True):
+            author.save()
+        self.assertContains(self.client.get(url), 'Автор 0 (новый)')
+
+    def test_n_plus_one_is_detected(self):
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'N+1'):
+            with query_budget(10):
+                for article in Article.objects.all():
+                    article.author.name
+        with self.assertRaisesMessage(QueryBudgetExceeded, 'бюджете 1'):
+            with query_budget(1):
+                list(Article.objects.select_related('author'))
+                list(Tag.objects.all())
@@ -1,5 +1,6 @@
+from functools import partial
+
 from django.contrib.auth.mixins import LoginRequiredMixin
-from django.contrib.syndication.views import Feed
 from django.urls import reverse_lazy, reverse
 from django.views.generic import (
     CreateView,
@@ -7,10 +8,16 @@ from django.views.generic import (
     DetailView,
     ListView,
 )
+
+from mysite.conditional import conditional_response
+from mysite.feeds import AsyncFeed
+from mysite.querycount import query_budget
+
 from .models import Author, Category, Tag, Article
 from .forms import AuthorForm, CategoryForm, TagForm, ArticleForm
 
 
+@query_budget(4)
 class AuthorListView(ListView):
     template_name = "blogapp/author-list.html"
     queryset = (
@@ -33,6 +40,7 @@ class AuthorDetailView(DetailView):
     context_object_name = "author"
 
 
+@query_budget(4)
 class CategoryListView(ListView):
     template_name = "blogapp/category-list.html"
     queryset = (
@@ -49,6 +57,7 @@ class CategoryCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy("blogapp:category")
 
 
+@query_budget(4)
 class TagListView(ListView):
     template_name = "blogapp/tag-list.html"
     queryset = (
@@ -66,6 +75,7 @@ class TagCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy("blogapp:tags")
 
 
+@query_budget(5)
 class ArticleListView(ListView):
     template_name = "blogapp/article-list.html"
     queryset = (
@@ -78,13 +88,11 @@ class ArticleListView(ListView):
     context_object_name = "articles"
 
 
-class LatestArticleView(Feed):
+class LatestArticleView(AsyncFeed):
     title = "Статьи в блоге"
     description = "обновленная информация об изменениях и дополнениях в статьях блога"
     link = reverse_lazy("blogapp:articles")
-
-    def items(self):
-        return Article.objects.order_by('-pub_date')[:5]
+    queryset = Article.objects.only("pk", "title", "content").order_by('-pub_date')[:5]
 
     def item_title(self, item):
         return item.title
@@ -100,6 +108,7 @@ class ArticleCreateView(LoginRequiredMixin, CreateView):
     success_url = reverse_lazy("blogapp:articles")
 
 
+@query_budget(4)
 class ArticleDetailView(DetailView):
     template_name = "blogapp/article-detail.html"
     queryset = (
@@ -109,6 +118,13 @@ class ArticleDetailView(DetailView):
     model = Article
     context_object_name = "article"
 
+    def get(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            Article.objects.filter(pk=kwargs["pk"]),
+            partial(super().get, request, *args, **kwargs),
+        )
+
 
 class ArticleDeleteView(LoginRequiredMixin, DeleteView):
     template_name = "blogapp/article-delete.html"
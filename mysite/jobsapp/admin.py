@@ -0,0 +1,38 @@
+from django.contrib import admin
+from django.db.models import QuerySet
+from django.http import HttpRequest
+from django.urls import reverse
+from django.utils.html import format_html
+
+from .models import Job
+
+
+@admin.action(description="Повторить задачу")
+def requeue(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
+    queryset.exclude(status=Job.Status.RUNNING).update(status=Job.Status.QUEUED, message="", worker="")
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    actions = [
+        requeue,
+    ]
+    list_display = "id", "kind", "status", "created_by", "created_at", "finished_at", "result_link"
+    list_filter = "status", "kind"
+    readonly_fields = (
+        "kind", "params", "status", "message", "result_link", "created_by",
+        "worker", "attempts", "created_at", "started_at", "finished_at",
+    )
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related("created_by")
+
+    def has_add_permission(self, request):
+        return False
+
+    def result_link(self, obj: Job):
+        if not obj.result:
+            return "—"
+        return format_html('<a href="{}">{}</a>', reverse("jobsapp:job-download", kwargs={"pk": obj.pk}), "Скачать")
+
+    result_link.short_description = "result"
@@ -0,0 +1,25 @@
+from django.apps import AppConfig
+from django.utils.module_loading import autodiscover_modules
+
+
+class JobsappConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "jobsapp"
+
+    def ready(self):
+        from mysite import media
+
+        autodiscover_modules("jobs")
+        media.protect("jobs/", can_download_job_file)
+
+
+def can_download_job_file(user, name: str) -> bool:
+    """
+    Файлы задач, сохраненные в MEDIA_ROOT до переноса в JOB_FILES_ROOT:
+    результат доступен автору задачи, остальное - только персоналу.
+    """
+    from .models import Job
+
+    if not user.is_authenticated:
+        return False
+    return user.is_staff or Job.objects.filter(result=name, created_by=user).exists()
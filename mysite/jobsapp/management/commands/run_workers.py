@@ -0,0 +1,64 @@
+import logging
+import signal
+import socket
+from datetime import timedelta
+from multiprocessing import Event, Process
+from os import getpid
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from jobsapp.worker import requeue_stale_jobs, run_next
+
+
+logger = logging.getLogger(__name__)
+
+
+def work(index: int, poll_interval: float, stop) -> None:
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    worker = f"{socket.gethostname()}:{getpid()}:{index}"
+    logger.info("Обработчик %s запущен", worker)
+    while not stop.is_set():
+        close_old_connections()
+        if run_next(worker) is None:
+            stop.wait(poll_interval)
+    logger.info("Обработчик %s остановлен", worker)
+
+
+class Command(BaseCommand):
+    """
+    Запуск процессов, выполняющих фоновые задачи из таблицы jobsapp_job.
+    """
+    help = "Запуск обработчиков фоновых задач"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=2, help="Число процессов-обработчиков")
+        parser.add_argument("--poll-interval", type=float, default=1.0,
+                            help="Пауза между опросами пустой очереди, секунды")
+        parser.add_argument("--stale-after", type=int, default=3600,
+                            help="Через сколько секунд задача в статусе running считается брошенной")
+
+    def handle(self, *args, **options):
+        requeued = requeue_stale_jobs(timedelta(seconds=options["stale_after"]))
+        if requeued:
+            self.stdout.write(f"Возвращено в очередь задач: {requeued}")
+
+        stop = Event()
+        # Каждый процесс открывает собственное соединение с базой.
+        connections.close_all()
+        processes = [
+            Process(target=work, args=(index, options["poll_interval"], stop), daemon=True)
+            for index in range(options["workers"])
+        ]
+        for process in processes:
+            process.start()
+        self.stdout.write(self.style.SUCCESS(f"Запущено обработчиков: {len(processes)}"))
+
+        def shutdown(signum, frame):
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shutdown)
+        signal.signal(signal.SIGINT, shutdown)
+        for process in processes:
+            process.join()
+        self.stdout.write(self.style.SUCCESS("Обработчики остановлены"))
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:47
+
+import jobsapp.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("jobsapp", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="job",
+            name="result",
+            field=models.FileField(
+                blank=True,
+                null=True,
+                storage=jobsapp.storage.JobFileStorage(),
+                upload_to=jobsapp.storage.job_result_path,
+                verbose_name="Результат",
+            ),
+        ),
+    ]
@@ -0,0 +1,75 @@
+from tempfile import TemporaryFile
+from typing import Iterable, Union
+
+from django.contrib.auth.models import User
+from django.core.files import File
+from django.db import models
+from django.utils.translation import gettext_lazy
+
+from .storage import job_result_path, job_storage
+
+
+class Job(models.Model):
+    """
+    Фоновая задача: импорт, выгрузка и другие долгие операции,
+    которые выполняются процессами run_workers вне цикла запрос/ответ.
+
+    Обработчики задач регистрируются в модулях jobs.py приложений.
+    """
+    objects = None
+
+    class Status(models.TextChoices):
+        QUEUED = "queued", gettext_lazy("В очереди")
+        RUNNING = "running", gettext_lazy("Выполняется")
+        DONE = "done", gettext_lazy("Выполнена")
+        FAILED = "failed", gettext_lazy("Ошибка")
+
+    class Meta:
+        ordering = ["-created_at"]
+        indexes = [
+            models.Index(fields=["status", "created_at"]),
+        ]
+
+    kind = models.CharField(verbose_name=gettext_lazy("Тип задачи"), max_length=100)
+    params = models.JSONField(verbose_name=gettext_lazy("Параметры"), default=dict, blank=True)
+    status = models.CharField(
+        verbose_name=gettext_lazy("Статус"),
+        max_length=10,
+        choices=Status.choices,
+        default=Status.QUEUED,
+    )
+    message = models.TextField(verbose_name=gettext_lazy("Сообщение"), blank=True)
+    result = models.FileField(
+        verbose_name=gettext_lazy("Результат"),
+        null=True,
+        blank=True,
+        upload_to=job_result_path,
+        storage=job_storage,
+    )
+    created_by = models.ForeignKey(
+        User,
+        verbose_name=gettext_lazy("Пользователь"),
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="jobs",
+    )
+    worker = models.CharField(verbose_name=gettext_lazy("Обработчик"), max_length=100, blank=True)
+    attempts = models.PositiveSmallIntegerField(verbose_name=gettext_lazy("Попытки"), default=0)
+    created_at = models.DateTimeField(verbose_name=gettext_lazy("Время создания"), auto_now_add=True)
+    started_at = models.DateTimeField(verbose_name=gettext_lazy("Время запуска"), null=True, blank=True)
+    finished_at = models.DateTimeField(verbose_name=gettext_lazy("Время завершения"), null=True, blank=True)
+
+    def save_result(self, filename: str, chunks: Iterable[Union[str, bytes]]) -> None:
+        """
+        Записывает результат задачи по частям через временный файл,
+        не собирая его в памяти целиком.
+        """
+        with TemporaryFile() as tmp:
+            for chunk in chunks:
+                tmp.write(chunk.encode() if isinstance(chunk, str) else chunk)
+            tmp.seek(0)
+            self.result.save(filename, File(tmp), save=False)
+
+    def __str__(self) -> str:
+        return f"[{self.id}] {gettext_lazy('Задача')} — {self.kind!r} ({self.get_status_display()})"
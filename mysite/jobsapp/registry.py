@@ -0,0 +1,42 @@
+"""
+Реестр обработчиков фоновых задач.
+
+Обработчик — функция, которая принимает задачу, при необходимости
+сохраняет результат через job.save_result и возвращает текст итога:
+
+    @register("shopapp.export_orders", api=True)
+    def export_orders(job: Job) -> str:
+        ...
+"""
+from typing import Callable, Dict, NamedTuple, Optional
+
+from django.contrib.auth.models import User
+
+from .models import Job
+
+
+class JobHandler(NamedTuple):
+    func: Callable[[Job], Optional[str]]
+    api: bool
+    staff_only: bool
+
+
+handlers: Dict[str, JobHandler] = {}
+
+
+def register(kind: str, api: bool = False, staff_only: bool = True):
+    """
+    Регистрирует обработчик задачи kind.
+    api — задачу можно поставить через API, staff_only — только сотрудникам.
+    """
+    def decorator(func: Callable[[Job], Optional[str]]):
+        handlers[kind] = JobHandler(func, api, staff_only)
+        return func
+
+    return decorator
+
+
+def enqueue(kind: str, params: Optional[dict] = None, user: Optional[User] = None) -> Job:
+    if kind not in handlers:
+        raise KeyError(f"Неизвестный тип задачи: {kind}")
+    return Job.objects.create(kind=kind, params=params or {}, created_by=user)
@@ -0,0 +1,43 @@
+from rest_framework import serializers
+from rest_framework.reverse import reverse
+
+from .models import Job
+from .registry import handlers
+
+
+class JobSerializer(serializers.ModelSerializer):
+    result = serializers.SerializerMethodField(help_text="Адрес загрузки результата")
+
+    class Meta:
+        model = Job
+        fields = (
+            "pk",
+            "kind",
+            "params",
+            "status",
+            "message",
+            "result",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+        read_only_fields = (
+            "status",
+            "message",
+            "result",
+            "created_at",
+            "started_at",
+            "finished_at",
+        )
+
+    def get_result(self, job: Job):
+        if not job.result:
+            return None
+        return reverse("jobsapp:job-download", kwargs={"pk": job.pk}, request=self.context.get("request"))
+
+    def validate_kind(self, kind: str) -> str:
+        handler = handlers.get(kind)
+        user = self.context["request"].user
+        if handler is None or not handler.api or (handler.staff_only and not user.is_staff):
+            raise serializers.ValidationError("Этот тип задачи нельзя поставить через API")
+        return kind
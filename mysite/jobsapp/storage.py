@@ -0,0 +1,52 @@
+"""
+Хранилище файлов фоновых задач: загруженные CSV и результаты.
+
+Файлы лежат вне MEDIA_ROOT (JOB_FILES_ROOT) и не имеют публичного адреса:
+результат отдает только действие download API задач с проверкой владельца.
+Имена содержат случайный каталог, поэтому их нельзя угадать по типу задачи.
+"""
+import secrets
+from os.path import basename
+
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+from django.utils.functional import cached_property
+
+
+@deconstructible(path="jobsapp.storage.JobFileStorage")
+class JobFileStorage(FileSystemStorage):
+    """
+    FileSystemStorage с корнем JOB_FILES_ROOT вместо MEDIA_ROOT.
+    """
+    @cached_property
+    def base_location(self):
+        return self._value_or_setting(self._location, settings.JOB_FILES_ROOT)
+
+    def _clear_cached_properties(self, setting, **kwargs):
+        super()._clear_cached_properties(setting, **kwargs)
+        if setting == "JOB_FILES_ROOT":
+            self.__dict__.pop("base_location", None)
+            self.__dict__.pop("location", None)
+
+    def url(self, name):
+        raise ValueError("Файлы задач отдаются только через API задач")
+
+
+job_storage = JobFileStorage()
+
+
+def private_name(folder: str, filename: str) -> str:
+    return f"{folder}/{secrets.token_urlsafe(16)}/{basename(filename)}"
+
+
+def job_result_path(instance, filename: str) -> str:
+    return private_name("results", filename)
+
+
+def save_job_input(file: File) -> str:
+    """
+    Сохраняет загруженный файл для задачи импорта и возвращает его имя.
+    """
+    return job_storage.save(private_name("inputs", file.name), file)
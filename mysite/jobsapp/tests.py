@@ -0,0 +1,89 @@
+import json
+import shutil
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from shopapp.models import Order, Product
+
+from .models import Job
+from .registry import enqueue, register
+from .storage import job_storage
+from .worker import run_next
+
+
+@register("jobsapp.tests.failing")
+def failing_job(job: Job) -> str:
+    raise RuntimeError("Сбой")
+
+
+class JobQueueTestCase(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.media_root = tempfile.mkdtemp()
+        cls.settings_override = override_settings(MEDIA_ROOT=cls.media_root, JOB_FILES_ROOT=cls.media_root)
+        cls.settings_override.enable()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.settings_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+        super().tearDownClass()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', password='test_password', is_staff=True)
+        cls.user = User.objects.create_user(username='user', password='test_password')
+        product = Product.objects.create(name='Product Name', price='100', created_by=cls.staff)
+        order = Order.objects.create(delivery_address='TestStreet', user=cls.user)
+        order.products.add(product)
+
+    def test_enqueue_run_and_download(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('jobsapp:job-list'), {'kind': 'shopapp.export_user_orders'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        job_url = reverse('jobsapp:job-detail', kwargs={'pk': response.json()['pk']})
+        self.assertEqual(self.client.get(job_url).json()['status'], Job.Status.QUEUED)
+
+        run_next('test-worker')
+
+        data = self.client.get(job_url).json()
+        self.assertEqual(data['status'], Job.Status.DONE)
+        download_url = reverse('jobsapp:job-download', kwargs={'pk': data['pk']})
+        self.assertTrue(data['result'].endswith(download_url))
+        job = Job.objects.get(pk=data['pk'])
+        self.assertNotEqual(job.result.name, 'results/user-orders-export.json')
+
+        self.client.force_login(User.objects.create_user(username='other', password='test_password'))
+        self.assertEqual(self.client.get(download_url).status_code, 404)
+        self.client.force_login(self.user)
+        response = self.client.get(download_url)
+        data = json.loads(b''.join(response.streaming_content))
+        self.assertEqual(data['orders'][0]['delivery_address'], 'TestStreet')
+        self.assertEqual(data['orders'][0]['products'][0]['name'], 'Product Name')
+
+    def test_staff_only_kind_is_rejected_for_user(self):
+        self.client.force_login(self.user)
+        response = self.client.post(reverse('jobsapp:job-list'), {'kind': 'shopapp.export_orders'},
+                                    content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_failed_job_keeps_error(self):
+        job = enqueue('jobsapp.tests.failing', user=self.staff)
+        run_next('test-worker')
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.Status.FAILED)
+        self.assertIn('Сбой', job.message)
+        self.assertEqual(job.attempts, 1)
+
+    def test_import_input_is_deleted_after_failure(self):
+        path = job_storage.save('inputs/broken.csv', ContentFile(b'\xff\xfe'))
+        enqueue('shopapp.import_orders_csv', {'path': path, 'encoding': 'utf-8'}, user=self.staff)
+        run_next('test-worker')
+        self.assertEqual(Job.objects.get().status, Job.Status.FAILED)
+        self.assertFalse(job_storage.exists(path))
@@ -0,0 +1,13 @@
+from django.urls import include, path
+from rest_framework.routers import DefaultRouter
+
+from .views import JobSetView
+
+app_name = "jobsapp"
+
+routers = DefaultRouter()
+routers.register("jobs", JobSetView)
+
+urlpatterns = [
+    path("", include(routers.urls)),
+]
@@ -0,0 +1,45 @@
+from django.http import FileResponse, Http404
+from drf_spectacular.utils import extend_schema
+from rest_framework import mixins
+from rest_framework.decorators import action
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.request import Request
+from rest_framework.viewsets import GenericViewSet
+
+from .models import Job
+from .serializers import JobSerializer
+
+
+@extend_schema(description="Постановка фоновых задач и получение их результатов")
+class JobSetView(mixins.CreateModelMixin,
+                 mixins.ListModelMixin,
+                 mixins.RetrieveModelMixin,
+                 GenericViewSet):
+    """
+    Класс набора представлений фоновых задач:
+    постановка в очередь, опрос статуса и загрузка результата.
+    Пользователь видит только свои задачи, сотрудник — все.
+    """
+    queryset = Job.objects.all()
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if not self.request.user.is_staff:
+            queryset = queryset.filter(created_by=self.request.user)
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(created_by=self.request.user)
+
+    @action(methods=["get"], detail=True)
+    def download(self, request: Request, pk=None):
+        job = self.get_object()
+        if job.status != Job.Status.DONE or not job.result:
+            raise Http404("Результат задачи еще не готов")
+        try:
+            result = job.result.open("rb")
+        except FileNotFoundError:
+            raise Http404("Файл результата удален")
+        return FileResponse(result, as_attachment=True)
@@ -0,0 +1,75 @@
+"""
+Выполнение фоновых задач.
+
+Задача захватывается условным UPDATE ... WHERE status = 'queued':
+из нескольких процессов его выполнит только один, поэтому внешний
+брокер и блокировки строк не нужны.
+"""
+import logging
+from datetime import timedelta
+from typing import Optional
+
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+from .registry import handlers
+
+
+logger = logging.getLogger(__name__)
+
+
+def claim_job(worker: str) -> Optional[Job]:
+    while True:
+        job_id = (
+            Job.objects
+            .filter(status=Job.Status.QUEUED)
+            .order_by("created_at", "pk")
+            .values_list("pk", flat=True)
+            .first()
+        )
+        if job_id is None:
+            return None
+        claimed = Job.objects.filter(pk=job_id, status=Job.Status.QUEUED).update(
+            status=Job.Status.RUNNING,
+            worker=worker,
+            started_at=timezone.now(),
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=job_id)
+
+
+def run_job(job: Job) -> Job:
+    handler = handlers.get(job.kind)
+    try:
+        if handler is None:
+            raise LookupError(f"Обработчик задачи {job.kind!r} не зарегистрирован")
+        job.message = handler.func(job) or ""
+        job.status = Job.Status.DONE
+    except Exception as exc:
+        logger.exception("Задача %s завершилась с ошибкой", job.pk)
+        job.status = Job.Status.FAILED
+        job.message = f"{type(exc).__name__}: {exc}"
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "message", "result", "finished_at"])
+    logger.info("Задача %s (%s): %s", job.pk, job.kind, job.status)
+    return job
+
+
+def run_next(worker: str) -> Optional[Job]:
+    job = claim_job(worker)
+    if job is not None:
+        run_job(job)
+    return job
+
+
+def requeue_stale_jobs(older_than: timedelta) -> int:
+    """
+    Возвращает в очередь задачи, оставшиеся в статусе running
+    после аварийного завершения обработчика.
+    """
+    return Job.objects.filter(
+        status=Job.Status.RUNNING,
+        started_at__lt=timezone.now() - older_than,
+    ).update(status=Job.Status.QUEUED, worker="")
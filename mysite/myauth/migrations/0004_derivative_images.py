@@ -0,0 +1,27 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:25
+
+import myauth.models
+import mysite.images
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("myauth", "0003_alter_profile_bio"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="profile",
+            name="avatar",
+            field=mysite.images.DerivativeImageField(
+                blank=True,
+                null=True,
+                upload_to=myauth.models.profile_preview_directory_path,
+                verbose_name="Аватар пользователя",
+            ),
+        ),
+    ]
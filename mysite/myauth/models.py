@@ -1,6 +1,7 @@
 from django.contrib.auth.models import User
 from django.db import models
-from django_resized import ResizedImageField
+
+from mysite.images import DerivativeImageField
 
 
 def profile_preview_directory_path(instance: "Profile", filename: str) -> str:
@@ -12,5 +13,5 @@ class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile_user")
     bio = models.TextField(verbose_name="О себе", max_length=300, null=True, blank=True)
     agreement = models.BooleanField(default=False)
-    avatar = ResizedImageField(verbose_name="Аватар пользователя", null=True, blank=True,
-                               upload_to=profile_preview_directory_path)
+    avatar = DerivativeImageField(verbose_name="Аватар пользователя", null=True, blank=True,
+                                  upload_to=profile_preview_directory_path)
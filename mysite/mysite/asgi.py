@@ -11,6 +11,8 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from mysite.staticfiles import StaticFilesASGIHandler
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
-application = get_asgi_application()
+application = StaticFilesASGIHandler(get_asgi_application())
@@ -0,0 +1,306 @@
+"""
+Кэш в файле SQLite в режиме WAL, общий для всех процессов gunicorn на хосте.
+
+Чтения не блокируют друг друга и запись, страницы файла отображаются
+в память (mmap), поэтому get обходится без обращения к диску.
+Объем кэша ограничен MAX_BYTES: при превышении сначала удаляются
+просроченные записи, затем давно не читавшиеся (LRU). Время последнего
+чтения обновляется не чаще раза в ACCESS_RESOLUTION секунд, чтобы get
+почти никогда не требовал блокировки на запись.
+
+Пример настройки:
+
+    CACHES = {
+        "default": {
+            "BACKEND": "mysite.cache_backends.SQLiteCache",
+            "LOCATION": "/app/database/cache.sqlite3",
+            "OPTIONS": {"MAX_BYTES": 64 * 1024 * 1024},
+        },
+    }
+"""
+import pickle
+import sqlite3
+from os import getpid
+from time import time
+from typing import Any, Dict, List, Optional
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS cache (
+        key TEXT PRIMARY KEY,
+        value BLOB NOT NULL,
+        expires REAL,
+        accessed REAL NOT NULL,
+        size INTEGER NOT NULL
+    ) WITHOUT ROWID
+    """,
+    "CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)",
+    "CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires) WHERE expires IS NOT NULL",
+    "CREATE TABLE IF NOT EXISTS cache_stats (id INTEGER PRIMARY KEY CHECK (id = 1), total INTEGER NOT NULL)",
+    "INSERT OR IGNORE INTO cache_stats (id, total) VALUES (1, 0)",
+    # Общий объем считается триггерами, чтобы не суммировать таблицу при каждой записи.
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_size_insert AFTER INSERT ON cache BEGIN
+        UPDATE cache_stats SET total = total + new.size WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_size_delete AFTER DELETE ON cache BEGIN
+        UPDATE cache_stats SET total = total - old.size WHERE id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS cache_size_update AFTER UPDATE OF size ON cache BEGIN
+        UPDATE cache_stats SET total = total - old.size + new.size WHERE id = 1;
+    END
+    """,
+]
+
+ALIVE = "(expires IS NULL OR expires > ?)"
+
+
+class SQLiteCache(BaseCache):
+    """
+    Кэш Django поверх SQLite WAL.
+
+    Атрибуты:
+    location: String - Путь к файлу базы кэша
+    max_bytes: Integer - Предельный суммарный размер значений
+    cull_target: Float - До какой доли max_bytes освобождается место
+    access_resolution: Float - Точность времени последнего чтения для LRU, секунды
+    """
+    evict_batch = 64
+
+    def __init__(self, location: str, params: Dict[str, Any]):
+        super().__init__(params)
+        options = params.get("OPTIONS", {})
+        self.location = str(location)
+        self.max_bytes = int(options.get("MAX_BYTES", DEFAULT_MAX_BYTES))
+        self.cull_target = float(options.get("CULL_TARGET", 0.9))
+        self.access_resolution = float(options.get("ACCESS_RESOLUTION", 10))
+        self.busy_timeout = int(options.get("BUSY_TIMEOUT", 5000))
+        self.mmap_size = int(options.get("MMAP_SIZE", 256 * 1024 * 1024))
+        self._connection: Optional[sqlite3.Connection] = None
+        self._pid: Optional[int] = None
+
+    # Соединение
+
+    @property
+    def connection(self) -> sqlite3.Connection:
+        # Экземпляр бэкенда создается Django на каждый поток; после fork
+        # унаследованное соединение использовать нельзя.
+        if self._connection is None or self._pid != getpid():
+            connection = sqlite3.connect(self.location, isolation_level=None, check_same_thread=False)
+            connection.execute(f"PRAGMA busy_timeout = {self.busy_timeout}")
+            connection.execute("PRAGMA journal_mode = WAL")
+            connection.execute("PRAGMA synchronous = NORMAL")
+            connection.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+            with connection:
+                for sql in SCHEMA:
+                    connection.execute(sql)
+            self._connection, self._pid = connection, getpid()
+        return self._connection
+
+    def write(self):
+        """
+        Транзакция с немедленной блокировкой на запись: операции
+        чтение-изменение-запись (add, incr) атомарны между процессами.
+        """
+        connection = self.connection
+        connection.execute("BEGIN IMMEDIATE")
+        return connection
+
+    # Сериализация
+
+    def encode(self, value: Any):
+        # Целые числа хранятся без pickle: счетчики читаются и в самом SQLite.
+        if type(value) is int and -2 ** 63 <= value < 2 ** 63:
+            return value, 8
+        data = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return data, len(data)
+
+    @staticmethod
+    def decode(value: Any) -> Any:
+        if isinstance(value, bytes):
+            return pickle.loads(value)
+        return value
+
+    def expires(self, timeout) -> Optional[float]:
+        return self.get_backend_timeout(timeout)
+
+    # API кэша
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time()
+        row = self.connection.execute(
+            f"SELECT value, accessed FROM cache WHERE key = ? AND {ALIVE}", (key, now)
+        ).fetchone()
+        if row is None:
+            metrics.inc("cache_requests_total", result="miss")
+            return default
+        metrics.inc("cache_requests_total", result="hit")
+        value, accessed = row
+        if accessed < now - self.access_resolution:
+            self.connection.execute("UPDATE cache SET accessed = ? WHERE key = ?", (now, key))
+        return self.decode(value)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        now = time()
+        placeholders = ", ".join("?" * len(key_map))
+        rows = self.connection.execute(
+            f"SELECT key, value, accessed FROM cache WHERE key IN ({placeholders}) AND {ALIVE}",
+            (*key_map, now),
+        ).fetchall()
+        metrics.inc("cache_requests_total", len(rows), result="hit")
+        metrics.inc("cache_requests_total", len(key_map) - len(rows), result="miss")
+        stale = [(now, key) for key, _, accessed in rows if accessed < now - self.access_resolution]
+        if stale:
+            self.connection.executemany("UPDATE cache SET accessed = ? WHERE key = ?", stale)
+        return {key_map[key]: self.decode(value) for key, value, _ in rows}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.set_many({key: value}, timeout=timeout, version=version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        if not data:
+            return []
+        expires, now = self.expires(timeout), time()
+        rows = []
+        for key, value in data.items():
+            key = self.make_and_validate_key(key, version=version)
+            encoded, size = self.encode(value)
+            rows.append((key, encoded, expires, now, size))
+        connection = self.write()
+        try:
+            connection.executemany(
+                """
+                INSERT INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = excluded.value, expires = excluded.expires,
+                    accessed = excluded.accessed, size = excluded.size
+                """,
+                rows,
+            )
+            self.cull(connection, now)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        encoded, size = self.encode(value)
+        expires, now = self.expires(timeout), time()
+        connection = self.write()
+        try:
+            # Существующая запись перезаписывается, только если она просрочена.
+            added = connection.execute(
+                """
+                INSERT INTO cache (key, value, expires, accessed, size) VALUES (?, ?, ?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = excluded.value, expires = excluded.expires,
+                    accessed = excluded.accessed, size = excluded.size
+                WHERE cache.expires IS NOT NULL AND cache.expires <= excluded.accessed
+                """,
+                (key, encoded, expires, now, size),
+            ).rowcount
+            if added:
+                self.cull(connection, now)
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return bool(added)
+
+    def incr(self, key, delta=1, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time()
+        connection = self.write()
+        try:
+            row = connection.execute(
+                f"SELECT value FROM cache WHERE key = ? AND {ALIVE}", (key, now)
+            ).fetchone()
+            if row is None:
+                raise ValueError(f"Key '{key}' not found.")
+            value = self.decode(row[0]) + delta
+            encoded, size = self.encode(value)
+            connection.execute(
+                "UPDATE cache SET value = ?, size = ?, accessed = ? WHERE key = ?",
+                (encoded, size, now, key),
+            )
+        except BaseException:
+            connection.execute("ROLLBACK")
+            raise
+        connection.execute("COMMIT")
+        return value
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        now = time()
+        return bool(self.connection.execute(
+            f"UPDATE cache SET expires = ?, accessed = ? WHERE key = ? AND {ALIVE}",
+            (self.expires(timeout), now, key, now),
+        ).rowcount)
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return self.connection.execute(
+            f"SELECT 1 FROM cache WHERE key = ? AND {ALIVE}", (key, time())
+        ).fetchone() is not None
+
+    def delete(self, key, version=None):
+        return bool(self.delete_keys([self.make_and_validate_key(key, version=version)]))
+
+    def delete_many(self, keys, version=None):
+        self.delete_keys([self.make_and_validate_key(key, version=version) for key in keys])
+
+    def delete_keys(self, keys: List[str], connection: Optional[sqlite3.Connection] = None) -> int:
+        if not keys:
+            return 0
+        connection = connection or self.connection
+        placeholders = ", ".join("?" * len(keys))
+        return connection.execute(f"DELETE FROM cache WHERE key IN ({placeholders})", keys).rowcount
+
+    def clear(self):
+        self.connection.execute("DELETE FROM cache")
+
+    def close(self, **kwargs):
+        # Соединение переиспользуется между запросами, как и страницы mmap.
+        pass
+
+    # Вытеснение
+
+    def total_bytes(self, connection: Optional[sqlite3.Connection] = None) -> int:
+        connection = connection or self.connection
+        return connection.execute("SELECT total FROM cache_stats WHERE id = 1").fetchone()[0]
+
+    def cull(self, connection: sqlite3.Connection, now: float) -> None:
+        if self.total_bytes(connection) <= self.max_bytes:
+            return
+        connection.execute("DELETE FROM cache WHERE expires IS NOT NULL AND expires <= ?", (now,))
+        excess = self.total_bytes(connection) - self.max_bytes * self.cull_target
+        while excess > 0:
+            rows = connection.execute(
+                "SELECT key, size FROM cache ORDER BY accessed LIMIT ?", (self.evict_batch,)
+            ).fetchall()
+            if not rows:
+                break
+            keys = []
+            for key, size in rows:
+                keys.append(key)
+                excess -= size
+                if excess <= 0:
+                    break
+            self.delete_keys(keys, connection)
@@ -0,0 +1,160 @@
+"""
+Условные GET-запросы: ETag, Last-Modified и ответ 304 Not Modified.
+
+Валидаторы считаются до построения ответа одним агрегатным запросом -
+COUNT и MAX(updated_at) по данным страницы. Если клиент прислал
+совпадающие If-None-Match / If-Modified-Since, тело не строится:
+
+    def get(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            Article.objects.filter(pk=kwargs["pk"]),
+            partial(super().get, request, *args, **kwargs),
+        )
+
+COUNT учитывает удаление строк, которое MAX(updated_at) не меняет.
+Спискам с курсорной пагинацией COUNT по всей выборке обошелся бы
+дороже самой страницы: их валидаторы строятся по версиям моделей
+(versions_validators) без запросов к базе.
+В ETag входят также язык, пользователь и заголовок Accept: один адрес
+отдает разные представления.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from hashlib import md5
+from typing import Awaitable, Callable, Iterable, Optional, Type
+
+from django.db.models import Count, Max, Model, QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+from django.utils.translation import get_language
+
+from .model_versions import get_versions_key
+
+
+@dataclass
+class Validators:
+    """
+    Валидаторы представления ресурса.
+
+    Атрибуты:
+    etag: String - Слабый ETag
+    last_modified: Datetime - Время последнего изменения, если известно
+    """
+    etag: str
+    last_modified: Optional[datetime] = None
+
+    @property
+    def timestamp(self) -> Optional[int]:
+        return int(self.last_modified.timestamp()) if self.last_modified else None
+
+
+def make_etag(request: HttpRequest, user_pk: Optional[int], *parts) -> str:
+    parts += (get_language(), user_pk, request.headers.get("Accept", ""))
+    return f'W/"{md5(repr(parts).encode()).hexdigest()}"'
+
+
+def user_pk(request: HttpRequest) -> Optional[int]:
+    user = getattr(request, "user", None)
+    return user.pk if user is not None else None
+
+
+async def auser_pk(request: HttpRequest) -> Optional[int]:
+    if not hasattr(request, "auser"):
+        return None
+    return (await request.auser()).pk
+
+
+def aggregates(fields: Iterable[str]) -> dict:
+    result = {"count": Count("pk", distinct=True)}
+    result.update({f"last_{index}": Max(field) for index, field in enumerate(fields)})
+    return result
+
+
+def from_aggregates(request: HttpRequest, user: Optional[int], values: dict) -> Validators:
+    last_modified = max(
+        (value for name, value in values.items() if name.startswith("last_") and value is not None),
+        default=None,
+    )
+    etag = make_etag(request, user, values["count"], last_modified and last_modified.isoformat())
+    return Validators(etag, last_modified)
+
+
+def key_validators(key: str) -> Validators:
+    """
+    Валидаторы по ключу, в который уже входят версии данных
+    (mysite.model_versions), без запросов к базе.
+    """
+    return Validators(f'W/"{md5(key.encode()).hexdigest()}"')
+
+
+def versions_validators(request: HttpRequest, *models: Type[Model]) -> Validators:
+    """
+    Валидаторы данных, которые зависят только от моделей models.
+    """
+    return Validators(make_etag(request, user_pk(request), get_versions_key(*models)))
+
+
+def get_validators(request: HttpRequest, queryset: QuerySet, fields: Iterable[str] = ("updated_at",)) -> Validators:
+    """
+    Валидаторы данных queryset одним запросом: COUNT и MAX по полям fields.
+    """
+    return from_aggregates(request, user_pk(request), queryset.order_by().aggregate(**aggregates(fields)))
+
+
+async def aget_validators(
+        request: HttpRequest, queryset: QuerySet, fields: Iterable[str] = ("updated_at",),
+) -> Validators:
+    values = await queryset.order_by().aaggregate(**aggregates(fields))
+    return from_aggregates(request, await auser_pk(request), values)
+
+
+def not_modified(request: HttpRequest, validators: Validators) -> Optional[HttpResponse]:
+    """
+    Ответ 304 (или 412), если у клиента актуальное представление.
+    """
+    if request.method not in ("GET", "HEAD"):
+        return None
+    response = get_conditional_response(request, etag=validators.etag, last_modified=validators.timestamp)
+    if response is not None:
+        set_validators(response, validators)
+    return response
+
+
+def set_validators(response: HttpResponse, validators: Validators) -> HttpResponse:
+    """
+    Добавляет валидаторы к успешному ответу или 304. Уже заданный ETag
+    не меняется: он относится к телу, закэшированному раньше.
+    """
+    if response.status_code in (200, 304) and not response.has_header("ETag"):
+        response["ETag"] = validators.etag
+        if validators.last_modified is not None:
+            response["Last-Modified"] = http_date(validators.timestamp)
+    return response
+
+
+def conditional_response(
+        request: HttpRequest,
+        queryset: QuerySet,
+        build: Callable[[], HttpResponse],
+        fields: Iterable[str] = ("updated_at",),
+) -> HttpResponse:
+    validators = get_validators(request, queryset, fields)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    return set_validators(build(), validators)
+
+
+async def aconditional_response(
+        request: HttpRequest,
+        queryset: QuerySet,
+        build: Callable[[], Awaitable[HttpResponse]],
+        fields: Iterable[str] = ("updated_at",),
+) -> HttpResponse:
+    validators = await aget_validators(request, queryset, fields)
+    response = not_modified(request, validators)
+    if response is not None:
+        return response
+    return set_validators(await build(), validators)
@@ -0,0 +1,110 @@
+"""
+Маршрутизация ORM между основной базой и репликами для чтения.
+
+Реплики основной базы перечислены в settings.DATABASE_REPLICAS:
+
+    DATABASE_REPLICAS = {"default": ["replica"]}
+
+Запись всегда идет в основную базу. Чтение уходит на реплику только
+внутри use_replicas(): его включает DatabaseRoutingMiddleware для
+безопасных (GET, HEAD) запросов. Команды, фоновые задачи, небезопасные
+запросы и чтение внутри транзакции работают с основной базой.
+
+Реплика отстает от основной базы, поэтому после записи клиент на
+REPLICA_STICKY_SECONDS получает cookie, и его запросы читают из основной
+базы: он видит собственные изменения (read-your-writes).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@dataclass
+class RoutingState:
+    """
+    Состояние маршрутизации текущего запроса или блока кода.
+
+    Атрибуты:
+    replicas_allowed: Boolean - Можно ли читать с реплик
+    wrote: Boolean - Была ли запись в основную базу
+    """
+    replicas_allowed: bool
+    wrote: bool = False
+
+
+routing_state: ContextVar[Optional[RoutingState]] = ContextVar("db_routing_state", default=None)
+
+
+def get_replicas(primary: str) -> List[str]:
+    return settings.DATABASE_REPLICAS.get(primary, [])
+
+
+def get_primary(alias: str) -> str:
+    for primary, replicas in settings.DATABASE_REPLICAS.items():
+        if alias == primary or alias in replicas:
+            return primary
+    return alias
+
+
+@contextmanager
+def routing(replicas_allowed: bool):
+    """
+    Устанавливает состояние маршрутизации на время блока и отдает его.
+    """
+    state = RoutingState(replicas_allowed)
+    token = routing_state.set(state)
+    try:
+        yield state
+    finally:
+        routing_state.reset(token)
+
+
+def use_replicas():
+    return routing(replicas_allowed=True)
+
+
+def use_primary():
+    return routing(replicas_allowed=False)
+
+
+class PrimaryReplicaRouter:
+    """
+    Роутер базы данных: чтение с реплик, запись в основную базу.
+    """
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        instance = hints.get("instance")
+        primary = get_primary(instance._state.db) if instance is not None and instance._state.db else DEFAULT_DB_ALIAS
+        replicas = get_replicas(primary)
+        state = routing_state.get()
+        if not replicas or state is None or not state.replicas_allowed or state.wrote:
+            return primary
+        # В транзакции читаются только что записанные данные.
+        if connections[primary].in_atomic_block:
+            return primary
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        state = routing_state.get()
+        if state is not None:
+            state.wrote = True
+        instance = hints.get("instance")
+        if instance is not None and instance._state.db:
+            # Объект, прочитанный с реплики, сохраняется в ее основную базу.
+            return get_primary(instance._state.db)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        if get_primary(obj1._state.db or DEFAULT_DB_ALIAS) == get_primary(obj2._state.db or DEFAULT_DB_ALIAS):
+            return True
+        return None
+
+    def allow_migrate(self, db: str, app_label: str, model_name=None, **hints) -> Optional[bool]:
+        # Схема реплик повторяет основную базу, мигрировать их не нужно.
+        if get_primary(db) != db:
+            return False
+        return None
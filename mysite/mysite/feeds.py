@@ -0,0 +1,54 @@
+"""
+RSS-ленты с чтением элементов через асинхронный ORM.
+"""
+from typing import Optional, Type
+
+from asgiref.sync import markcoroutinefunction
+from django.contrib.syndication.views import Feed
+from django.core.exceptions import ImproperlyConfigured
+from django.db.models import Model, QuerySet
+from django.http import HttpRequest, HttpResponse
+from django.utils.http import http_date
+
+
+class AsyncFeed(Feed):
+    """
+    Лента как асинхронное представление.
+
+    Элементы ленты - queryset (или все объекты model), как у ListView;
+    подкласс может переопределить get_items(). Queryset читается
+    асинхронной итерацией, после чего лента собирается из готового списка
+    без обращений к базе, поэтому поток на запрос не нужен. Элементы
+    не должны подгружать связи в item_* методах: ленивый запрос
+    из асинхронного кода запрещен.
+
+    Атрибуты:
+    queryset: QuerySet - Элементы ленты
+    model: Class[models.Model] - Модель элементов, если queryset не задан
+    """
+    queryset: Optional[QuerySet] = None
+    model: Optional[Type[Model]] = None
+
+    def __init__(self):
+        markcoroutinefunction(self)
+
+    def get_items(self) -> QuerySet:
+        if self.queryset is not None:
+            # Копия: результаты не кэшируются между запросами.
+            return self.queryset.all()
+        if self.model is not None:
+            return self.model._default_manager.all()
+        raise ImproperlyConfigured(f"{type(self).__name__} должен задать queryset, model или get_items()")
+
+    def items(self, items):
+        # Объектом ленты служит уже прочитанный список элементов.
+        return items
+
+    async def __call__(self, request: HttpRequest, *args, **kwargs) -> HttpResponse:
+        items = [item async for item in self.get_items()]
+        feedgen = self.get_feed(items, request)
+        response = HttpResponse(content_type=feedgen.content_type)
+        if hasattr(self, "item_pubdate") or hasattr(self, "item_updateddate"):
+            response.headers["Last-Modified"] = http_date(feedgen.latest_post_date().timestamp())
+        feedgen.write(response, "utf-8")
+        return response
@@ -0,0 +1,79 @@
+"""
+Кэш фрагментов шаблонов с ключами по версиям моделей.
+
+    {% load fragments %}
+    {% fragment "products-table" products %}
+      {% for product in products %}
+        {% fragment "products-row" product %}...{% endfragment %}
+      {% endfor %}
+    {% endfragment %}
+
+Ключ фрагмента по QuerySet - версии его модели и ее зависимостей
+(mysite.model_versions) и SQL запроса: при попадании в кэш запрос
+не выполняется и строки не рендерятся. Ключ фрагмента по объекту -
+pk и updated_at (у моделей без этого поля - версия модели) и версии
+зависимостей модели. Сохранение меняет updated_at или версию, и старые
+ключи больше не запрашиваются.
+
+В ключ входит активный язык: адреса {% url %} содержат префикс
+i18n_patterns, а {% translate %} зависит от языка.
+"""
+from hashlib import md5
+from typing import Any, Dict, Iterable, Optional, Tuple, Type
+
+from django.core.exceptions import EmptyResultSet
+from django.db.models import Model, QuerySet
+from django.utils.translation import get_language
+
+from .model_versions import dependencies, get_version, get_versions_key
+
+
+FRAGMENT_KEY_PREFIX = "fragment"
+
+
+class VersionsCache:
+    """
+    Версии моделей, прочитанные за один рендер шаблона: строки таблицы
+    не запрашивают одни и те же версии из кэша повторно.
+
+    Атрибуты:
+    keys: Dict - Ключи версий по набору моделей
+    """
+    def __init__(self):
+        self.keys: Dict[Tuple[Any, ...], str] = {}
+
+    def get(self, models: Iterable[Type[Model]], expand: bool = True) -> str:
+        models = tuple(models)
+        memo_key = (expand, *models)
+        if memo_key not in self.keys:
+            if expand:
+                self.keys[memo_key] = get_versions_key(*models)
+            else:
+                self.keys[memo_key] = ".".join(str(get_version(model)) for model in models)
+        return self.keys[memo_key]
+
+
+def target_parts(target: Any, versions: VersionsCache) -> Tuple[Any, ...]:
+    if isinstance(target, QuerySet):
+        try:
+            sql = str(target.query)
+        except EmptyResultSet:
+            sql = ""
+        return versions.get([target.model]), sql
+    if isinstance(target, Model):
+        model = type(target)
+        related = dependencies.get(model, ())
+        updated_at = getattr(target, "updated_at", None)
+        if updated_at is None:
+            return target.pk, versions.get([model, *related], expand=False)
+        return target.pk, updated_at.isoformat(), versions.get(related, expand=False)
+    raise TypeError(f"Фрагмент кэшируется по QuerySet или объекту модели, получено: {type(target).__name__}")
+
+
+def fragment_key(name: str, target: Any, vary_on: Iterable[Any] = (),
+                 versions: Optional[VersionsCache] = None) -> str:
+    """
+    Ключ кэша фрагмента name для QuerySet или объекта target.
+    """
+    parts = (*target_parts(target, versions or VersionsCache()), get_language(), *vary_on)
+    return f"{FRAGMENT_KEY_PREFIX}:{name}:{md5(repr(parts).encode()).hexdigest()}"
@@ -0,0 +1,240 @@
+"""
+Производные изображения: несколько размеров и форматов одного оригинала.
+
+Оригинал сохраняется в запросе как есть, без пережатия, под именем из хэша
+содержимого (DerivativeImageField). Производные - каждый вариант размера
+из IMAGE_VARIANTS в каждом формате из IMAGE_FORMATS - лежат в хранилище
+по адресу derivatives/<хэш>/<вариант>.<формат>. Их создает фоновая задача
+images.generate_derivatives после сохранения оригинала, а если она еще
+не успела - image_derivative_view при первом запросе. Адрес зависит только
+от содержимого, поэтому производные кэшируются клиентами навсегда
+и общие для одинаковых файлов.
+
+В шаблонах (библиотека images):
+
+    {% picture product.preview "thumb" sizes="120px" width=120 height=120 %}
+    <img src="..." srcset="{% srcset product.preview 'jpeg' %}" sizes="120px">
+"""
+import re
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from hashlib import sha1
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from django.conf import settings
+from django.core import signing
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import models, transaction
+from django.db.models.fields.files import FieldFile
+from django.http import Http404, HttpRequest, HttpResponse
+from django.urls import reverse
+from PIL import Image, ImageOps
+
+from .media import IMMUTABLE_MAX_AGE, serve_media
+
+
+DERIVATIVES_DIR = "derivatives"
+IMAGE_MIME_TYPES = {"webp": "image/webp", "jpeg": "image/jpeg"}
+IMAGE_EXTENSIONS = {"webp": "webp", "jpeg": "jpg"}
+
+re_hashed_name = re.compile(r"(?:^|/)([0-9a-f]{40})\.\w+$")
+
+
+def get_signer() -> signing.Signer:
+    # Создается при использовании: SECRET_KEY не нужен при импорте моделей.
+    return signing.Signer(salt="mysite.images")
+
+
+def content_hash(file) -> str:
+    digest = sha1()
+    file.seek(0)
+    for chunk in iter(lambda: file.read(64 * 1024), b""):
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def image_key(name: str) -> str:
+    """
+    Хэш содержимого оригинала. У файлов, сохраненных DerivativeImageField,
+    он входит в имя; у прежних файлов вычисляется один раз и кэшируется.
+    """
+    match = re_hashed_name.search(name)
+    if match:
+        return match.group(1)
+
+    def read_hash():
+        with default_storage.open(name) as file:
+            return content_hash(file)
+
+    return cache.get_or_set(f"image_key:{name}", read_hash, timeout=None)
+
+
+def derivative_name(key: str, variant: str, fmt: str) -> str:
+    return f"{DERIVATIVES_DIR}/{key[:2]}/{key}/{variant}.{IMAGE_EXTENSIONS[fmt]}"
+
+
+def meta_key(key: str) -> str:
+    return f"image_meta:{key}"
+
+
+def render_variant(image: Image.Image, fmt: str) -> bytes:
+    output = BytesIO()
+    if fmt == "jpeg":
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+        image.save(output, "JPEG", quality=settings.IMAGE_QUALITY, optimize=True, progressive=True)
+    else:
+        image.save(output, "WEBP", quality=settings.IMAGE_QUALITY, method=4)
+    return output.getvalue()
+
+
+def open_original(name: str) -> Image.Image:
+    with default_storage.open(name) as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info or image.mode in ("LA", "PA") else "RGB")
+    return image
+
+
+def save_derivative(name: str, data: bytes) -> None:
+    if not default_storage.exists(name):
+        default_storage.save(name, ContentFile(data))
+
+
+def generate_derivatives(name: str) -> Dict[str, Tuple[int, int]]:
+    """
+    Создает все варианты оригинала и запоминает их размеры.
+    Варианты уменьшаются от большего к меньшему: каждый следующий
+    получается из предыдущего, а не из оригинала.
+    """
+    key = image_key(name)
+    image = open_original(name)
+    sizes: Dict[str, Tuple[int, int]] = {}
+    variants = sorted(settings.IMAGE_VARIANTS.items(), key=lambda item: item[1], reverse=True)
+    for variant, size in variants:
+        image = image.copy()
+        image.thumbnail(size, Image.LANCZOS)
+        sizes[variant] = image.size
+        for fmt in settings.IMAGE_FORMATS:
+            save_derivative(derivative_name(key, variant, fmt), render_variant(image, fmt))
+    cache.set(meta_key(key), sizes, timeout=None)
+    return sizes
+
+
+def generate_many(names: Sequence[str]) -> List[Dict[str, Tuple[int, int]]]:
+    """
+    Производные нескольких оригиналов в пуле потоков IMAGE_WORKERS:
+    Pillow отпускает GIL при масштабировании и кодировании.
+    """
+    if len(names) <= 1:
+        return [generate_derivatives(name) for name in names]
+    with ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS) as executor:
+        return list(executor.map(generate_derivatives, names))
+
+
+def schedule_derivatives(*names: str) -> None:
+    """
+    Одна фоновая задача на все переданные оригиналы.
+    """
+    from jobsapp.registry import enqueue
+
+    enqueue("images.generate_derivatives", {"names": list(names)})
+
+
+class DerivativeImageField(models.ImageField):
+    """
+    ImageField, который сохраняет оригинал под именем из хэша содержимого
+    и после фиксации транзакции ставит задачу на создание производных.
+    """
+    def store(self, model_instance) -> Optional[str]:
+        """
+        Сохраняет новый файл поля в хранилище и возвращает его имя.
+        Файл с тем же содержимым уже лежит под этим именем - он не
+        записывается повторно. Для сохраненных ранее файлов - None.
+        """
+        file: FieldFile = getattr(model_instance, self.attname)
+        if not file or file._committed:
+            return None
+        extension = file.name.rsplit(".", 1)[-1].lower() if "." in file.name else "jpg"
+        name = self.generate_filename(model_instance, f"{content_hash(file)}.{extension}")
+        if file.storage.exists(name):
+            file.name = name
+            file._committed = True
+        else:
+            file.save(name.rsplit("/", 1)[-1], file.file, save=False)
+        return file.name
+
+    def pre_save(self, model_instance, add):
+        name = self.store(model_instance)
+        if name is not None:
+            transaction.on_commit(partial(schedule_derivatives, name), using=model_instance._state.db)
+        return getattr(model_instance, self.attname)
+
+
+def store_images(instances: Iterable[models.Model], field_name: str) -> List[models.Model]:
+    """
+    Сохраняет файлы поля field_name у еще не записанных объектов
+    параллельно, в пуле потоков IMAGE_WORKERS, и ставит одну задачу
+    на их производные. Объекты после этого записываются одним
+    bulk_create: pre_save поля уже ничего не делает.
+    """
+    instances = list(instances)
+    if not instances:
+        return instances
+    field: DerivativeImageField = instances[0]._meta.get_field(field_name)
+    with ThreadPoolExecutor(max_workers=settings.IMAGE_WORKERS) as executor:
+        names = [name for name in executor.map(field.store, instances) if name is not None]
+    if names:
+        transaction.on_commit(partial(schedule_derivatives, *names))
+    return instances
+
+
+def derivative_sources(file: FieldFile) -> Dict[str, List[Tuple[str, str, int]]]:
+    """
+    Варианты изображения по форматам: (вариант, адрес, ширина в пикселях).
+    Пока производные не созданы, адреса ведут на image_derivative_view.
+    """
+    key = image_key(file.name)
+    sizes: Optional[Dict[str, Tuple[int, int]]] = cache.get(meta_key(key))
+    signed_name = get_signer().sign(file.name)
+    sources: Dict[str, List[Tuple[str, str, int]]] = {}
+    for fmt in settings.IMAGE_FORMATS:
+        sources[fmt] = []
+        for variant, size in settings.IMAGE_VARIANTS.items():
+            if sizes is not None:
+                url = default_storage.url(derivative_name(key, variant, fmt))
+                width = sizes[variant][0]
+            else:
+                url = reverse("image_derivative", kwargs={"variant": variant, "fmt": fmt})
+                url = f"{url}?src={signed_name}"
+                width = size[0]
+            sources[fmt].append((variant, url, width))
+    return sources
+
+
+def image_derivative_view(request: HttpRequest, variant: str, fmt: str) -> HttpResponse:
+    """
+    Производная, которую еще не создала фоновая задача: создается
+    по запросу, сохраняется и отдается через mysite.media
+    с бессрочным кэшированием.
+    """
+    if variant not in settings.IMAGE_VARIANTS or fmt not in settings.IMAGE_FORMATS:
+        raise Http404
+    try:
+        name = get_signer().unsign(request.GET.get("src", ""))
+    except signing.BadSignature:
+        raise Http404
+    if not default_storage.exists(name):
+        raise Http404
+    target = derivative_name(image_key(name), variant, fmt)
+    if not default_storage.exists(target):
+        image = open_original(name)
+        image.thumbnail(settings.IMAGE_VARIANTS[variant], Image.LANCZOS)
+        save_derivative(target, render_variant(image, fmt))
+    return serve_media(request, target, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
@@ -0,0 +1,192 @@
+"""
+Отдача файлов MEDIA_ROOT с проверкой прав.
+
+Файл доступен всем, если его путь не начинается с префикса, защищенного
+через protect() - например, чек заказа получает только его владелец:
+
+    media.protect("orders/receipts/", can_download_receipt)
+
+Сами байты по возможности передает фронтальный прокси (MEDIA_ACCEL):
+
+    "nginx" - заголовок X-Accel-Redirect на внутренний location
+              MEDIA_ACCEL_PREFIX, который смотрит в MEDIA_ROOT:
+
+              location /protected-media/ {
+                  internal;
+                  alias /app/uploads/;
+              }
+
+    "sendfile" - заголовок X-Sendfile с абсолютным путем (Apache, lighttpd).
+
+Без прокси файл отдает FileResponse с поддержкой Range: под gunicorn
+wsgi.file_wrapper передает его через os.sendfile, в том числе диапазон.
+"""
+import mimetypes
+import os
+import re
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.exceptions import SuspiciousFileOperation
+from django.http import FileResponse, Http404, HttpRequest, HttpResponse
+from django.utils._os import safe_join
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, parse_http_date_safe
+
+
+MediaCheck = Callable[[User | AnonymousUser, str], bool]
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+protected: Dict[str, MediaCheck] = {}
+re_range = re.compile(r"^bytes=(\d*)-(\d*)$")
+re_content_hash = re.compile(r"(?:^|/)[0-9a-f]{40}(?:/|\.)")
+
+
+def protect(prefix: str, check: MediaCheck) -> None:
+    """
+    Файлы с путем, начинающимся с prefix, отдаются, только если
+    check(user, name) возвращает True.
+    """
+    protected[prefix] = check
+
+
+def get_check(name: str) -> Optional[MediaCheck]:
+    for prefix, check in protected.items():
+        if name.startswith(prefix):
+            return check
+    return None
+
+
+class FileRange:
+    """
+    Часть открытого файла для FileResponse: чтение ограничено
+    length байтами от текущей позиции. fileno() отдает дескриптор
+    файла, и os.sendfile в wsgi.file_wrapper начинает с нужного
+    смещения, а длину берет из Content-Length.
+
+    Атрибуты:
+    file: File - Открытый файл, установленный на начало диапазона
+    remaining: Integer - Сколько байт осталось отдать
+    """
+    def __init__(self, file, start: int, length: int):
+        file.seek(start)
+        self.file = file
+        self.remaining = length
+        self.name = file.name
+
+    def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self.remaining:
+            size = self.remaining
+        data = self.file.read(size)
+        self.remaining -= len(data)
+        return data
+
+    def fileno(self) -> int:
+        return self.file.fileno()
+
+    def close(self) -> None:
+        self.file.close()
+
+
+def parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    """
+    Единственный диапазон из заголовка Range: (начало, конец включительно).
+    None - заголовка нет или он не поддерживается, отдается весь файл.
+    Для диапазона за пределами файла - ValueError.
+    """
+    match = re_range.match(header.replace(" ", ""))
+    if match is None:
+        return None
+    start, end = match.groups()
+    if not start and not end:
+        return None
+    if not start:
+        start, end = max(size - int(end), 0), size - 1
+    else:
+        start, end = int(start), min(int(end), size - 1) if end else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def accel_response(name: str, path: str) -> HttpResponse:
+    response = HttpResponse(content_type=mimetypes.guess_type(name)[0] or "application/octet-stream")
+    if settings.MEDIA_ACCEL == "nginx":
+        response["X-Accel-Redirect"] = settings.MEDIA_ACCEL_PREFIX + quote(name)
+    else:
+        response["X-Sendfile"] = path
+    return response
+
+
+def file_response(request: HttpRequest, name: str, path: str) -> HttpResponse:
+    """
+    Ответ с файлом MEDIA_ROOT: через прокси или FileResponse с Range.
+    """
+    if settings.MEDIA_ACCEL:
+        return accel_response(name, path)
+    stat = os.stat(path)
+    etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}"'
+    response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+    if response is not None:
+        return response
+
+    byte_range = None
+    if_range = request.headers.get("If-Range")
+    if if_range is None or if_range == etag or parse_http_date_safe(if_range) == int(stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get("Range", ""), stat.st_size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{stat.st_size}"
+            return response
+
+    file = open(path, "rb")
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    if byte_range is None:
+        response = FileResponse(file, content_type=content_type)
+    else:
+        start, end = byte_range
+        response = FileResponse(FileRange(file, start, end - start + 1), content_type=content_type, status=206)
+        response["Content-Length"] = str(end - start + 1)
+        response["Content-Range"] = f"bytes {start}-{end}/{stat.st_size}"
+    response["Accept-Ranges"] = "bytes"
+    response["ETag"] = etag
+    response["Last-Modified"] = http_date(stat.st_mtime)
+    return response
+
+
+def serve_media(request: HttpRequest, name: str, **cache_control) -> HttpResponse:
+    """
+    Отдает файл MEDIA_ROOT без проверки прав, cache_control - параметры
+    заголовка Cache-Control.
+    """
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+    except SuspiciousFileOperation:
+        raise Http404
+    if not os.path.isfile(path):
+        raise Http404
+    response = file_response(request, name, path)
+    patch_cache_control(response, **cache_control)
+    return response
+
+
+def media_view(request: HttpRequest, name: str) -> HttpResponse:
+    """
+    Файл MEDIA_ROOT по адресу MEDIA_URL. Защищенные файлы без прав
+    не отличаются от отсутствующих (404) и не кэшируются общими кэшами.
+    Файлы с хэшем содержимого в пути кэшируются навсегда.
+    """
+    check = get_check(name)
+    if check is None:
+        if re_content_hash.search(name):
+            return serve_media(request, name, public=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+        return serve_media(request, name, public=True, max_age=settings.MEDIA_MAX_AGE)
+    if not check(request.user, name):
+        raise Http404
+    response = serve_media(request, name, private=True, max_age=0)
+    patch_vary_headers(response, ["Cookie"])
+    return response
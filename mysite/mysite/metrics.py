@@ -0,0 +1,262 @@
+"""
+Метрики приложения в формате Prometheus, общие для всех процессов gunicorn.
+
+Каждый процесс копит счетчики и гистограммы в памяти и не чаще раза
+в METRICS_FLUSH_INTERVAL секунд записывает их в собственный файл
+в каталоге METRICS_DIR. Эндпоинт /metrics суммирует файлы всех процессов,
+включая уже завершившиеся, поэтому счетчики не обнуляются при перезапуске.
+Процесс, который ничего не записал, файл не создает. Файлы завершившихся
+процессов при чтении метрик сворачиваются в один AGGREGATE_FILENAME,
+поэтому число файлов не растет с каждым перезапуском и командой manage.py.
+Завершенность проверяется по pid: каталог METRICS_DIR не должен быть
+общим для нескольких машин или контейнеров.
+Если METRICS_DIR не задан, видны только метрики текущего процесса.
+"""
+import atexit
+import json
+import os
+from collections import defaultdict
+from threading import Lock
+from time import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import HttpRequest, HttpResponse
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRIC_HELP = {
+    "http_requests_total": ("counter", "Обработанные запросы"),
+    "http_exceptions_total": ("counter", "Необработанные исключения в представлениях"),
+    "http_request_duration_seconds": ("histogram", "Время обработки запроса"),
+    "db_queries_total": ("counter", "Запросы к базе данных"),
+    "db_query_duration_seconds_total": ("counter", "Суммарное время запросов к базе данных"),
+    "db_n_plus_one_total": ("counter", "Ответы с повторяющимися одинаковыми запросами (N+1)"),
+    "cache_requests_total": ("counter", "Обращения к кэшу (hit/miss)"),
+}
+
+AGGREGATE_FILENAME = "aggregate.json"
+LOCK_FILENAME = ".lock"
+
+Labels = Tuple[Tuple[str, str], ...]
+MetricKey = Tuple[str, Labels]
+
+
+class Registry:
+    """
+    Метрики текущего процесса.
+
+    Атрибуты:
+    counters: Dict - Значения счетчиков по имени и меткам
+    histograms: Dict - Число наблюдений по корзинам, сумма и количество
+    """
+    def __init__(self):
+        self.lock = Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.pid = os.getpid()
+        self.filename = f"{self.pid}-{int(time() * 1000)}.json"
+        self.counters: Dict[MetricKey, float] = defaultdict(float)
+        self.histograms: Dict[MetricKey, List[float]] = {}
+        self.flushed_at = 0.0
+
+    def check_pid(self) -> None:
+        # После fork метрики родительского процесса не наследуются.
+        if self.pid != os.getpid():
+            self.reset()
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.check_pid()
+            self.counters[key] += value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.check_pid()
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [0.0] * (len(LATENCY_BUCKETS) + 2)
+            for index, bound in enumerate(LATENCY_BUCKETS):
+                if value <= bound:
+                    histogram[index] += 1
+                    break
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    @property
+    def empty(self) -> bool:
+        return not self.counters and not self.histograms
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            self.check_pid()
+            return to_snapshot(self.counters, self.histograms)
+
+    def flush(self, force: bool = False) -> None:
+        directory = settings.METRICS_DIR
+        if not directory or (not force and time() - self.flushed_at < settings.METRICS_FLUSH_INTERVAL):
+            return
+        self.flushed_at = time()
+        if self.empty:
+            return
+        os.makedirs(directory, exist_ok=True)
+        write_snapshot(os.path.join(directory, self.filename), self.snapshot())
+
+
+def to_snapshot(counters: Dict[MetricKey, float], histograms: Dict[MetricKey, List[float]]) -> dict:
+    return {
+        "counters": [[name, labels, value] for (name, labels), value in counters.items()],
+        "histograms": [[name, labels, values] for (name, labels), values in histograms.items()],
+    }
+
+
+def write_snapshot(path: str, snapshot: dict) -> None:
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(snapshot, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def read_snapshot(path: str) -> Optional[dict]:
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def file_pid(filename: str) -> Optional[int]:
+    pid = filename.split("-", 1)[0]
+    return int(pid) if filename.endswith(".json") and pid.isdigit() else None
+
+
+def compact(directory: str) -> None:
+    """
+    Сворачивает файлы завершившихся процессов в AGGREGATE_FILENAME.
+    Блокировка не дает двум процессам одновременно переписать итоговый файл.
+    """
+    if fcntl is None:
+        return
+    with open(os.path.join(directory, LOCK_FILENAME), "a") as lock:
+        fcntl.flock(lock, fcntl.LOCK_EX)
+        dead = [
+            filename for filename in os.listdir(directory)
+            if (pid := file_pid(filename)) is not None and not process_alive(pid)
+        ]
+        if not dead:
+            return
+        aggregate_path = os.path.join(directory, AGGREGATE_FILENAME)
+        paths = [aggregate_path] + [os.path.join(directory, filename) for filename in dead]
+        snapshots = (snapshot for snapshot in map(read_snapshot, paths) if snapshot is not None)
+        write_snapshot(aggregate_path, to_snapshot(*aggregate(snapshots)))
+        for path in paths[1:]:
+            os.remove(path)
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+
+
+@atexit.register
+def flush_on_exit() -> None:
+    try:
+        registry.flush(force=True)
+    except Exception:
+        pass
+
+
+def load_snapshots() -> Iterable[dict]:
+    registry.flush(force=True)
+    directory = settings.METRICS_DIR
+    if not directory:
+        yield registry.snapshot()
+        return
+    os.makedirs(directory, exist_ok=True)
+    compact(directory)
+    for filename in os.listdir(directory):
+        if not filename.endswith(".json"):
+            continue
+        snapshot = read_snapshot(os.path.join(directory, filename))
+        if snapshot is not None:
+            yield snapshot
+
+
+def aggregate(snapshots: Iterable[dict]):
+    counters: Dict[MetricKey, float] = defaultdict(float)
+    histograms: Dict[MetricKey, List[float]] = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot["counters"]:
+            counters[(name, tuple(map(tuple, labels)))] += value
+        for name, labels, values in snapshot["histograms"]:
+            key = (name, tuple(map(tuple, labels)))
+            if key in histograms:
+                histograms[key] = [total + value for total, value in zip(histograms[key], values)]
+            else:
+                histograms[key] = list(values)
+    return counters, histograms
+
+
+def format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = (
+        '{}="{}"'.format(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in items
+    )
+    return "{" + ",".join(escaped) + "}"
+
+
+def render(counters: Dict[MetricKey, float], histograms: Dict[MetricKey, List[float]]) -> str:
+    lines = []
+    names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+    for name in names:
+        metric_type, help_text = METRIC_HELP.get(name, ("untyped", name))
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f"{name}{format_labels(labels)} {value:g}")
+        for (metric, labels), values in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0.0
+            for bound, count in zip(LATENCY_BUCKETS, values):
+                cumulative += count
+                lines.append(f"{name}_bucket{format_labels(labels, ('le', f'{bound:g}'))} {cumulative:g}")
+            lines.append(f"{name}_bucket{format_labels(labels, ('le', '+Inf'))} {values[-1]:g}")
+            lines.append(f"{name}_sum{format_labels(labels)} {values[-2]:g}")
+            lines.append(f"{name}_count{format_labels(labels)} {values[-1]:g}")
+    return "\n".join(lines) + "\n"
+
+
+def metrics_view(request: HttpRequest) -> HttpResponse:
+    """
+    Метрики всех процессов. Доступны персоналу и адресам из INTERNAL_IPS.
+    """
+    if not request.user.is_staff and request.META.get("REMOTE_ADDR") not in settings.INTERNAL_IPS:
+        raise PermissionDenied
+    return HttpResponse(
+        render(*aggregate(load_snapshots())),
+        content_type="text/plain; version=0.0.4; charset=utf-8",
+    )
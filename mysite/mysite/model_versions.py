@@ -0,0 +1,137 @@
+"""
+Счетчики версий моделей для инвалидации кэша.
+
+Версия модели входит в ключ кэша: любое изменение модели увеличивает
+счетчик, после чего старые ключи больше не запрашиваются и вытесняются
+по TTL. Поэтому закэшированные данные можно хранить долго и не бояться
+отдать устаревшую выгрузку.
+
+У модели могут быть зависимости (register(..., depends_on=...)) -
+модели, данные которых выводятся вместе с ней: ключ версий модели
+включает и их версии.
+
+Сигналы увеличивают версию после фиксации транзакции: иначе параллельный
+запрос успел бы закэшировать данные до фиксации под новой версией.
+"""
+from functools import partial
+from time import time
+from typing import Dict, Iterable, List, Optional, Set, Tuple, Type
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+
+
+VERSION_KEY_PREFIX = "model_version"
+
+dependencies: Dict[Type[Model], Tuple[Type[Model], ...]] = {}
+
+
+def version_key(model: Type[Model]) -> str:
+    return f"{VERSION_KEY_PREFIX}:{model._meta.label_lower}"
+
+
+def initial_version() -> int:
+    """
+    Начальное значение счетчика — текущее время в миллисекундах.
+    Если счетчик вытеснят из кэша, новая версия не совпадет с прежними.
+    """
+    return int(time() * 1000)
+
+
+def get_version(model: Type[Model]) -> int:
+    key = version_key(model)
+    version = cache.get(key)
+    if version is None:
+        version = initial_version()
+        if not cache.add(key, version, timeout=None):
+            version = cache.get(key, version)
+    return version
+
+
+def with_dependencies(models: Iterable[Type[Model]]) -> List[Type[Model]]:
+    """
+    Модели вместе с их зависимостями, без повторов.
+    """
+    result: List[Type[Model]] = []
+    for model in models:
+        for related in (model, *dependencies.get(model, ())):
+            if related not in result:
+                result.append(related)
+    return result
+
+
+def get_versions_key(*models: Type[Model]) -> str:
+    """
+    Часть ключа кэша из версий всех моделей, от которых зависят данные,
+    и их зависимостей.
+    """
+    return ".".join(str(get_version(model)) for model in with_dependencies(models))
+
+
+async def aget_version(model: Type[Model]) -> int:
+    key = version_key(model)
+    version = await cache.aget(key)
+    if version is None:
+        version = initial_version()
+        if not await cache.aadd(key, version, timeout=None):
+            version = await cache.aget(key, version)
+    return version
+
+
+async def aget_versions_key(*models: Type[Model]) -> str:
+    return ".".join([str(await aget_version(model)) for model in with_dependencies(models)])
+
+
+def bump_version(model: Type[Model]) -> None:
+    key = version_key(model)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, initial_version(), timeout=None)
+
+
+def bump_all_versions() -> None:
+    """
+    Увеличивает версии всех зарегистрированных моделей - после массовой
+    записи в обход сигналов (bulk_create, raw SQL).
+    """
+    for model in dependencies:
+        bump_version(model)
+
+
+def register(model: Type[Model], fields: Optional[Iterable[str]] = None,
+             depends_on: Iterable[Type[Model]] = ()) -> None:
+    """
+    Подписывает модель на увеличение версии после фиксации транзакции,
+    в которой были post_save, post_delete или m2m_changed ее связей
+    многие-ко-многим.
+
+    fields — поля, изменение которых влияет на закэшированные данные:
+    сохранение с update_fields, не задевающим их, версию не меняет.
+    depends_on — модели, версии которых входят в ключ версий этой модели.
+    """
+    tracked_fields: Optional[Set[str]] = set(fields) if fields is not None else None
+    dependencies[model] = tuple(depends_on)
+    uid = f"model_versions:{model._meta.label_lower}"
+
+    def bump(using):
+        transaction.on_commit(partial(bump_version, model), using=using)
+
+    def on_save(sender, using, update_fields=None, **kwargs):
+        if tracked_fields is not None and update_fields is not None and tracked_fields.isdisjoint(update_fields):
+            return
+        bump(using)
+
+    def on_change(sender, using, **kwargs):
+        bump(using)
+
+    def on_m2m_change(sender, action, using, **kwargs):
+        if action in ("post_add", "post_remove", "post_clear"):
+            bump(using)
+
+    post_save.connect(on_save, sender=model, weak=False, dispatch_uid=uid)
+    post_delete.connect(on_change, sender=model, weak=False, dispatch_uid=uid)
+    for field in model._meta.many_to_many:
+        m2m_changed.connect(on_m2m_change, sender=field.remote_field.through, weak=False, dispatch_uid=uid)
@@ -0,0 +1,309 @@
+"""
+Профилирование рабочего процесса по запросу: статистический сэмплер стеков.
+
+Отдельный поток раз в interval секунд снимает стеки потоков процесса
+(sys._current_frames) и считает одинаковые стеки. Пока сеанс не запущен,
+накладных расходов нет; во время сеанса они ограничены частотой выборки.
+
+Сеанс запускается персоналом в том процессе, который принял запрос:
+
+    POST /profiler/start?seconds=10            все потоки процесса 10 секунд
+    POST /profiler/start?requests=20&path=/ru/shop/products/*
+                                               следующие 20 запросов по шаблону пути
+
+Результаты пишутся в PROFILER_DIR и доступны из любого процесса:
+
+    GET /profiler/                             список сеансов
+    GET /profiler/<id>?format=collapsed        свернутые стеки (flamegraph.pl, speedscope)
+    GET /profiler/<id>?format=speedscope       файл для https://www.speedscope.app
+"""
+import json
+import os
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+from time import perf_counter, time
+from typing import Dict, Optional
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.http import Http404, HttpRequest, HttpResponse, JsonResponse
+from django.views.decorators.http import require_GET, require_POST
+
+
+class StackSampler:
+    """
+    Поток, снимающий стеки других потоков.
+
+    Атрибуты:
+    interval: Float - Период выборки, секунды
+    thread_ids: Set[Integer] - Потоки для выборки; None - все, кроме самого сэмплера
+    stacks: Counter - Число выборок каждого свернутого стека
+    samples: Integer - Число выполненных выборок
+    """
+    def __init__(self, interval: float, thread_ids: Optional[set] = None):
+        self.interval = interval
+        self.thread_ids = thread_ids
+        self.stacks = Counter()
+        self.samples = 0
+        self.labels: Dict[object, str] = {}
+        self.stopped = threading.Event()
+        self.thread = threading.Thread(target=self.run, name="stack-sampler", daemon=True)
+
+    def start(self) -> None:
+        self.thread.start()
+
+    def stop(self) -> None:
+        self.stopped.set()
+        if self.thread is not threading.current_thread():
+            self.thread.join()
+
+    def run(self) -> None:
+        own_id = threading.get_ident()
+        while not self.stopped.wait(self.interval):
+            self.samples += 1
+            thread_ids = self.thread_ids
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or (thread_ids is not None and thread_id not in thread_ids):
+                    continue
+                self.stacks[self.collapse(frame)] += 1
+
+    def collapse(self, frame) -> str:
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            label = self.labels.get(code)
+            if label is None:
+                label = self.labels[code] = f"{code.co_name} ({short_path(code.co_filename)}:{code.co_firstlineno})"
+            names.append(label)
+            frame = frame.f_back
+        names.reverse()
+        return ";".join(names)
+
+
+def short_path(filename: str) -> str:
+    # Пути к пакетам сокращаются до имени пакета и модуля.
+    for prefix in sorted(sys.path, key=len, reverse=True):
+        if prefix and filename.startswith(prefix + os.sep):
+            return filename[len(prefix) + 1:].replace(";", ",")
+    return filename.replace(";", ",")
+
+
+class ProfileSession:
+    """
+    Сеанс профилирования в текущем процессе.
+
+    Атрибуты:
+    id: String - Идентификатор сеанса, имя файла с результатом
+    seconds: Float - Длительность сеанса; для сеанса по запросам - предельная
+    requests: Integer - Сколько запросов профилировать; None - все потоки процесса
+    path: String - Шаблон пути запросов (fnmatch)
+    sampler: StackSampler - Сэмплер стеков
+    """
+    def __init__(self, seconds: float, requests: Optional[int] = None, path: str = "*",
+                 interval: Optional[float] = None):
+        self.id = f"{int(time())}-{os.getpid()}-{uuid4().hex[:8]}"
+        self.seconds = seconds
+        self.requests = requests
+        self.path = path
+        self.remaining = requests or 0
+        self.in_progress = 0
+        self.profiled = 0
+        self.lock = threading.Lock()
+        self.sampler = StackSampler(
+            interval or settings.PROFILER_INTERVAL,
+            thread_ids=set() if requests else None,
+        )
+        self.timer = threading.Timer(seconds, self.finish)
+        self.timer.daemon = True
+        self.started_at = time()
+        self.started = perf_counter()
+        self.finished = False
+
+    def start(self) -> None:
+        self.sampler.start()
+        self.timer.start()
+
+    def claim(self, path: str) -> bool:
+        """
+        Берет запрос в сеанс, если он подходит по пути и лимит не исчерпан.
+        """
+        with self.lock:
+            if self.finished or self.remaining <= 0 or not fnmatchcase(path, self.path):
+                return False
+            self.remaining -= 1
+            self.in_progress += 1
+            return True
+
+    @contextmanager
+    def track(self):
+        thread_id = threading.get_ident()
+        self.sampler.thread_ids.add(thread_id)
+        try:
+            yield
+        finally:
+            self.sampler.thread_ids.discard(thread_id)
+            with self.lock:
+                self.in_progress -= 1
+                self.profiled += 1
+                done = self.remaining <= 0 and self.in_progress == 0
+            if done:
+                self.finish()
+
+    def finish(self) -> None:
+        global active_session
+        with self.lock:
+            if self.finished:
+                return
+            self.finished = True
+        self.timer.cancel()
+        self.sampler.stop()
+        with sessions_lock:
+            if active_session is self:
+                active_session = None
+        save_result(self.result())
+
+    def result(self) -> dict:
+        return {
+            "id": self.id,
+            "pid": os.getpid(),
+            "started_at": self.started_at,
+            "duration": perf_counter() - self.started,
+            "interval": self.sampler.interval,
+            "path": self.path if self.requests else None,
+            "requests": self.profiled if self.requests else None,
+            "samples": self.sampler.samples,
+            "stacks": dict(self.sampler.stacks.most_common()),
+        }
+
+
+active_session: Optional[ProfileSession] = None
+sessions_lock = threading.Lock()
+
+
+def start_session(seconds: float, requests: Optional[int] = None, path: str = "*",
+                  interval: Optional[float] = None) -> ProfileSession:
+    """
+    Запускает сеанс; ValueError, если в процессе уже идет другой.
+    """
+    global active_session
+    with sessions_lock:
+        if active_session is not None:
+            raise ValueError(f"Уже идет сеанс {active_session.id}")
+        active_session = ProfileSession(seconds, requests, path, interval)
+        active_session.start()
+        return active_session
+
+
+def claim_request(path: str) -> Optional[ProfileSession]:
+    session = active_session
+    if session is None or not session.requests or not session.claim(path):
+        return None
+    return session
+
+
+def save_result(result: dict) -> None:
+    os.makedirs(settings.PROFILER_DIR, exist_ok=True)
+    path = os.path.join(settings.PROFILER_DIR, f"{result['id']}.json")
+    with open(f"{path}.tmp", "w") as file:
+        json.dump(result, file)
+    os.replace(f"{path}.tmp", path)
+
+
+def load_result(session_id: str) -> dict:
+    if not session_id.replace("-", "").isalnum():
+        raise Http404
+    try:
+        with open(os.path.join(settings.PROFILER_DIR, f"{session_id}.json")) as file:
+            return json.load(file)
+    except FileNotFoundError:
+        raise Http404
+
+
+def render_collapsed(result: dict) -> str:
+    return "".join(f"{stack} {count}\n" for stack, count in result["stacks"].items())
+
+
+def render_speedscope(result: dict) -> dict:
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in result["stacks"].items():
+        sample = []
+        for name in stack.split(";"):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({"name": name})
+            sample.append(index[name])
+        samples.append(sample)
+        weights.append(count * result["interval"])
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": result["id"],
+        "exporter": "mysite.profiler",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": f"pid {result['pid']}",
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+def check_staff(request: HttpRequest) -> None:
+    if not request.user.is_staff:
+        raise PermissionDenied
+
+
+@require_POST
+def profiler_start_view(request: HttpRequest) -> HttpResponse:
+    """
+    Запускает сеанс в текущем процессе: seconds - на время,
+    requests и path - на следующие запросы по шаблону пути.
+    """
+    check_staff(request)
+    params = request.POST or request.GET
+    try:
+        seconds = min(float(params.get("seconds", settings.PROFILER_MAX_SECONDS)), settings.PROFILER_MAX_SECONDS)
+        requests = int(params["requests"]) if "requests" in params else None
+        interval = float(params["interval"]) if "interval" in params else None
+    except ValueError:
+        return JsonResponse({"error": "Некорректные параметры"}, status=400)
+    if seconds <= 0 or (requests is not None and requests <= 0) or (interval is not None and interval < 0.001):
+        return JsonResponse({"error": "Некорректные параметры"}, status=400)
+    try:
+        session = start_session(seconds, requests, params.get("path", "*"), interval)
+    except ValueError as exc:
+        return JsonResponse({"error": str(exc)}, status=409)
+    return JsonResponse({"id": session.id, "pid": os.getpid(), "seconds": seconds, "requests": requests}, status=202)
+
+
+@require_GET
+def profiler_list_view(request: HttpRequest) -> HttpResponse:
+    check_staff(request)
+    sessions = []
+    if os.path.isdir(settings.PROFILER_DIR):
+        for filename in sorted(os.listdir(settings.PROFILER_DIR), reverse=True):
+            if filename.endswith(".json"):
+                result = load_result(filename[:-len(".json")])
+                result.pop("stacks")
+                sessions.append(result)
+    active = active_session
+    return JsonResponse({"active": active.id if active else None, "sessions": sessions})
+
+
+@require_GET
+def profiler_result_view(request: HttpRequest, session_id: str) -> HttpResponse:
+    check_staff(request)
+    result = load_result(session_id)
+    if request.GET.get("format") == "speedscope":
+        response = JsonResponse(render_speedscope(result))
+        response["Content-Disposition"] = f'attachment; filename="{session_id}.speedscope.json"'
+        return response
+    return HttpResponse(render_collapsed(result), content_type="text/plain; charset=utf-8")
@@ -0,0 +1,175 @@
+"""
+Учет SQL-запросов: бюджеты на число запросов и поиск N+1.
+
+Запросы с одинаковой формой (SQL без значений параметров; списки IN
+любой длины считаются одинаковыми), повторенные QUERY_REPEAT_THRESHOLD
+и более раз, считаются признаком N+1.
+
+    @query_budget(4)
+    class OrderListView(ListView):
+        ...
+
+    with query_budget(2):
+        self.client.get(url)
+
+Асинхронные представления (async def и классы с async-обработчиками)
+оборачиваются так же; в асинхронном коде бюджет открывается через
+async with.
+
+Превышение бюджета в тестах (QUERY_BUDGET_RAISE) вызывает
+QueryBudgetExceeded, в остальных случаях пишется предупреждение в лог.
+"""
+import logging
+import re
+from collections import Counter
+from contextlib import ExitStack
+from functools import wraps
+from time import perf_counter
+from typing import List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+
+
+logger = logging.getLogger(__name__)
+
+re_in_list = re.compile(r"\bIN \((?:%s, )*%s\)", re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def query_shape(sql: str) -> str:
+    return re_in_list.sub("IN (...)", sql)
+
+
+class QueryRecorder:
+    """
+    Обертка выполнения SQL (connection.execute_wrapper): считает запросы,
+    их суммарное время и повторы одинаковых запросов.
+
+    Атрибуты:
+    count: Integer - Число запросов
+    duration: Float - Суммарное время запросов, секунды
+    shapes: Counter - Число выполнений каждой формы запроса
+    """
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += perf_counter() - start
+            self.shapes[query_shape(sql)] += 1
+
+    def record(self) -> ExitStack:
+        stack = ExitStack()
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(self))
+        return stack
+
+    async def arecord(self) -> ExitStack:
+        """
+        record() для асинхронного кода. Асинхронный ORM выполняет запросы
+        в потоке sync_to_async, и соединения этого потока отличаются
+        от соединений цикла событий, поэтому обертки ставятся там же.
+        Закрывать полученный ExitStack можно из любого потока.
+        """
+        return await sync_to_async(self.record)()
+
+    def repeated(self, threshold: Optional[int] = None) -> List[Tuple[str, int]]:
+        threshold = threshold or settings.QUERY_REPEAT_THRESHOLD
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+
+def report(message: str) -> None:
+    if settings.QUERY_BUDGET_RAISE:
+        raise QueryBudgetExceeded(message)
+    logger.warning(message)
+
+
+class query_budget:
+    """
+    Бюджет запросов для представления (функции или класса) или блока кода.
+
+    Атрибуты:
+    max_queries: Integer - Допустимое число запросов
+    max_repeats: Integer - С какого числа повторов одинаковый запрос считается N+1
+    """
+    def __init__(self, max_queries: int, max_repeats: Optional[int] = None, name: str = ""):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.name = name
+        self.recorder = None
+        self.stack = None
+
+    def recreate(self, name: str) -> "query_budget":
+        return type(self)(self.max_queries, self.max_repeats, name)
+
+    def __call__(self, view):
+        if isinstance(view, type):
+            # У асинхронного класса dispatch возвращает корутину.
+            budget = self.recreate(view.__qualname__)
+            view.dispatch = budget.wrap(view.dispatch, getattr(view, "view_is_async", False))
+            return view
+        return self.wrap(view, iscoroutinefunction(view))
+
+    def wrap(self, view, is_async: bool):
+        name = self.name or view.__qualname__
+
+        if is_async:
+            @wraps(view)
+            async def async_wrapper(*args, **kwargs):
+                async with self.recreate(name):
+                    response = await view(*args, **kwargs)
+                    if callable(getattr(response, "render", None)):
+                        await sync_to_async(response.render)()
+                return response
+
+            return async_wrapper
+
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            with self.recreate(name):
+                response = view(*args, **kwargs)
+                # Шаблон рендерится вне представления: запросы из него
+                # тоже должны попасть в бюджет.
+                if callable(getattr(response, "render", None)):
+                    response.render()
+            return response
+
+        return wrapper
+
+    def __enter__(self):
+        self.recorder = QueryRecorder()
+        self.stack = self.recorder.record()
+        self.stack.__enter__()
+        return self.recorder
+
+    async def __aenter__(self):
+        self.recorder = QueryRecorder()
+        self.stack = await self.recorder.arecord()
+        return self.recorder
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        return self.__exit__(exc_type, exc_value, traceback)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stack.__exit__(exc_type, exc_value, traceback)
+        if exc_type is not None:
+            return False
+        recorder, name = self.recorder, self.name or "блок"
+        repeated = recorder.repeated(self.max_repeats)
+        if repeated:
+            shape, count = repeated[0]
+            report(f"{name}: запрос повторен {count} раз (N+1): {shape}")
+        if recorder.count > self.max_queries:
+            report(f"{name}: выполнено запросов {recorder.count} при бюджете {self.max_queries}")
+        return False
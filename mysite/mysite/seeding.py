@@ -0,0 +1,217 @@
+"""
+Генерация больших объемов тестовых данных для магазина и блога.
+
+Данные воспроизводимы: при одном и том же seed и одинаковом начальном
+состоянии базы получаются одни и те же строки с теми же первичными
+ключами. Первичные ключи назначаются явно, поэтому связи (заказ - продукты,
+статья - теги) вычисляются без чтения созданных объектов из базы
+и без хранения их в памяти. Строки пишутся пакетами bulk_create,
+в том числе промежуточные таблицы ManyToMany.
+"""
+import random
+from decimal import Decimal
+from itertools import islice
+from timeit import default_timer
+from typing import Callable, Dict, Iterable, Iterator, Optional
+
+from django.contrib.auth.models import User
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max, Model
+
+from blogapp.models import Article, Author, Category, Tag
+from mysite.model_versions import bump_all_versions
+from shopapp.models import Order, Product
+from shopapp.search import drop_product_fts, ensure_product_fts, fts_available
+from shopapp.totals import refresh_order_totals
+
+
+# Объем данных на единицу масштаба.
+SCALE_UNIT = {
+    "users": 100,
+    "products": 1000,
+    "orders": 1000,
+    "authors": 10,
+    "categories": 2,
+    "tags": 5,
+    "articles": 200,
+}
+
+PRODUCTS_PER_ORDER = 5
+TAGS_PER_ARTICLE = 3
+
+WORDS = [
+    "ноутбук", "телефон", "сумка", "часы", "наушники", "камера", "планшет", "монитор",
+    "клавиатура", "мышь", "колонка", "роутер", "принтер", "кабель", "зарядка", "чехол",
+]
+STREETS = ["Ленина", "Мира", "Садовая", "Лесная", "Школьная", "Советская", "Новая", "Полевая"]
+
+
+def scale_counts(scale: float) -> Dict[str, int]:
+    return {name: max(1, int(unit * scale)) for name, unit in SCALE_UNIT.items()}
+
+
+class Seeder:
+    """
+    Заполнение базы данными.
+
+    Атрибуты:
+    counts: Dict[String, Integer] - Сколько строк каждого вида создать
+    rng: Random - Генератор случайных чисел, инициализированный seed
+    batch_size: Integer - Размер пакета bulk_create
+    progress: Callable - Вывод сообщений о ходе заполнения
+    """
+    def __init__(self, counts: Dict[str, int], seed: int = 0, batch_size: int = 5000,
+                 progress: Optional[Callable[[str], None]] = None):
+        self.counts = counts
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.progress = progress or (lambda message: None)
+        self.first_pk: Dict[str, int] = {}
+
+    def next_pk(self, model) -> int:
+        return (model.objects.aggregate(last=Max("pk"))["last"] or 0) + 1
+
+    def insert(self, label: str, model, objects: Iterable[Model]) -> int:
+        started, created = default_timer(), 0
+        objects = iter(objects)
+        while batch := list(islice(objects, self.batch_size)):
+            with transaction.atomic():
+                model.objects.bulk_create(batch)
+            created += len(batch)
+        elapsed = default_timer() - started
+        self.progress(f"{label}: {created} ({created / max(elapsed, 1e-9):.0f} строк/с)")
+        return created
+
+    def random_pk(self, name: str) -> int:
+        return self.first_pk[name] + self.rng.randrange(self.counts[name])
+
+    def sample_pks(self, name: str, count: int) -> Iterator[int]:
+        count = min(count, self.counts[name])
+        return (self.first_pk[name] + index for index in self.rng.sample(range(self.counts[name]), count))
+
+    # Магазин
+
+    def users(self) -> Iterator[User]:
+        first = self.first_pk["users"] = self.next_pk(User)
+        for pk in range(first, first + self.counts["users"]):
+            yield User(pk=pk, username=f"user_{pk}", password="!", email=f"user_{pk}@example.com")
+
+    def products(self) -> Iterator[Product]:
+        first = self.first_pk["products"] = self.next_pk(Product)
+        for pk in range(first, first + self.counts["products"]):
+            name = f"{self.rng.choice(WORDS)} {pk}"
+            yield Product(
+                pk=pk,
+                name=name[:30],
+                description=" ".join(self.rng.choices(WORDS, k=self.rng.randint(5, 30))),
+                price=Decimal(self.rng.randint(100, 10_000_000)) / 100,
+                discount=self.rng.choice((0, 0, 0, 5, 10, 15, 20, 30)),
+                quantity=self.rng.randint(0, 500),
+                created_by_id=self.random_pk("users"),
+                archived=self.rng.random() < 0.05,
+            )
+
+    def orders(self) -> Iterator[Order]:
+        first = self.first_pk["orders"] = self.next_pk(Order)
+        for pk in range(first, first + self.counts["orders"]):
+            yield Order(
+                pk=pk,
+                delivery_address=f"ул. {self.rng.choice(STREETS)}, д. {self.rng.randint(1, 200)}",
+                promocode=self.rng.choice(("", "", "", "SALE10", "WELCOME")),
+                user_id=self.random_pk("users"),
+            )
+
+    def order_products(self) -> Iterator[Model]:
+        through = Order.products.through
+        first = self.first_pk["orders"]
+        for order_id in range(first, first + self.counts["orders"]):
+            for product_id in self.sample_pks("products", self.rng.randint(1, PRODUCTS_PER_ORDER * 2 - 1)):
+                yield through(order_id=order_id, product_id=product_id)
+
+    # Блог
+
+    def named(self, name: str, model, title: str) -> Iterator[Model]:
+        first = self.first_pk[name] = self.next_pk(model)
+        for pk in range(first, first + self.counts[name]):
+            yield model(pk=pk, name=f"{title} {pk}"[:20])
+
+    def authors(self) -> Iterator[Author]:
+        first = self.first_pk["authors"] = self.next_pk(Author)
+        for pk in range(first, first + self.counts["authors"]):
+            yield Author(pk=pk, name=f"Автор {pk}", bio=" ".join(self.rng.choices(WORDS, k=20)))
+
+    def articles(self) -> Iterator[Article]:
+        first = self.first_pk["articles"] = self.next_pk(Article)
+        for pk in range(first, first + self.counts["articles"]):
+            yield Article(
+                pk=pk,
+                title=f"Статья {pk}: {self.rng.choice(WORDS)}",
+                content=" ".join(self.rng.choices(WORDS, k=self.rng.randint(50, 300))),
+                author_id=self.random_pk("authors"),
+                category_id=self.random_pk("categories"),
+                created_by_id=self.random_pk("users"),
+            )
+
+    def article_tags(self) -> Iterator[Model]:
+        through = Article.tags.through
+        first = self.first_pk["articles"]
+        for article_id in range(first, first + self.counts["articles"]):
+            for tag_id in self.sample_pks("tags", TAGS_PER_ARTICLE):
+                yield through(article_id=article_id, tag_id=tag_id)
+
+    def run(self) -> None:
+        # Полнотекстовый индекс дешевле перестроить один раз, чем вести
+        # триггерами на каждую вставку.
+        rebuild_fts = fts_available(connection.alias)
+        if rebuild_fts:
+            drop_product_fts(connection.alias)
+        synchronous = None
+        if connection.vendor == "sqlite" and not connection.in_atomic_block:
+            with connection.cursor() as cursor:
+                cursor.execute("PRAGMA synchronous")
+                synchronous = cursor.fetchone()[0]
+                cursor.execute("PRAGMA synchronous = OFF")
+        try:
+            self.insert_all()
+        finally:
+            if synchronous is not None:
+                with connection.cursor() as cursor:
+                    cursor.execute(f"PRAGMA synchronous = {int(synchronous)}")
+        if rebuild_fts:
+            ensure_product_fts(connection.alias)
+        # bulk_create не отправляет сигналы: версии всех моделей, от которых
+        # зависят кэши, увеличиваются явно.
+        bump_all_versions()
+
+    def insert_all(self) -> None:
+        self.insert("Пользователи", User, self.users())
+        self.insert("Продукты", Product, self.products())
+        self.insert("Заказы", Order, self.orders())
+        self.insert("Продукты в заказах", Order.products.through, self.order_products())
+        started = default_timer()
+        first = self.first_pk["orders"]
+        refresh_order_totals(Order.objects.filter(pk__gte=first, pk__lt=first + self.counts["orders"]))
+        self.progress(f"Итоги заказов пересчитаны за {default_timer() - started:.1f} с")
+
+        self.insert("Авторы", Author, self.authors())
+        self.insert("Категории", Category, self.named("categories", Category, "Категория"))
+        self.insert("Теги", Tag, self.named("tags", Tag, "Тег"))
+        self.insert("Статьи", Article, self.articles())
+        self.insert("Теги статей", Article.tags.through, self.article_tags())
+
+        # Ключи назначены явно: последовательности (PostgreSQL и др.) нужно сдвинуть.
+        models = [User, Product, Order, Author, Category, Tag, Article]
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), models):
+                cursor.execute(sql)
+
+
+def seed(counts: Dict[str, int], seed: int = 0, batch_size: int = 5000,
+         progress: Optional[Callable[[str], None]] = None) -> Dict[str, int]:
+    """
+    Создает данные и возвращает первичный ключ первой созданной строки каждого вида.
+    """
+    seeder = Seeder(counts, seed=seed, batch_size=batch_size, progress=progress)
+    seeder.run()
+    return seeder.first_pk
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.0/ref/settings/
 """
 import logging.config
+import sys
 from os import getenv, path
 from dotenv import load_dotenv
 from pathlib import Path
@@ -21,19 +22,19 @@ load_dotenv()
 
 sentry_sdk.init(
     dsn="https://622389031f0819aee853bfe470eb251e@o4506897869897728.ingest.us.sentry.io/4507537044865024",
-    # Set traces_sample_rate to 1.0 to capture 100%
-    # of transactions for performance monitoring.
-    traces_sample_rate=1.0,
-    # Set profiles_sample_rate to 1.0 to profile 100%
-    # of sampled transactions.
-    # We recommend adjusting this value in production.
-    profiles_sample_rate=1.0,
+    # Доля запросов, которые трассируются и профилируются в Sentry.
+    # По умолчанию выключено: профилировать процесс по запросу можно
+    # через mysite.profiler (/profiler/).
+    traces_sample_rate=float(getenv("SENTRY_TRACES_SAMPLE_RATE", 0)),
+    profiles_sample_rate=float(getenv("SENTRY_PROFILES_SAMPLE_RATE", 0)),
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 DATABASE_DIR = BASE_DIR / "database"
 
+TESTING = len(sys.argv) > 1 and sys.argv[1] == "test"
+
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/5.0/howto/deployment/checklist/
 
@@ -82,9 +83,13 @@ INSTALLED_APPS = [
     'myauth.apps.MyauthConfig',
     'myapiapp.apps.MyapiappConfig',
     'blogapp.apps.BlogappConfig',
+    'jobsapp.apps.JobsappConfig',
 ]
 
 MIDDLEWARE = [
+    'requestdataapp.middlewares.CountRequestMiddleware',
+    'requestdataapp.middlewares.ProfilerMiddleware',
+    'requestdataapp.middlewares.DatabaseRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -93,8 +98,7 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'requestdataapp.middlewares.set_useragent_on_request',
-    'requestdataapp.middlewares.CountRequestMiddleware',
-    # 'requestdataapp.middlewares.ThrottleMiddleware',
+    'requestdataapp.middlewares.RateLimitMiddleware',
     'django.middleware.locale.LocaleMiddleware',
     'django.contrib.admindocs.middleware.XViewMiddleware',
 ]
@@ -132,16 +136,98 @@ DATABASES = {
     }
 }
 
+# Реплика для чтения (mysite.db_routers). Локально это второй файл SQLite,
+# который заполняется командой manage.py sync_replicas. В тестах реплика
+# зеркалирует тестовую базу, маршрутизация включается в тестах роутера.
+DATABASE_REPLICA = getenv("DJANGO_DATABASE_REPLICA")
+if DATABASE_REPLICA or TESTING:
+    DATABASES['replica'] = {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': DATABASE_REPLICA or DATABASE_DIR / 'replica.sqlite3',
+        'TEST': {'MIRROR': 'default'},
+    }
+DATABASE_REPLICAS = {'default': ['replica']} if DATABASE_REPLICA else {}
+DATABASE_ROUTERS = ['mysite.db_routers.PrimaryReplicaRouter']
+
+# Сколько секунд после записи клиент читает из основной базы, а не с реплики.
+REPLICA_STICKY_COOKIE = 'db_primary'
+REPLICA_STICKY_SECONDS = 10
+
 CACHES = {
     "default": {
-        "BACKEND": "django.core.cache.backends.dummy.DummyCache",
-        # "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
-        # "LOCATION": "A:/var/tmp/django_cache",
+        # Общий для всех процессов gunicorn кэш в файле SQLite (WAL).
+        "BACKEND": "mysite.cache_backends.SQLiteCache",
+        "LOCATION": getenv("DJANGO_CACHE_LOCATION", DATABASE_DIR / "cache.sqlite3"),
+        "TIMEOUT": 300,
+        "OPTIONS": {
+            "MAX_BYTES": int(getenv("DJANGO_CACHE_MAX_BYTES", 64 * 1024 * 1024)),
+        },
     },
 }
 
+if TESTING:
+    # Файл кэша переживает запуски тестов, поэтому тесты работают без кэша,
+    # а кэширующие проверки подключают свой бэкенд через override_settings.
+    CACHES["default"] = {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}
+
 CACHE_MIDDLEWARE_SECONDS = 180
 
+# Кэш фрагментов шаблонов ({% fragment %}, mysite.fragments): ключи меняются
+# вместе с версиями моделей, старые фрагменты просто истекают.
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Метрики (mysite.metrics): каталог, куда процессы сбрасывают свои метрики,
+# и период сброса в секундах. None - метрики только текущего процесса.
+METRICS_DIR = None if TESTING else getenv("DJANGO_METRICS_DIR", DATABASE_DIR / "metrics")
+METRICS_FLUSH_INTERVAL = 1.0
+
+# Профилирование по запросу (mysite.profiler): каталог результатов,
+# общий для всех процессов, период выборки стеков и предельная
+# длительность сеанса в секундах.
+PROFILER_DIR = getenv("DJANGO_PROFILER_DIR", DATABASE_DIR / "profiles")
+PROFILER_INTERVAL = 0.005
+PROFILER_MAX_SECONDS = 60
+
+# Бюджеты запросов (mysite.querycount): сколько повторов одинакового
+# SQL-запроса считается N+1 и что делать при превышении бюджета -
+# исключение (в тестах) или предупреждение в лог.
+QUERY_REPEAT_THRESHOLD = 3
+QUERY_BUDGET_RAISE = TESTING
+
+# Ограничение частоты запросов (requestdataapp.middlewares.RateLimitMiddleware).
+# Применяется первая подходящая политика. views - шаблоны имен маршрутов,
+# лимиты задаются для anon, user и staff в виде "число/период" (s, m, h, d);
+# отсутствующий лимит означает отсутствие ограничения.
+RATE_LIMITS = [
+    {
+        "name": "exports",
+        "views": ["shopapp:*_export"],
+        "anon": "10/m",
+        "user": "30/m",
+    },
+    {
+        "name": "api-write",
+        "views": ["shopapp:product-*", "shopapp:order-*", "jobsapp:*"],
+        "methods": ["POST", "PUT", "PATCH", "DELETE"],
+        "anon": "20/m",
+        "user": "120/m",
+    },
+    {
+        "name": "default",
+        "anon": "300/m",
+        "user": "600/m",
+    },
+]
+
+# Анонимные клиенты различаются по адресу. За фронтальным прокси REMOTE_ADDR -
+# адрес прокси, поэтому адрес клиента берется из заголовка
+# RATE_LIMIT_CLIENT_IP_HEADER (например X-Forwarded-For), но только если запрос
+# пришел с адреса из RATE_LIMIT_TRUSTED_PROXIES (адреса или подсети).
+RATE_LIMIT_CLIENT_IP_HEADER = getenv("DJANGO_RATE_LIMIT_CLIENT_IP_HEADER", "")
+RATE_LIMIT_TRUSTED_PROXIES = [
+    proxy for proxy in getenv("DJANGO_RATE_LIMIT_TRUSTED_PROXIES", "").split(",") if proxy
+]
+
 # Password validation
 # https://docs.djangoproject.com/en/5.0/ref/settings/#auth-password-validators
 
@@ -189,18 +275,54 @@ STATIC_ROOT = path.join(BASE_DIR, 'css')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = path.join(BASE_DIR, 'uploads')
 
+# Файлы MEDIA_ROOT отдает mysite.media с проверкой прав. MEDIA_ACCEL - кто
+# передает байты: '' - сам Django (Range, os.sendfile под gunicorn),
+# 'nginx' - X-Accel-Redirect на MEDIA_ACCEL_PREFIX, 'sendfile' - X-Sendfile.
+MEDIA_ACCEL = getenv('DJANGO_MEDIA_ACCEL', '')
+MEDIA_ACCEL_PREFIX = getenv('DJANGO_MEDIA_ACCEL_PREFIX', '/protected-media/')
+MEDIA_MAX_AGE = 60 * 60
+
+# Входные файлы и результаты фоновых задач (jobsapp.storage): вне MEDIA_ROOT,
+# отдаются только через /api/jobs/<pk>/download/.
+JOB_FILES_ROOT = getenv('DJANGO_JOB_FILES_ROOT', DATABASE_DIR / 'jobs')
+
 STATICFILES_DIRS = [
     path.join(BASE_DIR, 'shopapp/static'),
     path.join(BASE_DIR, 'myauth/static'),
     path.join(BASE_DIR, 'blogapp/static'),
 ]
 
+# collectstatic пишет файлы с хэшем в имени и сжатые копии (mysite.staticfiles),
+# их отдает обертка приложения в mysite.wsgi / mysite.asgi. Тестам манифест
+# не нужен. STATIC_MAX_AGE - время кэширования файлов без хэша в имени.
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'
+        if TESTING else 'mysite.staticfiles.CompressedManifestStaticFilesStorage',
+    },
+}
+STATIC_MAX_AGE = 60
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-DJANGORESIZED_DEFAULT_FORCE_FORMAT = 'JPEG'
-DJANGORESIZED_DEFAULT_SIZE = [500, 300]
+
+# Производные изображения (mysite.images): варианты размера (ограничивающий
+# прямоугольник в пикселях), форматы в порядке предпочтения (последний -
+# запасной для браузеров), качество сжатия и число потоков, в которых
+# сохраняются загруженные оригиналы и создаются производные.
+IMAGE_VARIANTS = {
+    'thumb': (120, 120),
+    'list': (240, 240),
+    'detail': (800, 800),
+}
+IMAGE_FORMATS = ['webp', 'jpeg']
+IMAGE_QUALITY = 80
+IMAGE_WORKERS = 4
 
 LOGIN_REDIRECT_URL = '/account/profile/list'
 LOGOUT_REDIRECT_URL = '/account/login/'
@@ -0,0 +1,282 @@
+"""
+Статические файлы без Django: сжатые заранее копии и отдача до middleware.
+
+CompressedManifestStaticFilesStorage при collectstatic записывает файлы
+с хэшем содержимого в имени (ManifestStaticFilesStorage) и рядом с каждым
+текстовым файлом - сжатые копии .gz и, если установлен пакет brotli, .br.
+
+StaticFilesWSGIHandler и StaticFilesASGIHandler оборачивают приложение
+(mysite.wsgi, mysite.asgi) и отдают файлы из STATIC_ROOT сами, не доходя
+до middleware и представлений: сжатую копию по заголовку Accept-Encoding,
+файлы с хэшем в имени - с бессрочным кэшированием (immutable).
+Остальные запросы и файлы, которых нет в STATIC_ROOT, уходят в приложение.
+"""
+import gzip
+import mimetypes
+import os
+import re
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+from django.utils.http import http_date
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+COMPRESSIBLE_EXTENSIONS = {
+    ".css", ".js", ".mjs", ".map", ".json", ".svg", ".txt", ".xml", ".html", ".ico", ".ttf", ".otf", ".eot",
+}
+MIN_COMPRESS_SIZE = 256
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+CHUNK_SIZE = 64 * 1024
+
+re_hashed_name = re.compile(r"\.[0-9a-f]{12}\.[^./]+$")
+
+
+def compressors() -> List[Tuple[str, Callable[[bytes], bytes]]]:
+    """
+    Доступные способы сжатия: (расширение копии, функция), лучший первым.
+    """
+    result = []
+    if brotli is not None:
+        result.append((".br", lambda data: brotli.compress(data, quality=11)))
+    result.append((".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)))
+    return result
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    ManifestStaticFilesStorage, который после обработки файлов
+    записывает их сжатые копии. Копия сохраняется, только если она
+    заметно меньше оригинала.
+    """
+    def post_process(self, paths, dry_run=False, **options):
+        names = set()
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if not isinstance(processed, Exception):
+                names.update((name, hashed_name))
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names - {None}):
+            self.compress(name)
+
+    def compress(self, name: str) -> None:
+        if os.path.splitext(name)[1].lower() not in COMPRESSIBLE_EXTENSIONS or not self.exists(name):
+            return
+        with self.open(name) as file:
+            data = file.read()
+        if len(data) < MIN_COMPRESS_SIZE:
+            return
+        for extension, compress in compressors():
+            compressed = compress(data)
+            if len(compressed) >= len(data) * 0.95:
+                continue
+            if self.exists(name + extension):
+                self.delete(name + extension)
+            self._save(name + extension, ContentFile(compressed))
+
+
+@dataclass
+class StaticFile:
+    """
+    Файл в STATIC_ROOT и его сжатые копии.
+
+    Атрибуты:
+    path: String - Путь к файлу
+    size: Integer - Размер в байтах
+    mtime: Float - Время изменения
+    content_type: String - MIME-тип
+    immutable: Boolean - В имени есть хэш содержимого
+    encodings: Dict - Сжатые копии: кодировка -> (путь, размер)
+    """
+    path: str
+    size: int
+    mtime: float
+    content_type: str
+    immutable: bool
+    encodings: Dict[str, Tuple[str, int]] = field(default_factory=dict)
+
+    def etag(self, encoding: Optional[str]) -> str:
+        suffix = f"-{encoding}" if encoding else ""
+        return f'"{int(self.mtime):x}-{self.size:x}{suffix}"'
+
+
+ENCODING_EXTENSIONS = {"br": ".br", "gzip": ".gz"}
+
+
+def accepted_encodings(header: str) -> List[str]:
+    """
+    Кодировки из Accept-Encoding, кроме запрещенных через q=0.
+    """
+    result = []
+    for part in header.split(","):
+        token, *params = [value.strip() for value in part.split(";")]
+        quality = 1.0
+        for param in params:
+            if param.startswith("q="):
+                try:
+                    quality = float(param[2:])
+                except ValueError:
+                    quality = 0.0
+        if token and quality > 0:
+            result.append(token.lower())
+    return result
+
+
+class StaticFiles:
+    """
+    Индекс файлов STATIC_ROOT и ответы на запросы к ним.
+    Индекс строится один раз (файлы меняет только collectstatic
+    с перезапуском), при DEBUG - на каждый запрос к STATIC_URL.
+
+    Атрибуты:
+    prefix: String - Путь STATIC_URL
+    files: Dict - Файлы по адресу
+    """
+    def __init__(self):
+        self.prefix = urlparse(settings.STATIC_URL or "").path if settings.STATIC_ROOT else ""
+        self.files: Optional[Dict[str, StaticFile]] = None
+
+    def build(self) -> Dict[str, StaticFile]:
+        files = {}
+        root = str(settings.STATIC_ROOT)
+        for directory, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(directory, name)
+                if os.path.splitext(name)[1] in (".gz", ".br") and os.path.exists(path[:-3]):
+                    continue
+                stat = os.stat(path)
+                static_file = StaticFile(
+                    path=path,
+                    size=stat.st_size,
+                    mtime=stat.st_mtime,
+                    content_type=mimetypes.guess_type(name)[0] or "application/octet-stream",
+                    immutable=bool(re_hashed_name.search(name)),
+                )
+                for encoding, extension in ENCODING_EXTENSIONS.items():
+                    if os.path.exists(path + extension):
+                        static_file.encodings[encoding] = (path + extension, os.path.getsize(path + extension))
+                url = self.prefix + os.path.relpath(path, root).replace(os.sep, "/")
+                files[url] = static_file
+        return files
+
+    def find(self, path: str) -> Optional[StaticFile]:
+        if not self.prefix or not path.startswith(self.prefix):
+            return None
+        if self.files is None or settings.DEBUG:
+            self.files = self.build()
+        return self.files.get(path)
+
+    def respond(
+            self, path: str, method: str, headers: Dict[str, str],
+    ) -> Optional[Tuple[int, List[Tuple[str, str]], Optional[str]]]:
+        """
+        Ответ на запрос к статическому файлу: (статус, заголовки, путь
+        к отдаваемому файлу или None без тела). None - файла нет.
+        """
+        if method not in ("GET", "HEAD"):
+            return None
+        static_file = self.find(path)
+        if static_file is None:
+            return None
+        encoding, (file_path, size) = None, (static_file.path, static_file.size)
+        accepted = accepted_encodings(headers.get("accept-encoding", ""))
+        for candidate in ("br", "gzip"):
+            if candidate in accepted and candidate in static_file.encodings:
+                encoding, (file_path, size) = candidate, static_file.encodings[candidate]
+                break
+        max_age = IMMUTABLE_MAX_AGE if static_file.immutable else settings.STATIC_MAX_AGE
+        cache_control = f"public, max-age={max_age}" + (", immutable" if static_file.immutable else "")
+        etag = static_file.etag(encoding)
+        response_headers = [
+            ("Cache-Control", cache_control),
+            ("ETag", etag),
+            ("Last-Modified", http_date(static_file.mtime)),
+        ]
+        if static_file.encodings:
+            response_headers.append(("Vary", "Accept-Encoding"))
+        if headers.get("if-none-match") == etag:
+            return 304, response_headers, None
+        response_headers += [("Content-Type", static_file.content_type), ("Content-Length", str(size))]
+        if encoding:
+            response_headers.append(("Content-Encoding", encoding))
+        return 200, response_headers, file_path if method == "GET" else None
+
+
+def read_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as file:
+        yield from iter(lambda: file.read(CHUNK_SIZE), b"")
+
+
+class StaticFilesWSGIHandler:
+    """
+    WSGI-обертка приложения, отдающая файлы STATIC_ROOT.
+    """
+    def __init__(self, application):
+        self.application = application
+        self.static_files = StaticFiles()
+
+    def __call__(self, environ, start_response):
+        headers = {
+            name[5:].replace("_", "-").lower(): value for name, value in environ.items() if name.startswith("HTTP_")
+        }
+        found = self.static_files.respond(environ.get("PATH_INFO", ""), environ["REQUEST_METHOD"], headers)
+        if found is None:
+            return self.application(environ, start_response)
+        status, response_headers, path = found
+        start_response("200 OK" if status == 200 else "304 Not Modified", response_headers)
+        if path is None:
+            return []
+        file_wrapper = environ.get("wsgi.file_wrapper")
+        if file_wrapper is not None:
+            return file_wrapper(open(path, "rb"), CHUNK_SIZE)
+        return read_chunks(path)
+
+
+class StaticFilesASGIHandler:
+    """
+    ASGI-обертка приложения, отдающая файлы STATIC_ROOT.
+    Файл читается в пуле потоков, цикл событий не блокируется.
+    """
+    def __init__(self, application):
+        self.application = application
+        self.static_files = StaticFiles()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope["headers"]}
+            found = self.static_files.respond(scope["path"], scope["method"], headers)
+            if found is not None:
+                await self.send_file(send, *found)
+                return
+        await self.application(scope, receive, send)
+
+    @staticmethod
+    async def send_file(send, status: int, headers: List[Tuple[str, str]], path: Optional[str]) -> None:
+        await send({
+            "type": "http.response.start",
+            "status": status,
+            "headers": [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers],
+        })
+        if path is None:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        file = await sync_to_async(open, thread_sensitive=False)(path, "rb")
+        try:
+            while True:
+                chunk = await sync_to_async(file.read, thread_sensitive=False)(CHUNK_SIZE)
+                more = len(chunk) == CHUNK_SIZE
+                await send({"type": "http.response.body", "body": chunk, "more_body": more})
+                if not more:
+                    break
+        finally:
+            file.close()
@@ -0,0 +1,419 @@
+import asyncio
+import gzip
+import io
+import json
+import os
+import sqlite3
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connections, transaction
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils.translation import override
+
+from jobsapp.models import Job
+from shopapp.models import Order
+
+from . import db_routers, metrics, profiler
+from .staticfiles import StaticFilesASGIHandler, StaticFilesWSGIHandler
+from .cache_backends import SQLiteCache
+
+
+class SQLiteCacheTestCase(SimpleTestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.location = os.path.join(self.tmp_dir.name, 'cache.sqlite3')
+        self.cache = self.make_cache()
+
+    def make_cache(self, **options):
+        cache = SQLiteCache(self.location, {'OPTIONS': options})
+        self.addCleanup(lambda: cache._connection and cache._connection.close())
+        return cache
+
+    def test_values_are_shared_between_instances(self):
+        other = self.make_cache()
+        self.cache.set('products', {'pk': 1}, timeout=60)
+        self.assertEqual(other.get('products'), {'pk': 1})
+        self.assertEqual(other.get_many(['products', 'missing']), {'products': {'pk': 1}})
+        other.delete('products')
+        self.assertIsNone(self.cache.get('products'))
+
+    def test_expired_values_are_missing(self):
+        self.cache.set('expired', 1, timeout=-1)
+        self.assertIsNone(self.cache.get('expired'))
+        self.assertTrue(self.cache.add('expired', 2))
+        self.assertFalse(self.cache.add('expired', 3))
+        self.assertEqual(self.cache.get('expired'), 2)
+
+    def test_incr_is_atomic(self):
+        self.cache.set('counter', 0, timeout=None)
+        caches = [self.make_cache() for _ in range(4)]
+
+        def increment(cache):
+            for _ in range(50):
+                cache.incr('counter')
+
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            list(executor.map(increment, caches))
+        self.assertEqual(self.cache.get('counter'), 200)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_least_recently_used_values_are_evicted(self):
+        cache = self.make_cache(MAX_BYTES=10_000, ACCESS_RESOLUTION=0)
+        cache.set('hot', b'x' * 1000)
+        for index in range(30):
+            cache.get('hot')
+            cache.set(f'cold-{index}', b'x' * 1000)
+        self.assertLessEqual(cache.total_bytes(), 10_000)
+        self.assertIsNotNone(cache.get('hot'))
+        self.assertIsNone(cache.get('cold-0'))
+        self.assertIsNotNone(cache.get('cold-29'))
+
+
+class MetricsTestCase(TestCase):
+    def setUp(self):
+        metrics.registry.reset()
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+
+    def test_request_metrics(self):
+        self.client.get(reverse('requestdataapp:get_view'))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        text = response.content.decode()
+        self.assertIn(
+            'http_requests_total{method="GET",status="200",view="requestdataapp:get_view"} 1', text,
+        )
+        self.assertIn('http_request_duration_seconds_count{view="requestdataapp:get_view"} 1', text)
+        self.assertIn('http_request_duration_seconds_bucket{view="requestdataapp:get_view",le="+Inf"} 1', text)
+
+    async def test_async_request_metrics(self):
+        # Запросы асинхронного ORM выполняются в другом потоке и тоже учитываются.
+        with override('ru'):
+            url = reverse('shopapp:products_list')
+        await self.async_client.get(url)
+        text = metrics.render(*metrics.aggregate(metrics.load_snapshots()))
+        self.assertIn('http_requests_total{method="GET",status="200",view="shopapp:products_list"} 1', text)
+        self.assertIn('db_queries_total{view="shopapp:products_list"} 1', text)
+
+    @override_settings(INTERNAL_IPS=[])
+    def test_metrics_are_private(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.client.force_login(User.objects.create_user(username='admin', password='admin', is_staff=True))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 200)
+
+    def test_processes_are_aggregated(self):
+        with override_settings(METRICS_DIR=self.tmp_dir.name):
+            other_process = {
+                'counters': [['db_queries_total', [['view', 'shopapp:index']], 5]],
+                'histograms': [],
+            }
+            with open(os.path.join(self.tmp_dir.name, '1-0.json'), 'w') as file:
+                json.dump(other_process, file)
+            metrics.inc('db_queries_total', 2, view='shopapp:index')
+            counters, _ = metrics.aggregate(metrics.load_snapshots())
+        self.assertEqual(counters[('db_queries_total', (('view', 'shopapp:index'),))], 7)
+        self.assertEqual(len([name for name in os.listdir(self.tmp_dir.name) if name.endswith('.json')]), 2)
+
+    def test_dead_processes_are_compacted(self):
+        dead = subprocess.Popen(['true'])
+        dead.wait()
+        snapshot = {'counters': [['db_queries_total', [['view', 'shopapp:index']], 5]], 'histograms': []}
+        for name in (f'{dead.pid}-0.json', f'{dead.pid}-1.json'):
+            with open(os.path.join(self.tmp_dir.name, name), 'w') as file:
+                json.dump(snapshot, file)
+        with override_settings(METRICS_DIR=self.tmp_dir.name):
+            metrics.registry.flush(force=True)
+            counters, _ = metrics.aggregate(metrics.load_snapshots())
+            self.assertEqual(counters[('db_queries_total', (('view', 'shopapp:index'),))], 10)
+            self.assertEqual(
+                [name for name in os.listdir(self.tmp_dir.name) if name.endswith('.json')],
+                [metrics.AGGREGATE_FILENAME],
+            )
+            counters, _ = metrics.aggregate(metrics.load_snapshots())
+        self.assertEqual(counters[('db_queries_total', (('view', 'shopapp:index'),))], 10)
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class ProfilerTestCase(TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp_dir.cleanup)
+        self.settings_override = override_settings(PROFILER_DIR=self.tmp_dir.name)
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+        self.client.force_login(User.objects.create_user(username='admin', password='admin', is_staff=True))
+
+    def test_profile_threads_for_seconds(self):
+        stop = threading.Event()
+        worker = threading.Thread(target=busy_loop, args=(stop,))
+        worker.start()
+        session = profiler.start_session(seconds=0.2, interval=0.002)
+        session.timer.join()
+        stop.set()
+        worker.join()
+        while not session.finished:
+            time.sleep(0.01)
+
+        response = self.client.get(reverse('profiler_result', kwargs={'session_id': session.id}))
+        self.assertEqual(response.status_code, 200)
+        busy_stacks = [line for line in response.content.decode().splitlines() if 'busy_loop (' in line]
+        self.assertTrue(busy_stacks)
+        stack, count = busy_stacks[0].rsplit(' ', 1)
+        self.assertGreater(int(count), 0)
+
+        response = self.client.get(
+            reverse('profiler_result', kwargs={'session_id': session.id}), {'format': 'speedscope'},
+        )
+        speedscope = response.json()
+        frames = [frame['name'] for frame in speedscope['shared']['frames']]
+        self.assertTrue(any(name.startswith('busy_loop (') for name in frames))
+        self.assertEqual(len(speedscope['profiles'][0]['samples']), len(speedscope['profiles'][0]['weights']))
+
+    def test_profile_next_requests(self):
+        with override('ru'):
+            products_url = reverse('shopapp:products_list')
+        response = self.client.post(
+            reverse('profiler_start'), {'requests': 2, 'path': '/ru/shop/products/*', 'interval': 0.001},
+        )
+        self.assertEqual(response.status_code, 202)
+        session_id = response.json()['id']
+        self.assertEqual(self.client.post(reverse('profiler_start'), {'seconds': 1}).status_code, 409)
+
+        self.client.get(reverse('requestdataapp:get_view'))
+        self.client.get(products_url)
+        self.assertIsNotNone(profiler.active_session)
+        self.client.get(products_url)
+        self.assertIsNone(profiler.active_session)
+
+        sessions = self.client.get(reverse('profiler')).json()['sessions']
+        self.assertEqual([(session['id'], session['requests']) for session in sessions], [(session_id, 2)])
+
+    def test_profiler_is_staff_only(self):
+        self.client.logout()
+        self.assertEqual(self.client.get(reverse('profiler')).status_code, 403)
+        self.assertEqual(self.client.post(reverse('profiler_start'), {'seconds': 1}).status_code, 403)
+
+
+@override_settings(DATABASE_REPLICAS={'default': ['replica']})
+class DatabaseRouterTestCase(TransactionTestCase):
+    # Реплика в тестах - зеркало тестовой базы с отдельным соединением.
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='test_user', password='test_password')
+        with override('ru'):
+            self.products_url = reverse('shopapp:products_list')
+            self.login_url = reverse('myauth:login')
+
+    def test_reads_go_to_replica_writes_to_primary(self):
+        with db_routers.use_replicas():
+            with CaptureQueriesContext(connections['replica']) as replica_queries:
+                user = User.objects.get(pk=self.user.pk)
+            self.assertEqual(len(replica_queries), 1)
+            self.assertEqual(user._state.db, 'replica')
+            with CaptureQueriesContext(connections['replica']) as replica_queries:
+                user.first_name = 'Иван'
+                user.save()
+                # После записи читается основная база.
+                User.objects.count()
+            self.assertEqual(len(replica_queries), 0)
+        self.assertEqual(User.objects.using('default').get(pk=user.pk).first_name, 'Иван')
+
+    def test_primary_outside_requests_and_transactions(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            User.objects.count()
+            with db_routers.use_replicas(), transaction.atomic():
+                User.objects.count()
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_client_is_pinned_to_primary_after_write(self):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = self.client.get(self.products_url)
+        self.assertEqual(response.status_code, 200)
+        self.assertGreater(len(replica_queries), 0)
+        self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+        response = self.client.post(self.login_url, {'username': 'test_user', 'password': 'test_password'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(response.cookies[settings.REPLICA_STICKY_COOKIE]['max-age'], settings.REPLICA_STICKY_SECONDS)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.client.get(self.products_url)
+        self.assertEqual(len(replica_queries), 0)
+
+    def test_sync_replicas(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, 'replica.sqlite3')
+            with mock.patch.dict(connections['replica'].settings_dict, {'NAME': path}):
+                call_command('sync_replicas', stdout=io.StringIO())
+            with closing(sqlite3.connect(path)) as replica:
+                usernames = replica.execute('SELECT username FROM auth_user').fetchall()
+        self.assertEqual(usernames, [('test_user',)])
+
+
+class StaticFilesTestCase(SimpleTestCase):
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        source = os.path.join(tmp_dir.name, 'source')
+        os.makedirs(source)
+        self.css = b'body { color: black; }\n' * 100
+        with open(os.path.join(source, 'site.css'), 'wb') as file:
+            file.write(self.css)
+        self.enterContext(override_settings(
+            STATIC_ROOT=os.path.join(tmp_dir.name, 'static'),
+            STATICFILES_DIRS=[source],
+            STORAGES={**settings.STORAGES, 'staticfiles': {
+                'BACKEND': 'mysite.staticfiles.CompressedManifestStaticFilesStorage',
+            }},
+        ))
+        call_command('collectstatic', interactive=False, verbosity=0)
+        with open(os.path.join(settings.STATIC_ROOT, 'staticfiles.json')) as file:
+            self.hashed = json.load(file)['paths']['site.css']
+        self.calls = []
+
+    def application(self, environ, start_response):
+        self.calls.append(environ['PATH_INFO'])
+        start_response('404 Not Found', [])
+        return [b'django']
+
+    def wsgi_get(self, path, **headers):
+        handler = StaticFilesWSGIHandler(self.application)
+        result = {}
+
+        def start_response(status, response_headers):
+            result.update(status=status, headers=dict(response_headers))
+
+        environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, **headers}
+        body = b''.join(handler(environ, start_response))
+        return result['status'], result['headers'], body
+
+    def test_collectstatic_writes_hashed_and_compressed_files(self):
+        self.assertRegex(self.hashed, r'^site\.[0-9a-f]{12}\.css$')
+        with gzip.open(os.path.join(settings.STATIC_ROOT, self.hashed + '.gz')) as file:
+            self.assertEqual(file.read(), self.css)
+
+    def test_wsgi_serves_precompressed_immutable_files(self):
+        status, headers, body = self.wsgi_get('/static/' + self.hashed, HTTP_ACCEPT_ENCODING='br;q=0, gzip')
+        self.assertEqual(status, '200 OK')
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertIn('immutable', headers['Cache-Control'])
+        self.assertEqual(gzip.decompress(body), self.css)
+
+        status, headers, body = self.wsgi_get('/static/' + self.hashed)
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, self.css)
+        status, _, body = self.wsgi_get('/static/' + self.hashed, HTTP_IF_NONE_MATCH=headers['ETag'])
+        self.assertEqual((status, body), ('304 Not Modified', b''))
+
+        status, headers, _ = self.wsgi_get('/static/site.css')
+        self.assertNotIn('immutable', headers['Cache-Control'])
+        self.assertEqual(self.calls, [])
+        self.assertEqual(self.wsgi_get('/static/missing.css')[2], b'django')
+        self.assertEqual(self.calls, ['/static/missing.css'])
+
+    def test_asgi_serves_files(self):
+        messages = []
+
+        async def send(message):
+            messages.append(message)
+
+        handler = StaticFilesASGIHandler(None)
+        scope = {
+            'type': 'http', 'method': 'GET', 'path': '/static/' + self.hashed,
+            'headers': [(b'accept-encoding', b'gzip, deflate')],
+        }
+        asyncio.run(handler(scope, None, send))
+        headers = dict(messages[0]['headers'])
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(headers[b'content-encoding'], b'gzip')
+        self.assertEqual(gzip.decompress(b''.join(message['body'] for message in messages[1:])), self.css)
+
+
+class MediaTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.owner = User.objects.create_user(username='ReceiptOwner', password='qwerty')
+        cls.other = User.objects.create_user(username='ReceiptOther', password='qwerty')
+        Order.objects.create(delivery_address='TestStreet', user=cls.owner, receipt='orders/receipts/receipt.txt')
+        Job.objects.create(kind='shopapp.export_user_orders', created_by=cls.owner,
+                           result='jobs/results/user-orders-export.json')
+
+    def setUp(self):
+        tmp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp_dir.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=tmp_dir.name))
+        files = (
+            ('orders/receipts/receipt.txt', b'receipt'),
+            ('products/data.txt', b'0123456789'),
+            ('jobs/results/user-orders-export.json', b'{}'),
+            ('jobs/inputs/orders.csv', b'id'),
+        )
+        for name, content in files:
+            os.makedirs(os.path.join(tmp_dir.name, os.path.dirname(name)), exist_ok=True)
+            with open(os.path.join(tmp_dir.name, name), 'wb') as file:
+                file.write(content)
+
+    def get(self, name, **headers):
+        return self.client.get(reverse('media', kwargs={'name': name}), headers=headers)
+
+    def test_receipt_only_for_owner(self):
+        self.assertEqual(self.get('orders/receipts/receipt.txt').status_code, 404)
+        self.client.force_login(self.other)
+        self.assertEqual(self.get('orders/receipts/receipt.txt').status_code, 404)
+        self.client.force_login(self.owner)
+        response = self.get('orders/receipts/receipt.txt')
+        self.assertEqual(b''.join(response.streaming_content), b'receipt')
+        self.assertIn('private', response['Cache-Control'])
+        self.assertEqual(self.get('../settings.py').status_code, 404)
+
+    def test_job_files_only_for_owner_and_staff(self):
+        result, upload = 'jobs/results/user-orders-export.json', 'jobs/inputs/orders.csv'
+        self.assertEqual(self.get(result).status_code, 404)
+        self.client.force_login(self.other)
+        self.assertEqual(self.get(result).status_code, 404)
+        self.client.force_login(self.owner)
+        self.assertEqual(self.get(result).status_code, 200)
+        self.assertIn('private', self.get(result)['Cache-Control'])
+        self.assertEqual(self.get(upload).status_code, 404)
+        self.client.force_login(User.objects.create_user(username='JobsStaff', password='qwerty', is_staff=True))
+        self.assertEqual(self.get(upload).status_code, 200)
+
+    def test_ranges_and_conditional_requests(self):
+        response = self.get('products/data.txt')
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertIn('public', response['Cache-Control'])
+        etag = response['ETag']
+        response = self.get('products/data.txt', Range='bytes=2-5')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(b''.join(response.streaming_content), b'2345')
+        response = self.get('products/data.txt', Range='bytes=-3', If_Range=etag)
+        self.assertEqual(b''.join(response.streaming_content), b'789')
+        response = self.get('products/data.txt', Range='bytes=-3', If_Range='"stale"')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.get('products/data.txt', Range='bytes=20-').status_code, 416)
+        self.assertEqual(self.get('products/data.txt', If_None_Match=etag).status_code, 304)
+
+    @override_settings(MEDIA_ACCEL='nginx')
+    def test_transfer_is_handed_to_proxy(self):
+        self.client.force_login(self.owner)
+        response = self.get('orders/receipts/receipt.txt')
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/orders/receipts/receipt.txt')
+        self.assertEqual(response.content, b'')
@@ -23,6 +23,10 @@ from django.conf.urls.i18n import i18n_patterns
 from django.contrib.sitemaps.views import sitemap
 
 from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView, SpectacularRedocView
+from .images import image_derivative_view
+from .media import media_view
+from .metrics import metrics_view
+from .profiler import profiler_list_view, profiler_result_view, profiler_start_view
 from .sitemaps import sitemaps
 
 urlpatterns = [
@@ -34,6 +38,14 @@ urlpatterns = [
     path('api/schema/swagger/', SpectacularSwaggerView.as_view(url_name='schema'), name='swagger'),
     path('api/schema/redoc/', SpectacularRedocView.as_view(url_name='schema'), name='redoc'),
     path('api/', include('myapiapp.urls')),
+    path('api/', include('jobsapp.urls')),
+
+    path('metrics', metrics_view, name='metrics'),
+    path('images/<str:variant>.<str:fmt>', image_derivative_view, name='image_derivative'),
+    path(settings.MEDIA_URL.lstrip('/') + '<path:name>', media_view, name='media'),
+    path('profiler/', profiler_list_view, name='profiler'),
+    path('profiler/start', profiler_start_view, name='profiler_start'),
+    path('profiler/<str:session_id>', profiler_result_view, name='profiler_result'),
 
     path('sitemap.xml', sitemap, {'sitemaps': sitemaps}, name='django.contrib.sitemaps.views.sitemap')
 ]
@@ -47,10 +59,6 @@ urlpatterns += i18n_patterns(
 urlpatterns += staticfiles_urlpatterns()
 
 if settings.DEBUG:
-    urlpatterns.extend(
-        static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT),
-    )
-
     urlpatterns.extend(
         static(settings.STATIC_URL, document_root=settings.STATIC_ROOT),
     )
@@ -11,6 +11,8 @@ import os
 
 from django.core.wsgi import get_wsgi_application
 
+from mysite.staticfiles import StaticFilesWSGIHandler
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'mysite.settings')
 
-application = get_wsgi_application()
+application = StaticFilesWSGIHandler(get_wsgi_application())
@@ -1,11 +1,38 @@
+import logging
+from dataclasses import dataclass
+from fnmatch import fnmatchcase
+from ipaddress import ip_address, ip_network
+from math import ceil
+from threading import Lock
+from time import perf_counter, time
+from typing import Dict, List, Optional, Tuple
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
 from django.core.cache import cache
-from django.core.exceptions import PermissionDenied
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest
+from django.utils.decorators import sync_and_async_middleware
+
+from mysite import db_routers, metrics, profiler
+from mysite.querycount import QueryRecorder
 
 from .views import frequent_request_exception
 
 
+logger = logging.getLogger(__name__)
+
+RATE_PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+@sync_and_async_middleware
 def set_useragent_on_request(get_response):
+    if iscoroutinefunction(get_response):
+        async def middleware(request: HttpRequest):
+            request.user_agent = request.META.get("HTTP_USER_AGENT")
+            return await get_response(request)
+
+        return middleware
+
     def middleware(request: HttpRequest):
         request.user_agent = request.META.get("HTTP_USER_AGENT")
         response = get_response(request)
@@ -15,42 +42,437 @@ def set_useragent_on_request(get_response):
 
 
 class CountRequestMiddleware:
+    """
+    Сбор метрик запросов: число запросов по представлениям, гистограмма
+    времени ответа, число и время запросов к базе данных.
+    Метрики доступны по адресу /metrics (см. mysite.metrics).
+    Повторяющиеся одинаковые SQL-запросы (N+1) пишутся в лог.
+    Работает и в синхронной, и в асинхронной цепочке middleware.
+    """
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
-        self.request_count = 0
-        self.response_count = 0
-        self.exception_count = 0
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
 
     def __call__(self, request: HttpRequest):
-        self.request_count += 1
-        response = self.get_response(request)
-        self.response_count += 1
+        if self.async_mode:
+            return self.__acall__(request)
+        recorder = QueryRecorder()
+        start = perf_counter()
+        with recorder.record():
+            response = self.get_response(request)
+        self.collect(request, response, recorder, perf_counter() - start)
         return response
 
+    async def __acall__(self, request: HttpRequest):
+        recorder = QueryRecorder()
+        start = perf_counter()
+        with await recorder.arecord():
+            response = await self.get_response(request)
+        self.collect(request, response, recorder, perf_counter() - start)
+        return response
+
+    def collect(self, request: HttpRequest, response, recorder: QueryRecorder, duration: float) -> None:
+        view = get_view_label(request)
+        metrics.inc("http_requests_total", view=view, method=request.method, status=str(response.status_code))
+        metrics.observe("http_request_duration_seconds", duration, view=view)
+        if recorder.count:
+            metrics.inc("db_queries_total", recorder.count, view=view)
+            metrics.inc("db_query_duration_seconds_total", recorder.duration, view=view)
+        for shape, count in recorder.repeated():
+            metrics.inc("db_n_plus_one_total", view=view)
+            logger.warning("%s: запрос повторен %s раз (N+1): %s", view, count, shape)
+        metrics.registry.flush()
+
     def process_exception(self, request: HttpRequest, exception: Exception):
-        self.exception_count += 1
-        print(f"Exception №{self.exception_count}")
+        metrics.inc("http_exceptions_total", view=get_view_label(request), exception=type(exception).__name__)
+
+
+class ProfilerMiddleware:
+    """
+    Профилирование запросов сеансом mysite.profiler, запущенным
+    с параметром requests. Пока сеанса нет, запрос проходит без затрат.
+    Под ASGI сэмплируется поток цикла событий, то есть вместе с запросом
+    попадают и конкурентные ему корутины.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        session = profiler.claim_request(request.path_info)
+        if session is None:
+            return self.get_response(request)
+        with session.track():
+            return self.get_response(request)
+
+    async def __acall__(self, request: HttpRequest):
+        session = profiler.claim_request(request.path_info)
+        if session is None:
+            return await self.get_response(request)
+        with session.track():
+            return await self.get_response(request)
+
+
+class DatabaseRoutingMiddleware:
+    """
+    Чтение с реплик для безопасных запросов (mysite.db_routers).
+
+    После запроса, записавшего в базу, клиент получает cookie
+    REPLICA_STICKY_COOKIE, и пока она действует, все его запросы
+    читают из основной базы. Потоковый ответ читает данные уже после
+    выхода из middleware, поэтому его итерация выполняется в том же
+    состоянии маршрутизации.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    @staticmethod
+    def replicas_allowed(request: HttpRequest) -> bool:
+        return request.method in ("GET", "HEAD", "OPTIONS") and settings.REPLICA_STICKY_COOKIE not in request.COOKIES
+
+    def __call__(self, request: HttpRequest):
+        if self.async_mode:
+            return self.__acall__(request)
+        with db_routers.routing(self.replicas_allowed(request)) as state:
+            response = self.get_response(request)
+        return self.finish(response, state)
+
+    async def __acall__(self, request: HttpRequest):
+        with db_routers.routing(self.replicas_allowed(request)) as state:
+            response = await self.get_response(request)
+        return self.finish(response, state)
+
+    def finish(self, response, state: db_routers.RoutingState):
+        if response.streaming and state.replicas_allowed:
+            if response.is_async:
+                response.streaming_content = aiter_routed(response.streaming_content, state)
+            else:
+                response.streaming_content = iter_routed(response.streaming_content, state)
+        if state.wrote:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, "1",
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite="Lax",
+            )
+        return response
+
+
+def iter_routed(chunks, state: db_routers.RoutingState):
+    token = db_routers.routing_state.set(state)
+    try:
+        yield from chunks
+    finally:
+        db_routers.routing_state.reset(token)
+
 
+async def aiter_routed(chunks, state: db_routers.RoutingState):
+    token = db_routers.routing_state.set(state)
+    try:
+        async for chunk in chunks:
+            yield chunk
+    finally:
+        db_routers.routing_state.reset(token)
 
-class ThrottleMiddleware:
-    def __init__(self, get_response, max_requests_per_minute=5):
+
+def get_view_label(request: HttpRequest) -> str:
+    # Имя маршрута, а не путь: иначе число рядов метрик растет с каждым pk.
+    match = request.resolver_match
+    return match.view_name if match else "<unmatched>"
+
+
+@dataclass
+class RatePolicy:
+    """
+    Политика ограничения частоты запросов.
+
+    Атрибуты:
+    name: String - Имя политики, входит в ключ счетчика
+    views: List[String] - Шаблоны имен маршрутов (fnmatch), пустой список - любые
+    methods: List[String] - HTTP-методы, пустой список - любые
+    rates: Dict[String, Tuple] - Лимит (запросов, окно в секундах) для anon, user и staff;
+                                 None - без ограничения
+    """
+    name: str
+    views: List[str]
+    methods: List[str]
+    rates: Dict[str, Optional[Tuple[int, int]]]
+
+    def matches(self, request: HttpRequest) -> bool:
+        if self.methods and request.method not in self.methods:
+            return False
+        view_name = request.resolver_match.view_name if request.resolver_match else ""
+        return not self.views or any(fnmatchcase(view_name, pattern) for pattern in self.views)
+
+
+@dataclass
+class LocalCounter:
+    """
+    Состояние счетчика в текущем процессе.
+
+    Атрибуты:
+    window: Integer - Номер текущего окна
+    previous: Integer - Число запросов в предыдущем окне
+    estimate: Float - Последняя оценка числа запросов в скользящем окне
+    leased: Integer - Зарезервированные в кэше запросы, которые можно пропустить без обращения к нему
+    """
+    window: int
+    previous: int
+    estimate: float
+    leased: int = 0
+
+
+class RateCheck:
+    """
+    Проверка одного запроса по счетчику в текущем окне.
+
+    Атрибуты:
+    counter_key: String - Политика и клиент
+    limit: Integer - Лимит запросов в окне
+    period: Integer - Длина окна в секундах
+    window: Integer - Номер текущего окна
+    elapsed: Float - Сколько секунд прошло от начала окна
+    batch: Integer - Сколько запросов зарезервировать в кэше
+    previous: Integer - Число запросов в предыдущем окне, None - еще не прочитано
+    count: Integer - Значение счетчика окна после резервирования
+    """
+    def __init__(self, counter_key: str, limit: int, period: int):
+        self.counter_key = counter_key
+        self.limit = limit
+        self.period = period
+        window, self.elapsed = divmod(time(), period)
+        self.window = int(window)
+        self.batch = 1
+        self.previous: Optional[int] = None
+        self.count = 0
+
+    @property
+    def key(self) -> str:
+        return f"ratelimit:{self.counter_key}:{self.window}"
+
+    @property
+    def previous_key(self) -> str:
+        return f"ratelimit:{self.counter_key}:{self.window - 1}"
+
+
+def parse_rate(rate: Optional[str]) -> Optional[Tuple[int, int]]:
+    """
+    "100/m" -> (100, 60). Поддерживаются периоды s, m, h, d.
+    """
+    if rate is None:
+        return None
+    count, period = rate.split("/")
+    return int(count), RATE_PERIODS[period[0]]
+
+
+def load_policies() -> List[RatePolicy]:
+    return [
+        RatePolicy(
+            name=policy["name"],
+            views=policy.get("views", []),
+            methods=[method.upper() for method in policy.get("methods", [])],
+            rates={scope: parse_rate(policy.get(scope)) for scope in ("anon", "user", "staff")},
+        )
+        for policy in settings.RATE_LIMITS
+    ]
+
+
+class RateLimitMiddleware:
+    """
+    Ограничение частоты запросов скользящим окном.
+
+    Запросы считаются атомарным incr в кэше по окнам фиксированной длины,
+    число запросов в скользящем окне оценивается как
+    count + previous * (доля предыдущего окна, попадающая в скользящее).
+    Политики из settings.RATE_LIMITS проверяются по порядку, применяется
+    первая подходящая; лимит выбирается по типу клиента (anon, user, staff).
+    Анонимный клиент за доверенным прокси определяется по заголовку
+    RATE_LIMIT_CLIENT_IP_HEADER, иначе по REMOTE_ADDR.
+
+    Отклоненный запрос возвращает свой резерв: иначе клиент, который
+    продолжает повторять запросы, не выходил бы из-под лимита.
+
+    Клиенту, который заведомо далек от лимита, процесс резервирует в кэше
+    сразу пачку запросов одним incr и пропускает их без обращения к кэшу.
+    Неиспользованный резерв засчитывается клиенту, поэтому резервирование
+    идет только пока оценка меньше половины лимита.
+
+    Под ASGI проверка асинхронная: пропуск по резерву не покидает цикл
+    событий, к кэшу и пользователю обращается через асинхронный API.
+    """
+    sync_capable = True
+    async_capable = True
+    lease_share = 0.25
+    max_local_counters = 10000
+
+    def __init__(self, get_response):
         self.get_response = get_response
-        self.max_requests_per_minute = max_requests_per_minute
+        self.policies = load_policies()
+        self.client_ip_header = settings.RATE_LIMIT_CLIENT_IP_HEADER
+        self.trusted_proxies = [
+            ip_network(proxy.strip(), strict=False) for proxy in settings.RATE_LIMIT_TRUSTED_PROXIES
+        ]
+        self.counters: Dict[str, LocalCounter] = {}
+        self.lock = Lock()
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+            # Django выбирает режим хука по самому методу.
+            self.process_view = self.aprocess_view
 
-    def __call__(self, request):
-        ip_address = request.META.get('REMOTE_ADDR')
-        cache_key = f'throttle_{ip_address}'
-        print(f"Cache key: {cache.get(cache_key)}")
+    def __call__(self, request: HttpRequest):
+        return self.get_response(request)
 
-        if cache.get(cache_key) is None:
-            cache.set(cache_key, 1, timeout=60)
+    def process_view(self, request: HttpRequest, view_func, view_args, view_kwargs):
+        limit = self.get_limit(request, getattr(request, "user", None))
+        if limit is None:
+            return None
+        check = RateCheck(*limit)
+        if self.take_leased(check):
+            return None
+        if check.previous is None:
+            check.previous = cache.get(check.previous_key, 0)
+        check.count = self.reserve(check.key, check.batch, timeout=check.period * 2)
+        if self.settle(check):
+            return None
+        self.release(check.key, check.batch)
+        return self.limited(frequent_request_exception(request), check)
 
-        elif cache.get(cache_key) > self.max_requests_per_minute:
-            return frequent_request_exception(request)
-            # raise PermissionDenied("Too many requests from this IP address")
+    async def aprocess_view(self, request: HttpRequest, view_func, view_args, view_kwargs):
+        auser = getattr(request, "auser", None)
+        limit = self.get_limit(request, await auser() if auser is not None else None)
+        if limit is None:
+            return None
+        check = RateCheck(*limit)
+        if self.take_leased(check):
+            return None
+        if check.previous is None:
+            check.previous = await cache.aget(check.previous_key, 0)
+        check.count = await self.areserve(check.key, check.batch, timeout=check.period * 2)
+        if self.settle(check):
+            return None
+        await self.arelease(check.key, check.batch)
+        return self.limited(await sync_to_async(frequent_request_exception)(request), check)
 
+    def get_limit(self, request: HttpRequest, user) -> Optional[Tuple[str, int, int]]:
+        """
+        Ключ счетчика, лимит и окно для запроса или None, если запрос не ограничен.
+        """
+        policy = next((policy for policy in self.policies if policy.matches(request)), None)
+        if policy is None:
+            return None
+        if user is not None and user.is_authenticated:
+            scope, ident = ("staff" if user.is_staff else "user"), f"u{user.pk}"
         else:
-            cache.set(cache_key, cache.get(cache_key) + 1, timeout=60)
+            scope, ident = "anon", self.client_ip(request)
+        rate = policy.rates[scope]
+        if rate is None:
+            return None
+        return (f"{policy.name}:{ident}", *rate)
 
-        response = self.get_response(request)
+    def is_trusted_proxy(self, address: str) -> bool:
+        try:
+            address = ip_address(address)
+        except ValueError:
+            return False
+        return any(address in network for network in self.trusted_proxies)
+
+    def client_ip(self, request: HttpRequest) -> str:
+        """
+        Адрес клиента: заголовку прокси верим, только если запрос пришел от
+        доверенного прокси. В списке "клиент, прокси1, прокси2" клиент -
+        первый справа адрес, не принадлежащий доверенным прокси.
+        """
+        remote_addr = request.META.get("REMOTE_ADDR", "")
+        if not self.client_ip_header or not self.is_trusted_proxy(remote_addr):
+            return remote_addr
+        forwarded = [address.strip() for address in request.headers.get(self.client_ip_header, "").split(",")]
+        forwarded = [address for address in forwarded if address]
+        for address in reversed(forwarded):
+            if not self.is_trusted_proxy(address):
+                return address
+        return forwarded[0] if forwarded else remote_addr
+
+    def take_leased(self, check: RateCheck) -> bool:
+        """
+        Пропускает запрос по резерву процесса; иначе выбирает размер
+        нового резерва и известное число запросов в предыдущем окне.
+        """
+        with self.lock:
+            counter = self.counters.get(check.counter_key)
+            if counter is None or counter.window != check.window:
+                return False
+            if counter.leased > 0:
+                counter.leased -= 1
+                return True
+            check.batch = max(1, int((check.limit / 2 - counter.estimate) * self.lease_share))
+            check.previous = counter.previous
+            return False
+
+    def settle(self, check: RateCheck) -> bool:
+        """
+        Запоминает оценку и остаток резерва; True, если запрос укладывается в лимит.
+        """
+        estimate = check.count + check.previous * (1 - check.elapsed / check.period)
+        # Сколько из зарезервированных запросов укладываются в лимит.
+        allowed = min(check.batch, int(check.limit - (estimate - check.batch)))
+        with self.lock:
+            if len(self.counters) >= self.max_local_counters:
+                self.counters.clear()
+            self.counters[check.counter_key] = LocalCounter(
+                check.window, check.previous, estimate, max(allowed - 1, 0),
+            )
+        return allowed > 0
+
+    @staticmethod
+    def limited(response, check: RateCheck):
+        response["Retry-After"] = str(ceil(check.period - check.elapsed))
         return response
+
+    @staticmethod
+    def reserve(key: str, count: int, timeout: int) -> int:
+        try:
+            return cache.incr(key, count)
+        except ValueError:
+            if cache.add(key, count, timeout=timeout):
+                return count
+            return cache.incr(key, count)
+
+    @staticmethod
+    async def areserve(key: str, count: int, timeout: int) -> int:
+        try:
+            return await cache.aincr(key, count)
+        except ValueError:
+            if await cache.aadd(key, count, timeout=timeout):
+                return count
+            return await cache.aincr(key, count)
+
+    @staticmethod
+    def release(key: str, count: int) -> None:
+        try:
+            cache.decr(key, count)
+        except ValueError:
+            pass
+
+    @staticmethod
+    async def arelease(key: str, count: int) -> None:
+        try:
+            await cache.adecr(key, count)
+        except ValueError:
+            pass
@@ -1,3 +1,85 @@
-from django.test import TestCase
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.cache import cache
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import resolve, reverse
 
-# Create your tests here.
+from .middlewares import RateCheck, RateLimitMiddleware
+
+
+@override_settings(
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+    RATE_LIMITS=[
+        {'name': 'bio', 'views': ['requestdataapp:user_form'], 'anon': '3/m', 'user': '5/m'},
+        {'name': 'default', 'anon': '100/m'},
+    ],
+)
+class RateLimitMiddlewareTestCase(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.url = reverse('requestdataapp:user_form')
+
+    def get_statuses(self, count):
+        return [self.client.get(self.url).status_code for _ in range(count)]
+
+    def test_anonymous_limit(self):
+        self.assertEqual(self.get_statuses(4), [200, 200, 200, 429])
+        response = self.client.get(self.url)
+        self.assertIn('Retry-After', response)
+        self.assertEqual(self.client.get(reverse('requestdataapp:get_view')).status_code, 200)
+
+    def test_user_limit(self):
+        user = User.objects.create_user(username='test_user', password='test_password')
+        self.client.force_login(user)
+        self.assertEqual(self.get_statuses(6), [200] * 5 + [429])
+
+    def make_request(self):
+        request = RequestFactory().get(self.url)
+        request.resolver_match = resolve(self.url)
+        request.user = AnonymousUser()
+        return request
+
+    def test_limit_is_shared_between_processes(self):
+        # Отдельные экземпляры middleware ведут себя как разные процессы.
+        middlewares = [RateLimitMiddleware(lambda request: None) for _ in range(2)]
+        responses = [
+            middleware.process_view(self.make_request(), None, (), {})
+            for middleware in middlewares * 2
+        ]
+        self.assertEqual([response is None for response in responses], [True, True, True, False])
+
+    def test_rejected_requests_are_not_counted(self):
+        middleware = RateLimitMiddleware(lambda request: None)
+        responses = [middleware.process_view(self.make_request(), None, (), {}) for _ in range(10)]
+        self.assertEqual(sum(response is None for response in responses), 3)
+        self.assertEqual(cache.get(RateCheck('bio:127.0.0.1', 3, 60).key), 3)
+
+    def test_clients_far_from_limit_skip_cache(self):
+        middleware = RateLimitMiddleware(lambda request: None)
+        middleware.policies[0].rates['anon'] = (100, 60)
+        for _ in range(2):
+            middleware.process_view(self.make_request(), None, (), {})
+        counter = next(iter(middleware.counters.values()))
+        leased = counter.leased
+        self.assertGreater(leased, 0)
+        reserved = dict(cache._cache)
+        self.assertIsNone(middleware.process_view(self.make_request(), None, (), {}))
+        self.assertEqual(dict(cache._cache), reserved)
+        self.assertEqual(counter.leased, leased - 1)
+
+    @override_settings(RATE_LIMIT_CLIENT_IP_HEADER='X-Forwarded-For', RATE_LIMIT_TRUSTED_PROXIES=['10.0.0.0/8'])
+    def test_clients_behind_trusted_proxy(self):
+        def statuses(forwarded, remote_addr='10.0.0.1'):
+            return [
+                self.client.get(self.url, headers={'X-Forwarded-For': forwarded}, REMOTE_ADDR=remote_addr).status_code
+                for _ in range(4)
+            ]
+
+        self.assertEqual(statuses('203.0.113.1, 10.0.0.2'), [200, 200, 200, 429])
+        self.assertEqual(statuses('203.0.113.2'), [200, 200, 200, 429])
+        # Заголовок от недоверенного адреса не учитывается.
+        self.assertEqual(statuses('203.0.113.3', remote_addr='198.51.100.1')[:3], [200, 200, 200])
+        self.assertEqual(statuses('203.0.113.4', remote_addr='198.51.100.1'), [429] * 4)
+
+    async def test_async_limit(self):
+        statuses = [(await self.async_client.get(self.url)).status_code for _ in range(4)]
+        self.assertEqual(statuses, [200, 200, 200, 429])
@@ -62,4 +62,4 @@ def handle_file_upload(request: HttpRequest) -> HttpResponse:
 
 
 def frequent_request_exception(request: HttpRequest):
-    return render(request, "requestdataapp/frequent-request-exception.html")
+    return render(request, "requestdataapp/frequent-request-exception.html", status=429)
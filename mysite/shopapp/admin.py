@@ -1,12 +1,12 @@
-from csv import DictReader
-from io import TextIOWrapper
-
 from django.contrib import admin
-from django.contrib.auth.models import User
 from django.db.models import QuerySet
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render, redirect
 from django.urls import path
+from django.utils import timezone
+
+from jobsapp.storage import save_job_input
+from mysite.model_versions import bump_version
 
 from .admin_mixins import ColoredText, ExportAsCSVFile, ExportAsJSONFile
 from .models import Order, Product, ProductImage
@@ -27,12 +27,14 @@ class ProductImagesInline(admin.StackedInline):
 
 @admin.action(description="Archiving product")
 def mark_archived(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=True)
+    queryset.update(archived=True, updated_at=timezone.now())
+    bump_version(Product)
 
 
 @admin.action(description="Unarchiving product")
 def mark_unarchived(model_admin: admin.ModelAdmin, request: HttpRequest, queryset: QuerySet):
-    queryset.update(archived=False)
+    queryset.update(archived=False, updated_at=timezone.now())
+    bump_version(Product)
 
 
 @admin.register(Product)
@@ -75,7 +77,6 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVFile, ExportAsJSONFile, ColoredT
     ]
 
     def import_csv(self, request) -> HttpResponse:
-        products = list()
         if request.method == "GET":
             form = CSVImportForm()
             context = {
@@ -88,24 +89,11 @@ class ProductAdmin(admin.ModelAdmin, ExportAsCSVFile, ExportAsJSONFile, ColoredT
                 "form": form,
             }
             return render(request, "admin/csv_form.html", context, status=400)
-        csv_file = TextIOWrapper(
-            form.files["csv_file"].file,
-            encoding=request.encoding,
-        )
-
-        reader = DictReader(csv_file)
-        for row in reader:
-            order_data = {
-                "name": row['name'],
-                "description": row['description'],
-                "price": row['price'],
-                "discount": row['discount'],
-                "created_by": User.objects.get(id=int(row['user'])),
-            }
-            product = Product(**order_data)
-            products.append(product)
-        Product.objects.bulk_create(products)
-        self.message_user(request, "Товары успешно импортированы")
+        csv_file = form.files["csv_file"]
+        self.enqueue_job(request, "shopapp.import_products_csv", {
+            "path": save_job_input(csv_file),
+            "encoding": request.encoding,
+        })
         return redirect("..")
 
     def get_urls(self):
@@ -151,26 +139,11 @@ class OrderAdmin(admin.ModelAdmin, ExportAsCSVFile, ExportAsJSONFile, ColoredTex
                 "form": form,
             }
             return render(request, "admin/csv_form.html", context, status=400)
-        csv_file = TextIOWrapper(
-            form.files["csv_file"].file,
-            encoding=request.encoding,
-        )
-
-        reader = DictReader(csv_file)
-        for row in reader:
-            order_data = {
-                "delivery_address": row['delivery_address'],
-                "promocode": row['promocode'],
-                "user": User.objects.get(id=int(row['user'])),
-            }
-            products = [Product.objects.get(id=int(product_id)) for product_id in (row['product'].split(','))]
-            print(order_data)
-            for product in products:
-                print(product)
-            order = Order(**order_data)
-            order.save()
-            order.products.add(*products)
-        self.message_user(request, "Заказы успешно импортированы")
+        csv_file = form.files["csv_file"]
+        self.enqueue_job(request, "shopapp.import_orders_csv", {
+            "path": save_job_input(csv_file),
+            "encoding": request.encoding,
+        })
         return redirect("..")
 
     def get_urls(self):
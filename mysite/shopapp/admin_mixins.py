@@ -1,41 +1,41 @@
-import csv
-
-from django.core import serializers
 from django.db.models import QuerySet
-from django.db.models.options import Options
-from django.http import HttpRequest, HttpResponse
+from django.http import HttpRequest
+from django.urls import reverse
 from django.utils.html import format_html
 
-from .models import Order, Product
-
+from jobsapp.models import Job
+from jobsapp.registry import enqueue
 
-class ExportAsCSVFile:
-    def export_as_csv(self, request: HttpRequest, queryset: QuerySet):
-        meta: Options = self.model._meta
-        field_names = [field.name for field in meta.fields]
+from .models import Order, Product
 
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename={meta}-export.csv'
 
-        writer = csv.writer(response)
-        writer.writerow(field_names)
+class EnqueueJob:
+    def enqueue_job(self, request: HttpRequest, kind: str, params: dict) -> Job:
+        job = enqueue(kind, params, user=request.user)
+        self.message_user(request, format_html(
+            'Задача №{} поставлена в очередь, результат будет доступен на <a href="{}">странице задачи</a>',
+            job.pk,
+            reverse("admin:jobsapp_job_change", args=[job.pk]),
+        ))
+        return job
 
-        for obj in queryset:
-            writer.writerow([getattr(obj, field) for field in field_names])
 
-        return response
+class ExportAsCSVFile(EnqueueJob):
+    def export_as_csv(self, request: HttpRequest, queryset: QuerySet):
+        self.enqueue_job(request, "shopapp.export_as_csv", {
+            "model": self.model._meta.label,
+            "pks": list(queryset.values_list("pk", flat=True)),
+        })
 
     export_as_csv.short_description = "Export to CSV file"
 
 
-class ExportAsJSONFile:
+class ExportAsJSONFile(EnqueueJob):
     def export_as_json(self, request: HttpRequest, queryset: QuerySet):
-        response = HttpResponse(content_type='application/json')
-        response['Content-Disposition'] = f'attachment; filename={self.model.__name__}-export.json'
-
-        response.write(serializers.serialize('json', queryset))
-
-        return response
+        self.enqueue_job(request, "shopapp.export_as_json", {
+            "model": self.model._meta.label,
+            "pks": list(queryset.values_list("pk", flat=True)),
+        })
 
     export_as_json.short_description = "Export to JSON file"
 
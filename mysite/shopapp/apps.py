@@ -1,6 +1,42 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class TestsiteConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'shopapp'
+
+    def ready(self):
+        from django.contrib.auth.models import User
+        from mysite import media, model_versions
+        from .models import Order, Product
+        from . import totals  # noqa: F401 - подключает обработчики сигналов
+
+        model_versions.register(Product)
+        model_versions.register(User, fields=["username", "first_name"])
+        model_versions.register(Order, depends_on=[Product, User])
+        media.protect("orders/receipts/", can_download_receipt)
+        post_migrate.connect(restore_product_fts, sender=self)
+
+
+def restore_product_fts(sender, using="default", **kwargs):
+    """
+    На SQLite миграции, пересоздающие таблицу продуктов, удаляют
+    триггеры полнотекстового индекса: восстанавливает их после migrate.
+    """
+    from .search import ensure_product_fts
+
+    ensure_product_fts(using)
+
+
+def can_download_receipt(user, name: str) -> bool:
+    """
+    Чек заказа доступен его владельцу и суперпользователю.
+    """
+    from .models import Order
+
+    if not user.is_authenticated:
+        return False
+    if user.is_superuser:
+        return Order.objects.filter(receipt=name).exists()
+    return Order.objects.filter(receipt=name, user=user).exists()
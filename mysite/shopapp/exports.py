@@ -0,0 +1,331 @@
+"""
+Потоковая выгрузка данных интернет-магазина.
+
+Генераторы из этого модуля отдают ответ частями, поэтому объем
+выгрузки не влияет на потребление памяти рабочим процессом.
+
+У генераторов есть асинхронные варианты (aiter_*) для запросов под ASGI:
+синхронный итератор ASGI-сервер сначала целиком прочитал бы в память
+через sync_to_async, а асинхронный отдается клиенту по мере чтения
+из базы, не занимая поток на время передачи.
+"""
+import re
+import zlib
+from csv import writer as csv_writer
+from gzip import decompress
+from itertools import islice
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Iterable, Iterator, List, Optional, Sequence, Union
+
+from django.core.cache import cache
+from django.core.handlers.asgi import ASGIRequest
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import QuerySet
+from django.http import HttpRequest, HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from mysite.conditional import key_validators, not_modified, set_validators
+
+from .models import Order
+
+
+EXPORT_CHUNK_SIZE = 2000
+ORDERS_CHUNK_SIZE = 500
+JSON_BUFFER_SIZE = 64 * 1024
+
+EXPORT_CACHE_TIMEOUT = 24 * 60 * 60
+EXPORT_CACHE_MAX_BYTES = 32 * 1024 * 1024
+EXPORT_GZIP_LEVEL = 6
+
+re_accepts_gzip = re.compile(r"\bgzip\b")
+
+
+class Echo:
+    """
+    Псевдобуфер для csv.writer: вместо накопления строк
+    сразу возвращает записанное значение.
+    """
+    def write(self, value: str) -> str:
+        return value
+
+
+def iter_csv_rows(queryset: QuerySet, fields: Sequence[str],
+                  chunk_size: int = EXPORT_CHUNK_SIZE) -> Iterator[str]:
+    """
+    Построчно отдает CSV по queryset: заголовок, затем по строке на объект.
+    Данные читаются из базы порциями по chunk_size записей через values_list.
+    """
+    writer = csv_writer(Echo())
+    yield writer.writerow(fields)
+    rows: Iterable[tuple] = queryset.values_list(*fields).iterator(chunk_size=chunk_size)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def iter_chunks(iterable: Iterable, size: int) -> Iterator[List]:
+    """
+    Разбивает итерируемый объект на списки длиной не более size.
+    """
+    iterator = iter(iterable)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+
+def order_values(queryset: QuerySet) -> QuerySet:
+    return (
+        queryset
+        .order_by("pk")
+        .values("pk", "user__username", "delivery_address", "created_at", "promocode")
+    )
+
+
+def order_product_links(orders: List[Dict[str, Any]]) -> QuerySet:
+    return (
+        Order.products.through.objects
+        .filter(order_id__in=[order["pk"] for order in orders])
+        .order_by("product__name", "product_id")
+        .values_list("order_id", "product_id", "product__name", "product__price", "product__archived")
+    )
+
+
+def build_order_dicts(orders: List[Dict[str, Any]], links: Iterable[tuple]) -> Iterator[Dict[str, Any]]:
+    products: Dict[int, List[Dict[str, Any]]] = {order["pk"]: [] for order in orders}
+    for order_id, product_id, name, price, archived in links:
+        products[order_id].append({
+            "pk": product_id,
+            "name": name,
+            "price": price,
+            "archived": archived,
+        })
+    for order in orders:
+        yield {
+            "pk": order["pk"],
+            "user": order["user__username"],
+            "delivery_address": order["delivery_address"],
+            "created_at": order["created_at"].strftime("%Y-%m-%d"),
+            "promocode": order["promocode"],
+            "products": products[order["pk"]],
+        }
+
+
+def iter_order_dicts(queryset: QuerySet,
+                     chunk_size: int = ORDERS_CHUNK_SIZE) -> Iterator[Dict[str, Any]]:
+    """
+    Отдает заказы в формате выгрузки вместе с продуктами.
+
+    Имя пользователя приходит вместе с заказом через JOIN, продукты —
+    одним запросом по промежуточной таблице на каждую порцию заказов.
+    Итого 1 + N / chunk_size запросов вместо 2N + 1.
+    """
+    orders = order_values(queryset).iterator(chunk_size=chunk_size)
+    for chunk in iter_chunks(orders, chunk_size):
+        yield from build_order_dicts(chunk, order_product_links(chunk))
+
+
+async def aiter_order_dicts(queryset: QuerySet,
+                            chunk_size: int = ORDERS_CHUNK_SIZE) -> AsyncIterator[Dict[str, Any]]:
+    chunk: List[Dict[str, Any]] = []
+    async for order in order_values(queryset).aiterator(chunk_size=chunk_size):
+        chunk.append(order)
+        if len(chunk) < chunk_size:
+            continue
+        links = [link async for link in order_product_links(chunk)]
+        for item in build_order_dicts(chunk, links):
+            yield item
+        chunk = []
+    if chunk:
+        links = [link async for link in order_product_links(chunk)]
+        for item in build_order_dicts(chunk, links):
+            yield item
+
+
+class JSONListEncoder:
+    """
+    Кодирует документ вида {key: [...]} по частям, накапливая
+    в буфере не больше buffer_size символов.
+    """
+    def __init__(self, key: str, buffer_size: int = JSON_BUFFER_SIZE):
+        self.encoder = DjangoJSONEncoder()
+        self.buffer = [f'{{"{key}": [']
+        self.buffered = 0
+        self.buffer_size = buffer_size
+        self.separator = ""
+
+    def feed(self, item: Any) -> Optional[str]:
+        """
+        Добавляет элемент; возвращает накопленную часть, когда буфер заполнен.
+        """
+        encoded = self.separator + self.encoder.encode(item)
+        self.separator = ", "
+        self.buffer.append(encoded)
+        self.buffered += len(encoded)
+        if self.buffered < self.buffer_size:
+            return None
+        chunk = "".join(self.buffer)
+        self.buffer = []
+        self.buffered = 0
+        return chunk
+
+    def finish(self) -> str:
+        self.buffer.append("]}")
+        return "".join(self.buffer)
+
+
+def iter_json_list(key: str, items: Iterable[Any],
+                   buffer_size: int = JSON_BUFFER_SIZE) -> Iterator[str]:
+    encoder = JSONListEncoder(key, buffer_size)
+    for item in items:
+        chunk = encoder.feed(item)
+        if chunk is not None:
+            yield chunk
+    yield encoder.finish()
+
+
+async def aiter_json_list(key: str, items: AsyncIterable[Any],
+                          buffer_size: int = JSON_BUFFER_SIZE) -> AsyncIterator[str]:
+    encoder = JSONListEncoder(key, buffer_size)
+    async for item in items:
+        chunk = encoder.feed(item)
+        if chunk is not None:
+            yield chunk
+    yield encoder.finish()
+
+
+def is_async_request(request: HttpRequest) -> bool:
+    """
+    Запрос обслуживается ASGI-сервером: тело ответа лучше отдавать
+    асинхронным итератором.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def orders_json_chunks(request: HttpRequest,
+                       queryset: QuerySet) -> Union[Iterator[str], AsyncIterator[str]]:
+    """
+    Части JSON-выгрузки заказов: асинхронные под ASGI, иначе синхронные.
+    """
+    if is_async_request(request):
+        return aiter_json_list("orders", aiter_order_dicts(queryset))
+    return iter_json_list("orders", iter_order_dicts(queryset))
+
+
+def get_cached_export(request: HttpRequest, cache_key: str,
+                      content_type: str = "application/json") -> Optional[HttpResponse]:
+    """
+    Ответ из закэшированных байтов выгрузки или None, если кэш пуст.
+
+    Тело хранится сжатым gzip и отдается как есть клиентам, которые
+    принимают gzip; остальным распаковывается без повторной сериализации.
+    ETag выгрузки зависит только от cache_key (в него входят версии
+    моделей), поэтому на совпавший If-None-Match ответ 304 отдается
+    без чтения тела из кэша.
+    """
+    response = export_not_modified(request, cache_key)
+    if response is not None:
+        return response
+    return build_cached_response(request, cache.get(cache_key), content_type)
+
+
+async def aget_cached_export(request: HttpRequest, cache_key: str,
+                             content_type: str = "application/json") -> Optional[HttpResponse]:
+    response = export_not_modified(request, cache_key)
+    if response is not None:
+        return response
+    return build_cached_response(request, await cache.aget(cache_key), content_type)
+
+
+def export_not_modified(request: HttpRequest, cache_key: str) -> Optional[HttpResponse]:
+    response = not_modified(request, key_validators(cache_key))
+    if response is not None:
+        patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+def build_cached_response(request: HttpRequest, entry: Optional[tuple],
+                          content_type: str) -> Optional[HttpResponse]:
+    if entry is None:
+        return None
+    etag, body = entry
+    if re_accepts_gzip.search(request.META.get("HTTP_ACCEPT_ENCODING", "")):
+        response = HttpResponse(body, content_type=content_type)
+        response["Content-Encoding"] = "gzip"
+    else:
+        response = HttpResponse(decompress(body), content_type=content_type)
+    response["ETag"] = etag
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return response
+
+
+class ExportCompressor:
+    """
+    Сжимает выгрузку в gzip по мере отдачи.
+
+    Атрибуты:
+    max_bytes: Integer - Предел размера сжатого тела; после него сжатие прекращается
+    parts: List[bytes] - Сжатые части или None, если выгрузка слишком велика
+    """
+    def __init__(self, max_bytes: int = EXPORT_CACHE_MAX_BYTES):
+        self.compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+        self.max_bytes = max_bytes
+        self.parts: Optional[List[bytes]] = []
+        self.compressed_size = 0
+
+    def feed(self, data: bytes) -> None:
+        if self.parts is None:
+            return
+        part = self.compressor.compress(data)
+        self.compressed_size += len(part)
+        if self.compressed_size > self.max_bytes:
+            self.parts = None
+            return
+        self.parts.append(part)
+
+    def result(self) -> Optional[bytes]:
+        """
+        Сжатое тело для кэша или None, если выгрузка не кэшируется.
+        """
+        if self.parts is None:
+            return None
+        self.parts.append(self.compressor.flush())
+        return b"".join(self.parts)
+
+
+def iter_and_cache(chunks: Iterable[str], cache_key: str,
+                   timeout: int = EXPORT_CACHE_TIMEOUT,
+                   max_bytes: int = EXPORT_CACHE_MAX_BYTES) -> Iterator[bytes]:
+    """
+    Отдает части выгрузки клиенту и одновременно сжимает их в gzip.
+    Когда выгрузка отдана полностью, сжатое тело и ETag
+    сохраняются в кэш; слишком большие выгрузки не кэшируются.
+    """
+    compressor = ExportCompressor(max_bytes)
+    for chunk in chunks:
+        data = chunk.encode()
+        yield data
+        compressor.feed(data)
+    body = compressor.result()
+    if body is not None:
+        cache.set(cache_key, (key_validators(cache_key).etag, body), timeout)
+
+
+async def aiter_and_cache(chunks: AsyncIterable[str], cache_key: str,
+                          timeout: int = EXPORT_CACHE_TIMEOUT,
+                          max_bytes: int = EXPORT_CACHE_MAX_BYTES) -> AsyncIterator[bytes]:
+    compressor = ExportCompressor(max_bytes)
+    async for chunk in chunks:
+        data = chunk.encode()
+        yield data
+        compressor.feed(data)
+    body = compressor.result()
+    if body is not None:
+        await cache.aset(cache_key, (key_validators(cache_key).etag, body), timeout)
+
+
+def stream_export(chunks: Union[Iterable[str], AsyncIterable[str]], cache_key: str,
+                  content_type: str = "application/json") -> StreamingHttpResponse:
+    if hasattr(chunks, "__aiter__"):
+        streaming_content = aiter_and_cache(chunks, cache_key)
+    else:
+        streaming_content = iter_and_cache(chunks, cache_key)
+    response = StreamingHttpResponse(streaming_content, content_type=content_type)
+    patch_vary_headers(response, ("Accept-Encoding",))
+    return set_validators(response, key_validators(cache_key))
@@ -40,15 +40,6 @@ class ProductCreateForm(forms.ModelForm):
             "preview",
         ]
 
-    def save(self, commit=True):
-        product = super(ProductCreateForm, self).save(commit=False)
-        product.preview = None
-        product.save()
-        product.preview = self.cleaned_data["preview"]
-        if commit:
-            product.save()
-        return product
-
 
 class ProductUpdateForm(ProductCreateForm):
     images = MultipleFileField(label=gettext_lazy("Список изображений"), required=False)
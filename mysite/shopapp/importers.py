@@ -0,0 +1,187 @@
+"""
+Пакетный импорт данных интернет-магазина из CSV.
+
+Строки обрабатываются порциями: идентификаторы пользователей и продуктов
+проверяются одним запросом на порцию, заказы и их связи с продуктами
+создаются через bulk_create в транзакции. Число запросов зависит
+от числа порций, а не от числа строк.
+"""
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from mysite.model_versions import bump_version
+
+from .exports import iter_chunks
+from .models import Order, Product
+from .totals import refresh_order_totals
+
+
+IMPORT_CHUNK_SIZE = 1000
+
+PRODUCT_CSV_FIELDS = ("name", "description", "price", "discount")
+PRODUCT_UPSERT_FIELDS = ("name", "description", "price", "discount", "created_by", "updated_at")
+
+
+class RejectedRow(NamedTuple):
+    line: int
+    reason: str
+
+
+class ImportResult:
+    """
+    Итог импорта: число созданных объектов и отклоненные строки.
+    """
+    def __init__(self):
+        self.created = 0
+        self.rejected: List[RejectedRow] = []
+
+    def reject(self, line: int, reason: str) -> None:
+        self.rejected.append(RejectedRow(line, reason))
+
+
+def parse_ids(value: str) -> List[int]:
+    return list(dict.fromkeys(int(item) for item in value.split(",") if item.strip()))
+
+
+def import_orders(rows: Iterable[Dict[str, str]], chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportResult:
+    """
+    Импортирует заказы из строк csv.DictReader с колонками
+    delivery_address, promocode, user, product ("1,2,3").
+    Номера строк в отчете считаются с учетом строки заголовка.
+    """
+    result = ImportResult()
+    through = Order.products.through
+    for chunk in iter_chunks(enumerate(rows, start=2), chunk_size):
+        parsed = []
+        for line, row in chunk:
+            try:
+                parsed.append((
+                    line,
+                    row["delivery_address"],
+                    row["promocode"],
+                    int(row["user"]),
+                    parse_ids(row["product"]),
+                ))
+            except KeyError as exc:
+                result.reject(line, f"Нет колонки {exc}")
+            except (TypeError, ValueError):
+                result.reject(line, "Некорректный идентификатор пользователя или продукта")
+
+        user_ids = {user_id for *_, user_id, _ in parsed}
+        product_ids = {product_id for *_, ids in parsed for product_id in ids}
+        existing_users = set(User.objects.filter(pk__in=user_ids).values_list("pk", flat=True))
+        existing_products = set(Product.objects.filter(pk__in=product_ids).values_list("pk", flat=True))
+
+        orders = []
+        orders_products = []
+        for line, delivery_address, promocode, user_id, ids in parsed:
+            missing_products = [product_id for product_id in ids if product_id not in existing_products]
+            if user_id not in existing_users:
+                result.reject(line, f"Пользователь {user_id} не найден")
+            elif missing_products:
+                result.reject(line, f"Продукты не найдены: {', '.join(map(str, missing_products))}")
+            else:
+                orders.append(Order(
+                    delivery_address=delivery_address,
+                    promocode=promocode,
+                    user_id=user_id,
+                ))
+                orders_products.append(ids)
+
+        with transaction.atomic():
+            created = Order.objects.bulk_create(orders)
+            through.objects.bulk_create([
+                through(order_id=order.pk, product_id=product_id)
+                for order, ids in zip(created, orders_products)
+                for product_id in ids
+            ])
+            refresh_order_totals(Order.objects.filter(pk__in=[order.pk for order in created]))
+        result.created += len(created)
+
+    if result.created:
+        bump_version(Order)
+    return result
+
+
+def validate_product_rows(header: Sequence[str], rows: Sequence[Tuple[int, List[str]]]
+                          ) -> Tuple[List[Dict[str, Any]], List[RejectedRow]]:
+    """
+    Проверяет строки CSV с продуктами и приводит значения к типам полей модели.
+
+    Функция не обращается к базе данных, поэтому ее можно выполнять
+    в пуле процессов. Существование пользователей проверяет тот,
+    кто записывает результат.
+    """
+    fields = {name: Product._meta.get_field(name) for name in (*PRODUCT_CSV_FIELDS, "sku")}
+    valid = []
+    rejected = []
+    for line, values in rows:
+        if len(values) != len(header):
+            rejected.append(RejectedRow(line, f"Ожидалось колонок: {len(header)}, получено: {len(values)}"))
+            continue
+        row = dict(zip(header, values))
+        try:
+            product = {name: fields[name].clean(row[name], None) for name in PRODUCT_CSV_FIELDS}
+            product["created_by_id"] = int(row["user"])
+            product["sku"] = fields["sku"].clean(row.get("sku") or None, None)
+        except KeyError as exc:
+            rejected.append(RejectedRow(line, f"Нет колонки {exc}"))
+        except ValueError:
+            rejected.append(RejectedRow(line, "Некорректный идентификатор пользователя"))
+        except ValidationError as exc:
+            rejected.append(RejectedRow(line, "; ".join(exc.messages)))
+        else:
+            product["line"] = line
+            valid.append(product)
+    return valid, rejected
+
+
+class ProductWriter:
+    """
+    Пакетная запись продуктов с обновлением существующих по артикулу (sku).
+    Продукты без артикула всегда добавляются как новые. bulk_create
+    не отправляет сигналы сохранения, поэтому итоги заказов с продуктами,
+    у которых изменилась цена, пересчитываются здесь же.
+    """
+    def __init__(self, result: ImportResult):
+        self.result = result
+        self.known_users: set = set()
+
+    def check_users(self, user_ids: Iterable[int]) -> None:
+        unknown = set(user_ids) - self.known_users
+        if unknown:
+            self.known_users.update(User.objects.filter(pk__in=unknown).values_list("pk", flat=True))
+
+    def write(self, products: List[Dict[str, Any]]) -> int:
+        self.check_users(product["created_by_id"] for product in products)
+        objects: Dict[Optional[str], Product] = {}
+        unkeyed = []
+        for product in products:
+            line = product.pop("line")
+            if product["created_by_id"] not in self.known_users:
+                self.result.reject(line, f"Пользователь {product['created_by_id']} не найден")
+            elif product["sku"] is None:
+                unkeyed.append(Product(**product))
+            else:
+                # Последняя строка с тем же артикулом в пакете побеждает,
+                # иначе один INSERT ... ON CONFLICT затронул бы строку дважды.
+                objects[product["sku"]] = Product(**product)
+        batch = list(objects.values()) + unkeyed
+        with transaction.atomic():
+            repriced = [
+                sku for sku, price in Product.objects.filter(sku__in=objects).values_list("sku", "price")
+                if price != objects[sku].price
+            ]
+            Product.objects.bulk_create(
+                batch,
+                update_conflicts=True,
+                unique_fields=["sku"],
+                update_fields=PRODUCT_UPSERT_FIELDS,
+            )
+            if repriced:
+                refresh_order_totals(Order.objects.filter(products__sku__in=repriced))
+        self.result.created += len(batch)
+        return len(batch)
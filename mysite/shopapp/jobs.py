@@ -0,0 +1,136 @@
+"""
+Фоновые задачи интернет-магазина: выгрузки, импорт CSV и производные изображений.
+Выполняются процессами manage.py run_workers.
+"""
+import csv
+from io import TextIOWrapper
+from itertools import islice
+from tempfile import TemporaryFile
+
+from django.apps import apps
+from django.core import serializers
+from django.core.files import File
+
+from jobsapp.models import Job
+from jobsapp.registry import register
+from jobsapp.storage import job_storage
+from mysite.images import generate_many
+from mysite.model_versions import bump_version
+
+from .exports import EXPORT_CHUNK_SIZE, Echo, iter_chunks, iter_csv_rows, iter_json_list, iter_order_dicts
+from .importers import ImportResult, ProductWriter, import_orders, validate_product_rows
+from .models import Order, Product
+
+
+MAX_REPORTED_REJECTIONS = 20
+
+
+def iter_selected(job: Job):
+    """
+    Объекты, выбранные в админке, порциями по первичным ключам.
+    """
+    model = apps.get_model(job.params["model"])
+    related = [field.name for field in model._meta.fields if field.is_relation]
+    for pks in iter_chunks(job.params["pks"], EXPORT_CHUNK_SIZE):
+        yield from model._default_manager.filter(pk__in=pks).select_related(*related)
+
+
+def format_import_result(result: ImportResult, action: str) -> str:
+    lines = [f"{action}: {result.created}, отклонено строк: {len(result.rejected)}"]
+    lines.extend(
+        f"Строка {rejected.line}: {rejected.reason}"
+        for rejected in result.rejected[:MAX_REPORTED_REJECTIONS]
+    )
+    return "\n".join(lines)
+
+
+@register("shopapp.export_orders", api=True)
+def export_orders(job: Job) -> str:
+    orders = Order.objects.all()
+    if "user_id" in job.params:
+        orders = orders.filter(user_id=job.params["user_id"])
+    job.save_result("orders-export.json", iter_json_list("orders", iter_order_dicts(orders)))
+    return "Выгрузка заказов готова"
+
+
+@register("shopapp.export_user_orders", api=True, staff_only=False)
+def export_user_orders(job: Job) -> str:
+    orders = Order.objects.filter(user_id=job.created_by_id)
+    job.save_result("user-orders-export.json", iter_json_list("orders", iter_order_dicts(orders)))
+    return "Выгрузка заказов пользователя готова"
+
+
+@register("shopapp.export_products_csv", api=True, staff_only=False)
+def export_products_csv(job: Job) -> str:
+    fields = ["name", "description", "price", "discount", "quantity"]
+    products = Product.objects.filter(archived=False).order_by("pk")
+    job.save_result("products-export.csv", iter_csv_rows(products, fields))
+    return "Выгрузка продуктов готова"
+
+
+@register("shopapp.export_as_csv")
+def export_as_csv(job: Job) -> str:
+    model = apps.get_model(job.params["model"])
+    field_names = [field.name for field in model._meta.fields]
+    writer = csv.writer(Echo())
+
+    def iter_rows():
+        yield writer.writerow(field_names)
+        for obj in iter_selected(job):
+            yield writer.writerow([getattr(obj, field) for field in field_names])
+
+    job.save_result(f"{model._meta}-export.csv", iter_rows())
+    return f"Выгружено объектов: {len(job.params['pks'])}"
+
+
+@register("shopapp.export_as_json")
+def export_as_json(job: Job) -> str:
+    model = apps.get_model(job.params["model"])
+    with TemporaryFile() as tmp:
+        stream = TextIOWrapper(tmp, encoding="utf-8")
+        serializers.serialize("json", iter_selected(job), stream=stream)
+        stream.flush()
+        stream.detach()
+        tmp.seek(0)
+        job.result.save(f"{model.__name__}-export.json", File(tmp), save=False)
+    return f"Выгружено объектов: {len(job.params['pks'])}"
+
+
+@register("shopapp.import_orders_csv")
+def import_orders_csv(job: Job) -> str:
+    try:
+        with job_storage.open(job.params["path"], "rb") as csv_file:
+            reader = csv.DictReader(TextIOWrapper(csv_file, encoding=job.params.get("encoding") or "utf-8"))
+            result = import_orders(reader)
+    finally:
+        job_storage.delete(job.params["path"])
+    return format_import_result(result, "Импортировано заказов")
+
+
+@register("shopapp.import_products_csv")
+def import_products_csv(job: Job) -> str:
+    result = ImportResult()
+    writer = ProductWriter(result)
+    try:
+        with job_storage.open(job.params["path"], "rb") as csv_file:
+            reader = csv.reader(TextIOWrapper(csv_file, encoding=job.params.get("encoding") or "utf-8"))
+            header = next(reader, [])
+            rows = ((reader.line_num, values) for values in reader)
+            while block := list(islice(rows, EXPORT_CHUNK_SIZE)):
+                valid, rejected = validate_product_rows(header, block)
+                result.rejected.extend(rejected)
+                if valid:
+                    writer.write(valid)
+    finally:
+        job_storage.delete(job.params["path"])
+    if result.created:
+        bump_version(Product)
+    result.rejected.sort()
+    return format_import_result(result, "Записано продуктов")
+
+
+@register("images.generate_derivatives")
+def generate_image_derivatives(job: Job) -> str:
+    names = job.params.get("names") or [job.params["name"]]
+    results = generate_many(names)
+    return f"Изображений: {len(results)}, создано вариантов: {sum(len(sizes) for sizes in results)}"
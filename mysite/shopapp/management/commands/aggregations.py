@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
 from shopapp.models import Product, Order
-from django.db.models import Avg, Min, Max, Count, Sum
+from django.db.models import Avg, Min, Max, Count
 
 
 class Command(BaseCommand):
@@ -16,10 +16,7 @@ class Command(BaseCommand):
         )
         print(result)
 
-        orders = Order.objects.annotate(
-            total=Sum("products__price", default=0),
-            products_count=Count("products"),
-        )
+        orders = Order.objects.only("pk", "total_price", "products_count")
         for order in orders:
-            print(f"Заказ {order.pk}: Итого {order.total}, Количество продуктов {order.products_count}")
+            print(f"Заказ {order.pk}: Итого {order.total_price}, Количество продуктов {order.products_count}")
         self.stdout.write(self.style.SUCCESS("Выполнено"))
@@ -0,0 +1,206 @@
+import json
+import platform
+from datetime import datetime
+from statistics import mean, quantiles
+from timeit import default_timer
+from typing import Dict, List, Optional
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils.translation import override
+
+from mysite.querycount import QueryRecorder
+from mysite.seeding import WORDS, scale_counts, seed
+from shopapp.models import Product
+
+
+def get_endpoints() -> Dict[str, str]:
+    user = User.objects.order_by("pk").first()
+    with override("ru"):
+        return {
+            "products_list": reverse("shopapp:products_list"),
+            "products_api": reverse("shopapp:product-list"),
+            "products_api_cursor": reverse("shopapp:product-list") + "?pagination=cursor",
+            "products_api_search": reverse("shopapp:product-list") + f"?search={WORDS[0]}",
+            "products_csv": reverse("shopapp:product-download-csv"),
+            "products_export": reverse("shopapp:products_export"),
+            "orders_export": reverse("shopapp:orders_export"),
+            "user_orders_export": reverse("shopapp:user_orders_export", kwargs={"pk": user.pk}),
+            "articles_list": reverse("blogapp:articles"),
+            "articles_feed": reverse("blogapp:latest_articles"),
+            "products_feed": reverse("shopapp:latest_products"),
+            "sitemap": reverse("django.contrib.sitemaps.views.sitemap"),
+        }
+
+
+def percentile(values: List[float], point: int) -> float:
+    if len(values) < 2:
+        return values[0]
+    return quantiles(values, n=100, method="inclusive")[point - 1]
+
+
+class Command(BaseCommand):
+    """
+    Замеры производительности ключевых страниц и API.
+
+    База для замеров (database/bench-<масштаб>.sqlite3) создается отдельно
+    от рабочей и заполняется данными выбранного масштаба. Каждая страница
+    запрашивается тестовым клиентом, ответ читается целиком.
+    Результаты пишутся в JSON и сравниваются с базовым файлом.
+    """
+    help = "Замеры времени ответа страниц магазина, блога и API"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--scale", type=float, default=1, help="Масштаб данных (см. manage.py seed)")
+        parser.add_argument("--iterations", type=int, default=50, help="Число замеров на страницу")
+        parser.add_argument("--warmup", type=int, default=3, help="Число прогревочных запросов")
+        parser.add_argument("--only", nargs="*", help="Имена страниц для замера")
+        parser.add_argument("--output", help="Файл для результатов в JSON")
+        parser.add_argument("--baseline", help="Файл с результатами для сравнения")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Допустимый рост p50 относительно базового файла")
+        parser.add_argument("--fail-on-regression", action="store_true",
+                            help="Завершаться с ошибкой при регрессии")
+        parser.add_argument("--keepdb", action="store_true",
+                            help="Использовать уже заполненную базу замеров того же масштаба")
+        parser.add_argument("--with-cache", action="store_true",
+                            help="Замерять с кэшем в памяти процесса (по умолчанию без кэша)")
+
+    def handle(self, *args, **options):
+        baseline = self.load_baseline(options["baseline"]) if options["baseline"] else None
+        caches = {"default": {"BACKEND": "django.core.cache.backends.dummy.DummyCache"}}
+        if options["with_cache"]:
+            caches = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+
+        setup_test_environment()
+        old_name = self.setup_database(options["scale"], options["keepdb"])
+        try:
+            with override_settings(CACHES=caches, RATE_LIMITS=[], QUERY_BUDGET_RAISE=False, METRICS_DIR=None):
+                results = self.run(options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0, keepdb=True)
+            teardown_test_environment()
+
+        report = {
+            "meta": {
+                "scale": options["scale"],
+                "iterations": options["iterations"],
+                "with_cache": options["with_cache"],
+                "date": datetime.now().isoformat(timespec="seconds"),
+                "python": platform.python_version(),
+                "django": django.get_version(),
+            },
+            "results": results,
+        }
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f"Результаты записаны в {options['output']}")
+        if baseline is not None:
+            regressions = self.compare(results, baseline, options["threshold"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"Регрессии: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("Выполнено"))
+
+    def setup_database(self, scale: float, keepdb: bool) -> str:
+        old_name = connection.settings_dict["NAME"]
+        connection.settings_dict["TEST"]["NAME"] = str(settings.DATABASE_DIR / f"bench-{scale:g}.sqlite3")
+        connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False, keepdb=keepdb)
+        if keepdb and Product.objects.exists():
+            self.stdout.write("Используется заполненная база замеров")
+        else:
+            started = default_timer()
+            seed(scale_counts(scale), progress=self.stdout.write)
+            self.stdout.write(f"База заполнена за {default_timer() - started:.1f} с")
+        return old_name
+
+    def run(self, options) -> Dict[str, dict]:
+        client = Client(raise_request_exception=False)
+        endpoints = get_endpoints()
+        if options["only"]:
+            unknown = set(options["only"]) - set(endpoints)
+            if unknown:
+                raise CommandError(f"Неизвестные страницы: {', '.join(sorted(unknown))}")
+            endpoints = {name: url for name, url in endpoints.items() if name in options["only"]}
+
+        self.stdout.write(f"{'страница':<22}{'p50 мс':>9}{'p95 мс':>9}{'p99 мс':>9}{'зап/с':>9}{'SQL':>6}")
+        results = {}
+        for name, url in endpoints.items():
+            results[name] = result = self.measure(client, url, options["iterations"], options["warmup"])
+            if "error" in result:
+                self.stdout.write(self.style.ERROR(f"{name:<22}{result['error']}"))
+                continue
+            self.stdout.write(
+                f"{name:<22}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                f"{result['throughput_rps']:>9.1f}{result['queries']:>6.0f}"
+            )
+        return results
+
+    @staticmethod
+    def request(client: Client, url: str):
+        response = client.get(url)
+        if response.streaming:
+            body = b"".join(response.streaming_content)
+        else:
+            body = response.content
+        return response.status_code, len(body)
+
+    def measure(self, client: Client, url: str, iterations: int, warmup: int) -> dict:
+        status, size = self.request(client, url)
+        if status != 200:
+            return {"url": url, "error": f"HTTP {status}"}
+        for _ in range(warmup):
+            self.request(client, url)
+
+        timings, queries = [], []
+        started = default_timer()
+        for _ in range(iterations):
+            recorder = QueryRecorder()
+            with recorder.record():
+                request_started = default_timer()
+                self.request(client, url)
+                timings.append((default_timer() - request_started) * 1000)
+            queries.append(recorder.count)
+        total = default_timer() - started
+        return {
+            "url": url,
+            "p50_ms": percentile(timings, 50),
+            "p95_ms": percentile(timings, 95),
+            "p99_ms": percentile(timings, 99),
+            "mean_ms": mean(timings),
+            "throughput_rps": iterations / total,
+            "queries": mean(queries),
+            "response_bytes": size,
+        }
+
+    @staticmethod
+    def load_baseline(path: str) -> dict:
+        try:
+            with open(path, encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError) as exc:
+            raise CommandError(f"Не удалось прочитать базовый файл: {exc}")
+
+    def compare(self, results: Dict[str, dict], baseline: dict, threshold: float) -> List[str]:
+        regressions = []
+        self.stdout.write(f"Сравнение с базовым файлом ({baseline['meta']['date']}):")
+        for name, result in results.items():
+            previous: Optional[dict] = baseline["results"].get(name)
+            if previous is None or "error" in previous or "error" in result:
+                continue
+            change = result["p50_ms"] / previous["p50_ms"] - 1
+            line = f"{name:<22}{previous['p50_ms']:>9.2f} -> {result['p50_ms']:.2f} мс ({change:+.0%})"
+            if result["queries"] > previous["queries"]:
+                line += f", SQL {previous['queries']:.0f} -> {result['queries']:.0f}"
+            if change > threshold or result["queries"] > previous["queries"]:
+                regressions.append(name)
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        return regressions
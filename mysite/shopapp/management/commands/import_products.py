@@ -0,0 +1,103 @@
+import csv
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from os import cpu_count
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from mysite.model_versions import bump_version
+from shopapp.importers import ImportResult, ProductWriter, validate_product_rows
+from shopapp.models import Product
+
+
+class Command(BaseCommand):
+    """
+    Импорт каталога продуктов из CSV (формат MyCSVFiles/products.csv).
+
+    Главный процесс читает файл и раздает блоки строк пулу процессов
+    на проверку, проверенные строки записываются пакетами одним писателем.
+    Продукты с артикулом (колонка sku) обновляются, остальные добавляются.
+    """
+    help = "Импорт продуктов из CSV с обновлением по артикулу (sku)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Путь к CSV файлу")
+        parser.add_argument("--workers", type=int, default=cpu_count() or 1,
+                            help="Число процессов проверки строк, 0 — проверять в текущем процессе")
+        parser.add_argument("--batch-size", type=int, default=5000, help="Размер пакета записи")
+        parser.add_argument("--encoding", default="utf-8", help="Кодировка файла")
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        result = ImportResult()
+        writer = ProductWriter(result)
+        started = default_timer()
+        processed = 0
+
+        try:
+            csv_file = open(options["path"], encoding=options["encoding"], newline="")
+        except OSError as exc:
+            raise CommandError(f"Не удалось открыть файл: {exc}")
+
+        with csv_file:
+            reader = csv.reader(csv_file)
+            header = next(reader, None)
+            if header is None:
+                raise CommandError("Файл пуст")
+            blocks = self.iter_blocks(reader, batch_size)
+
+            for valid, rejected in self.validate(header, blocks, options["workers"]):
+                result.rejected.extend(rejected)
+                if valid:
+                    writer.write(valid)
+                processed += len(valid) + len(rejected)
+                self.stdout.write(f"Обработано строк: {processed} ({self.rate(processed, started):.0f} строк/с)")
+
+        if result.created:
+            bump_version(Product)
+        elapsed = default_timer() - started
+        for rejected in sorted(result.rejected):
+            self.stderr.write(f"Строка {rejected.line}: {rejected.reason}")
+        self.stdout.write(self.style.SUCCESS(
+            f"Записано продуктов: {result.created}, отклонено строк: {len(result.rejected)}, "
+            f"время: {elapsed:.1f} с, {self.rate(processed, started):.0f} строк/с"
+        ))
+
+    @staticmethod
+    def rate(processed: int, started: float) -> float:
+        elapsed = default_timer() - started
+        return processed / elapsed if elapsed else 0.0
+
+    @staticmethod
+    def iter_blocks(reader, size: int):
+        # Номер строки считается с учетом заголовка; для многострочных
+        # значений в кавычках это номер последней строки записи.
+        rows = ((reader.line_num, values) for values in reader)
+        while block := list(islice(rows, size)):
+            yield block
+
+    @staticmethod
+    def validate(header, blocks, workers: int):
+        """
+        Проверяет блоки строк в пуле процессов, сохраняя порядок блоков.
+        Одновременно в работе не больше 2 * workers блоков,
+        поэтому файл не читается в память целиком.
+        """
+        if workers <= 0:
+            for block in blocks:
+                yield validate_product_rows(header, block)
+            return
+
+        # Дочерние процессы не должны наследовать открытые соединения с базой.
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for block in blocks:
+                pending.append(executor.submit(validate_product_rows, header, block))
+                if len(pending) >= 2 * workers:
+                    yield pending.popleft().result()
+            while pending:
+                yield pending.popleft().result()
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from shopapp.exports import iter_chunks
+from shopapp.models import Order
+from shopapp.totals import refresh_order_totals
+
+
+class Command(BaseCommand):
+    """
+    Полный пересчет Order.total_price и Order.products_count пакетами заказов.
+    """
+    help = "Пересчет итогов заказов"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000, help="Число заказов в одном UPDATE")
+
+    def handle(self, *args, **options):
+        self.stdout.write("Начат пересчет итогов заказов")
+        order_ids = Order.objects.order_by("pk").values_list("pk", flat=True).iterator(chunk_size=options["batch_size"])
+        updated = 0
+        for chunk in iter_chunks(order_ids, options["batch_size"]):
+            updated += refresh_order_totals(Order.objects.filter(pk__in=chunk))
+            self.stdout.write(f"Пересчитано заказов: {updated}")
+        self.stdout.write(self.style.SUCCESS("Выполнено"))
@@ -0,0 +1,44 @@
+from timeit import default_timer
+
+from django.core.management.base import BaseCommand, CommandError
+
+from mysite.seeding import SCALE_UNIT, scale_counts, seed
+
+
+class Command(BaseCommand):
+    """
+    Заполнение базы большим объемом воспроизводимых данных:
+    пользователи, продукты, заказы с продуктами, авторы, категории,
+    теги и статьи блога. Объем задается масштабом (--scale) и может
+    быть уточнен для отдельных видов данных.
+    """
+    help = (
+        "Заполнение базы тестовыми данными "
+        "для нагрузочных замеров"
+    )
+
+    def add_arguments(self, parser):
+        unit = ", ".join(f"{name} {count}" for name, count in SCALE_UNIT.items())
+        parser.add_argument("--scale", type=float, default=1,
+                            help=f"Масштаб: на единицу {unit}")
+        parser.add_argument("--seed", type=int, default=0,
+                            help="Начальное значение генератора")
+        parser.add_argument("--batch-size", type=int, default=5000,
+                            help="Размер пакета вставки")
+        for name in SCALE_UNIT:
+            parser.add_argument(f"--{name}", type=int,
+                                help=f"Число строк вида {name} "
+                                     "вместо рассчитанного по масштабу")
+
+    def handle(self, *args, **options):
+        counts = scale_counts(options["scale"])
+        counts.update({name: options[name] for name in SCALE_UNIT if options[name] is not None})
+        if any(count < 1 for count in counts.values()):
+            raise CommandError(
+                "Число строк каждого вида должно быть положительным"
+            )
+
+        started = default_timer()
+        seed(counts, seed=options["seed"], batch_size=options["batch_size"], progress=self.stdout.write)
+        self.stdout.write(f"Заполнено за {default_timer() - started:.1f} с")
+        self.stdout.write(self.style.SUCCESS("Выполнено"))
@@ -0,0 +1,35 @@
+import sqlite3
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+
+class Command(BaseCommand):
+    """
+    Копирование основной базы SQLite в файлы реплик (settings.DATABASE_REPLICAS)
+    через online backup API: основная база во время копирования доступна.
+    Для локальной проверки маршрутизации чтения на реплику.
+    """
+    help = "Копирование основной базы SQLite в реплики для чтения"
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError("Реплики не настроены (DJANGO_DATABASE_REPLICA)")
+        for primary, replicas in settings.DATABASE_REPLICAS.items():
+            source = connections[primary]
+            if source.vendor != "sqlite":
+                raise CommandError(f"{primary}: поддерживается только SQLite")
+            source.ensure_connection()
+            for alias in replicas:
+                name = str(connections[alias].settings_dict["NAME"])
+                if name == str(source.settings_dict["NAME"]):
+                    continue
+                connections[alias].close()
+                target = sqlite3.connect(name)
+                try:
+                    source.connection.backup(target)
+                finally:
+                    target.close()
+                self.stdout.write(f"{primary} -> {alias} ({name})")
+        self.stdout.write(self.style.SUCCESS("Выполнено"))
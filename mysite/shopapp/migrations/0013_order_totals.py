@@ -0,0 +1,61 @@
+# Generated by Django 5.2.18 on 2026-10-18 05:58
+
+from decimal import Decimal
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+
+def fill_order_totals(apps, schema_editor):
+    Order = apps.get_model("shopapp", "Order")
+    links = (
+        Order.products.through.objects
+        .filter(order_id=OuterRef("pk"))
+        .order_by()
+        .values("order_id")
+    )
+    Order.objects.update(
+        total_price=Coalesce(
+            Subquery(links.annotate(total=Sum("product__price")).values("total")),
+            Value(Decimal(0)),
+            output_field=models.DecimalField(),
+        ),
+        products_count=Coalesce(
+            Subquery(links.annotate(count=Count("product_id")).values("count")),
+            Value(0),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0012_product_sku"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="order",
+            name="products_count",
+            field=models.PositiveIntegerField(
+                db_index=True,
+                default=0,
+                editable=False,
+                verbose_name="Количество продуктов",
+            ),
+        ),
+        migrations.AddField(
+            model_name="order",
+            name="total_price",
+            field=models.DecimalField(
+                db_index=True,
+                decimal_places=2,
+                default=0,
+                editable=False,
+                max_digits=12,
+                verbose_name="Сумма заказа",
+            ),
+        ),
+        migrations.RunPython(fill_order_totals, migrations.RunPython.noop),
+    ]
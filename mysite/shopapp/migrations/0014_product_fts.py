@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:00
+
+from django.db import migrations, models
+
+from shopapp.search import drop_product_fts, ensure_product_fts
+
+
+def create_fts(apps, schema_editor):
+    ensure_product_fts(schema_editor.connection.alias)
+
+
+def drop_fts(apps, schema_editor):
+    drop_product_fts(schema_editor.connection.alias)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0013_order_totals"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="description",
+            field=models.TextField(blank=True, verbose_name="Описание"),
+        ),
+        migrations.RunPython(create_fts, drop_fts),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.18 on 2026-10-18 06:25
+
+import mysite.images
+import shopapp.models
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("shopapp", "0014_product_fts"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="product",
+            name="preview",
+            field=mysite.images.DerivativeImageField(
+                blank=True,
+                null=True,
+                upload_to=shopapp.models.product_preview_directory_path,
+                verbose_name="Предпросмотр",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="productimage",
+            name="image",
+            field=mysite.images.DerivativeImageField(
+                upload_to=shopapp.models.product_images_directory_path,
+                verbose_name="Изображение",
+            ),
+        ),
+    ]
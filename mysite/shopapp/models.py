@@ -2,11 +2,14 @@ from django.contrib.auth.models import User
 from django.db import models
 from django.urls import reverse
 from django.utils.translation import gettext_lazy
-from django_resized import ResizedImageField
+
+from mysite.images import DerivativeImageField
 
 
 def product_preview_directory_path(instance: "Product", filename: str) -> str:
-    return f"products/product_{instance.pk}/preview/{filename}"
+    # Имя файла - хэш содержимого (DerivativeImageField), первичный ключ
+    # для него не нужен, и продукт записывается одним INSERT.
+    return f"products/preview/{filename}"
 
 
 class Product(models.Model):
@@ -21,17 +24,25 @@ class Product(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name', 'id']),
+            models.Index(fields=['price', 'id']),
+            models.Index(fields=['discount', 'id']),
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     name = models.CharField(verbose_name=gettext_lazy("Название"), max_length=30, db_index=True)
-    description = models.TextField(verbose_name=gettext_lazy("Описание"), null=False, blank=True, db_index=True)
+    sku = models.CharField(verbose_name=gettext_lazy("Артикул"), max_length=64, unique=True, null=True, blank=True)
+    description = models.TextField(verbose_name=gettext_lazy("Описание"), null=False, blank=True)
     price = models.DecimalField(verbose_name=gettext_lazy("Цена"), default=0, max_digits=8, decimal_places=2)
     discount = models.PositiveSmallIntegerField(verbose_name=gettext_lazy("Процент скидки"), default=0)
     quantity = models.PositiveSmallIntegerField(verbose_name=gettext_lazy("Количество товара"), default=0)
     created_at = models.DateTimeField(verbose_name=gettext_lazy("Время создания"), auto_now_add=True)
+    updated_at = models.DateTimeField(verbose_name=gettext_lazy("Время изменения"), auto_now=True, db_index=True)
     created_by = models.ForeignKey(User, verbose_name=gettext_lazy("Пользователь"), on_delete=models.PROTECT)
     archived = models.BooleanField(default=False)
-    preview = ResizedImageField(verbose_name=gettext_lazy("Предпросмотр"), null=True, blank=True,
-                                upload_to=product_preview_directory_path)
+    preview = DerivativeImageField(verbose_name=gettext_lazy("Предпросмотр"), null=True, blank=True,
+                                   upload_to=product_preview_directory_path)
 
     def get_absolute_url(self):
         return reverse("shopapp:products_detail", kwargs={"pk": self.pk})
@@ -47,7 +58,7 @@ def product_images_directory_path(instance: "ProductImage", filename: str):
 class ProductImage(models.Model):
     objects = None
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="images")
-    image = ResizedImageField(verbose_name=gettext_lazy("Изображение"), upload_to=product_images_directory_path)
+    image = DerivativeImageField(verbose_name=gettext_lazy("Изображение"), upload_to=product_images_directory_path)
     description = models.CharField(max_length=100, null=False, blank=True)
 
 
@@ -61,6 +72,9 @@ class Order(models.Model):
 
     class Meta:
         ordering = ['pk']
+        indexes = [
+            models.Index(fields=['created_at', 'id']),
+        ]
 
     delivery_address = models.TextField(
         verbose_name=gettext_lazy("Адрес доставки"),
@@ -77,6 +91,11 @@ class Order(models.Model):
         verbose_name=gettext_lazy("Время создания"),
         auto_now_add=True
     )
+    updated_at = models.DateTimeField(
+        verbose_name=gettext_lazy("Время изменения"),
+        auto_now=True,
+        db_index=True,
+    )
     user = models.ForeignKey(
         User,
         verbose_name=gettext_lazy("Пользователь"),
@@ -84,6 +103,20 @@ class Order(models.Model):
         related_name="orders"
     )
     products = models.ManyToManyField(Product, verbose_name=gettext_lazy("Продукт"), related_name="orders")
+    total_price = models.DecimalField(
+        verbose_name=gettext_lazy("Сумма заказа"),
+        default=0,
+        max_digits=12,
+        decimal_places=2,
+        db_index=True,
+        editable=False,
+    )
+    products_count = models.PositiveIntegerField(
+        verbose_name=gettext_lazy("Количество продуктов"),
+        default=0,
+        db_index=True,
+        editable=False,
+    )
     receipt = models.FileField(null=True, upload_to="orders/receipts/")
 
     def __str__(self) -> str:
@@ -0,0 +1,220 @@
+"""
+Пагинация API интернет-магазина.
+
+Помимо постраничной пагинации поддерживается курсорная (keyset):
+страница выбирается условием по полям сортировки, а не OFFSET,
+поэтому стоимость запроса не зависит от номера страницы.
+"""
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from binascii import Error as BinasciiError
+from datetime import datetime, time
+from typing import Any, List, Optional, Tuple
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q, QuerySet
+from rest_framework.exceptions import NotFound, ValidationError as RequestValidationError
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """
+    DjangoJSONEncoder без округления времени до миллисекунд: курсор
+    должен указывать ровно на последнюю запись страницы.
+    """
+    def default(self, o):
+        if isinstance(o, (datetime, time)):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """
+    Курсорная пагинация по текущей сортировке queryset.
+
+    Сортировка берется из queryset (в том числе выставленная OrderingFilter)
+    и дополняется первичным ключом, чтобы позиция была однозначной.
+    Курсор — закодированные в base64 значения полей сортировки
+    первой или последней записи страницы. Сортировку, которую нельзя
+    выразить значениями полей (extra order_by, например релевантность
+    полнотекстового поиска, или выражения), курсор не сохранил бы:
+    такой запрос отклоняется с ошибкой 400.
+    """
+    page_size = api_settings.PAGE_SIZE
+    cursor_query_param = "cursor"
+    tie_breaker = "pk"
+    invalid_cursor_message = "Неверный курсор"
+    unsupported_ordering_message = (
+        "Курсорная пагинация недоступна для сортировки по релевантности: "
+        "укажите ordering или используйте постраничную пагинацию"
+    )
+
+    def paginate_queryset(self, queryset: QuerySet, request, view=None) -> Optional[List]:
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        self.fields = [self.get_field(queryset.model, name.lstrip("-")) for name in self.ordering]
+        position, reverse = self.decode_cursor(request)
+
+        ordering = [self.invert(name) for name in self.ordering] if reverse else self.ordering
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self.get_position_filter(position, reverse))
+
+        results = list(queryset[:self.page_size + 1])
+        has_more = len(results) > self.page_size
+        results = results[:self.page_size]
+        if reverse:
+            results.reverse()
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+        self.page = results
+        return results
+
+    def get_paginated_response(self, data) -> Response:
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Курсор страницы из ссылок next/previous",
+                "schema": {"type": "string"},
+            },
+        ]
+
+    def get_ordering(self, queryset: QuerySet) -> List[str]:
+        ordering = list(queryset.query.order_by or queryset.model._meta.ordering)
+        if queryset.query.extra_order_by or not all(isinstance(name, str) for name in ordering):
+            raise RequestValidationError({self.cursor_query_param: [self.unsupported_ordering_message]})
+        pk_names = {"pk", queryset.model._meta.pk.name}
+        if not any(name.lstrip("-") in pk_names for name in ordering):
+            descending = bool(ordering) and ordering[-1].startswith("-")
+            ordering.append(f"-{self.tie_breaker}" if descending else self.tie_breaker)
+        return ordering
+
+    @staticmethod
+    def get_field(model, name: str):
+        try:
+            return model._meta.pk if name == "pk" else model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return None
+
+    @staticmethod
+    def invert(name: str) -> str:
+        return name[1:] if name.startswith("-") else f"-{name}"
+
+    def get_position_filter(self, position: List[Any], reverse: bool) -> Q:
+        """
+        Условие "строго после позиции" для составного ключа сортировки:
+        (a > x) OR (a = x AND b > y) OR ...
+        """
+        condition = Q()
+        equal = Q()
+        for name, value in zip(self.ordering, position):
+            field = name.lstrip("-")
+            descending = name.startswith("-") != reverse
+            condition |= equal & Q(**{f"{field}__{'lt' if descending else 'gt'}": value})
+            equal &= Q(**{field: value})
+        return condition
+
+    def get_position(self, obj) -> List[Any]:
+        return [getattr(obj, name.lstrip("-")) for name in self.ordering]
+
+    def encode_cursor(self, position: List[Any], reverse: bool) -> str:
+        payload = json.dumps({"p": position, "r": int(reverse)}, cls=CursorJSONEncoder)
+        cursor = urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request) -> Tuple[Optional[List[Any]], bool]:
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            payload = json.loads(urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+            position = payload["p"]
+            if len(position) != len(self.ordering):
+                raise ValueError
+            position = [
+                field.to_python(value) if field is not None else value
+                for field, value in zip(self.fields, position)
+            ]
+            return position, bool(payload["r"])
+        except (BinasciiError, KeyError, TypeError, ValueError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_next_link(self) -> Optional[str]:
+        if not self.has_next:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[-1]), reverse=False)
+
+    def get_previous_link(self) -> Optional[str]:
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.request.build_absolute_uri(), self.cursor_query_param)
+        return self.encode_cursor(self.get_position(self.page[0]), reverse=True)
+
+
+class OptionalKeysetPagination(PageNumberPagination):
+    """
+    Постраничная пагинация с возможностью перейти на курсорную:
+    ?pagination=cursor (или наличие параметра cursor) включает KeysetPagination.
+    """
+    mode_query_param = "pagination"
+    keyset_mode = "cursor"
+    keyset_class = KeysetPagination
+
+    def __init__(self):
+        self.keyset = None
+
+    def uses_keyset(self, request) -> bool:
+        return (
+            request.query_params.get(self.mode_query_param) == self.keyset_mode
+            or self.keyset_class.cursor_query_param in request.query_params
+        )
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.uses_keyset(request):
+            self.keyset = self.keyset_class()
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+    def get_schema_operation_parameters(self, view):
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            "name": self.mode_query_param,
+            "required": False,
+            "in": "query",
+            "description": "Режим пагинации: cursor — курсорная пагинация без COUNT и OFFSET",
+            "schema": {"type": "string", "enum": [self.keyset_mode]},
+        })
+        return parameters + self.keyset_class().get_schema_operation_parameters(view)
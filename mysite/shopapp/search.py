@@ -0,0 +1,118 @@
+"""
+Полнотекстовый поиск продуктов на SQLite FTS5.
+
+Индекс shopapp_product_fts хранит только токены (external content)
+и синхронизируется с shopapp_product триггерами, поэтому учитывает
+и bulk_create, и QuerySet.update. На других СУБД поиск откатывается
+к обычному SearchFilter.
+"""
+from typing import Dict, List
+
+from django.db import connections
+from django.db.models import QuerySet
+from rest_framework.filters import SearchFilter
+
+FTS_TABLE = "shopapp_product_fts"
+
+_fts_available: Dict[str, bool] = {}
+
+
+def get_fts_sql(table: str) -> List[str]:
+    return [
+        f"""
+        CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+            name, description,
+            content='{table}', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+        )
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN
+            INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON {table} BEGIN
+            INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description)
+            VALUES ('delete', old.id, old.name, old.description);
+            INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description);
+        END
+        """,
+    ]
+
+
+def ensure_product_fts(using: str = "default", table: str = "shopapp_product") -> None:
+    """
+    Создает индекс и триггеры, если их нет, и перестраивает индекс,
+    если триггеры пропали. На SQLite миграции, пересоздающие таблицу
+    продуктов, удаляют ее триггеры, поэтому функция вызывается
+    после каждого migrate.
+    """
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name LIKE %s",
+            [f"{FTS_TABLE}_a_"],
+        )
+        triggers_count = cursor.fetchone()[0]
+        for sql in get_fts_sql(table):
+            cursor.execute(sql)
+        if triggers_count < 3:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+    _fts_available.pop(using, None)
+
+
+def drop_product_fts(using: str = "default") -> None:
+    connection = connections[using]
+    if connection.vendor != "sqlite":
+        return
+    with connection.cursor() as cursor:
+        for suffix in ("ai", "ad", "au"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {FTS_TABLE}_{suffix}")
+        cursor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+    _fts_available.pop(using, None)
+
+
+def fts_available(using: str) -> bool:
+    if using not in _fts_available:
+        connection = connections[using]
+        _fts_available[using] = (
+            connection.vendor == "sqlite"
+            and FTS_TABLE in connection.introspection.table_names()
+        )
+    return _fts_available[using]
+
+
+def build_match_query(terms: List[str]) -> str:
+    """
+    Каждый термин ищется как префикс и экранируется кавычками,
+    поэтому пользовательский ввод не разбирается как синтаксис FTS5.
+    """
+    return " ".join('"{}"*'.format(term.replace('"', '""')) for term in terms)
+
+
+class ProductFullTextSearchFilter(SearchFilter):
+    """
+    Поиск продуктов по индексу FTS5 с сортировкой по релевантности (bm25).
+    Явная сортировка через OrderingFilter имеет приоритет над релевантностью.
+    """
+    def filter_queryset(self, request, queryset: QuerySet, view) -> QuerySet:
+        terms = self.get_search_terms(request)
+        if not terms or not fts_available(queryset.db):
+            return super().filter_queryset(request, queryset, view)
+        table = queryset.model._meta.db_table
+        return queryset.extra(
+            tables=[FTS_TABLE],
+            where=[f"{FTS_TABLE}.rowid = {table}.id", f"{FTS_TABLE} MATCH %s"],
+            params=[build_match_query(terms)],
+            select={"search_rank": f"{FTS_TABLE}.rank"},
+            order_by=["search_rank"],
+        )
@@ -28,4 +28,10 @@ class OrderSerializer(serializers.ModelSerializer):
             "user",
             "products",
             "receipt",
+            "total_price",
+            "products_count",
+        )
+        read_only_fields = (
+            "total_price",
+            "products_count",
         )
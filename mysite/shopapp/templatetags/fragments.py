@@ -0,0 +1,58 @@
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+from mysite.fragments import VersionsCache, fragment_key
+
+
+register = template.Library()
+
+
+class FragmentNode(template.Node):
+    """
+    Узел {% fragment %}: отдает закэшированный фрагмент или рендерит
+    вложенные узлы и сохраняет результат на FRAGMENT_CACHE_TIMEOUT.
+
+    Атрибуты:
+    nodelist: NodeList - Содержимое фрагмента
+    name: FilterExpression - Имя фрагмента
+    target: FilterExpression - QuerySet или объект модели
+    vary_on: List[FilterExpression] - Дополнительные части ключа
+    """
+    def __init__(self, nodelist, name, target, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.target = target
+        self.vary_on = vary_on
+
+    def render(self, context):
+        versions = context.render_context.setdefault(self, VersionsCache())
+        key = fragment_key(
+            self.name.resolve(context),
+            self.target.resolve(context),
+            [var.resolve(context) for var in self.vary_on],
+            versions,
+        )
+        fragment = cache.get(key)
+        if fragment is None:
+            fragment = self.nodelist.render(context)
+            cache.set(key, fragment, settings.FRAGMENT_CACHE_TIMEOUT)
+        return fragment
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    {% fragment "имя" queryset_или_объект [доп. части ключа...] %} ... {% endfragment %}
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' принимает имя фрагмента и QuerySet или объект")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(bit) for bit in bits[3:]],
+    )
@@ -0,0 +1,48 @@
+from typing import List, Tuple
+
+from django import template
+from django.conf import settings
+from django.db.models.fields.files import FieldFile
+from django.utils.html import format_html, format_html_join
+
+from mysite.images import IMAGE_MIME_TYPES, derivative_sources
+
+
+register = template.Library()
+
+
+def format_srcset(variants: List[Tuple[str, str, int]]) -> str:
+    return ", ".join(f"{url} {width}w" for _, url, width in variants)
+
+
+@register.simple_tag
+def srcset(file: FieldFile, fmt: str = "jpeg") -> str:
+    """
+    Значение атрибута srcset: все варианты изображения в формате fmt.
+    """
+    if not file:
+        return ""
+    return format_srcset(derivative_sources(file)[fmt])
+
+
+@register.simple_tag
+def picture(file: FieldFile, variant: str, sizes: str, alt: str = "", **attrs) -> str:
+    """
+    Элемент <picture>: источники во всех форматах IMAGE_FORMATS с srcset,
+    браузер выбирает формат и размер под экран. Последний формат
+    (JPEG) - запасной, его вариант variant служит src.
+    """
+    if not file:
+        return ""
+    sources = derivative_sources(file)
+    fallback = sources[settings.IMAGE_FORMATS[-1]]
+    source_tags = format_html_join(
+        "",
+        '<source type="{}" srcset="{}" sizes="{}">',
+        ((IMAGE_MIME_TYPES[fmt], format_srcset(sources[fmt]), sizes) for fmt in settings.IMAGE_FORMATS[:-1]),
+    )
+    src = next(url for name, url, _ in fallback if name == variant)
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" sizes="{}" alt="{}" loading="lazy" decoding="async"{}></picture>',
+        source_tags, src, format_srcset(fallback), sizes, alt, format_html_join("", ' {}="{}"', attrs.items()),
+    )
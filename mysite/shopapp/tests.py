@@ -1,10 +1,31 @@
+import csv
+import gzip
+import io
 import json
+import os
+import tempfile
+from datetime import timedelta
 from random import choices
 from string import ascii_letters
 
 from django.contrib.auth.models import Group, Permission, User
-from django.test import TestCase
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.translation import override
+from blogapp.models import Article, Author, Category, Tag
+from jobsapp.models import Job
+from mysite.feeds import AsyncFeed
+from mysite.images import derivative_name, generate_derivatives, get_signer, image_key
+from mysite.model_versions import get_version
+from PIL import Image
+from shopapp.importers import import_orders
 from shopapp.models import Order, Product
 
 
@@ -156,6 +177,7 @@ class OrderDetailViewTestCase(TestCase):
         self.assertContains(response, 'Информация о заказе')
         self.assertContains(response, self.order.delivery_address)
         self.assertContains(response, self.order.promocode)
+        self.assertContains(response, self.user.username)
         self.assertTrue(response.context['orders'].pk, self.order.pk)
 
 
@@ -178,7 +200,7 @@ class ProductDataExportViewTestCase(TestCase):
             }
             for product in products
         ]
-        products_data = response.json()
+        products_data = json.loads(response.getvalue())
         self.assertEqual(products_data['products'], expected_data)
 
 
@@ -190,8 +212,10 @@ class OrderDataExporterTestCase(TestCase):
     ]
 
     def test_get_orders_view(self):
-        response = self.client.get(reverse('shopapp:orders_export'))
-        self.assertEqual(response.status_code, 200)
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('shopapp:orders_export'))
+            self.assertEqual(response.status_code, 200)
+            content = b''.join(response.streaming_content)
         orders = Order.objects.order_by('pk').all()
         expected_data = [
             {
@@ -212,5 +236,594 @@ class OrderDataExporterTestCase(TestCase):
             }
             for order in orders
         ]
-        orders_data = response.json()
+        orders_data = json.loads(content)
         self.assertEqual(orders_data['orders'], expected_data)
+
+
+class ProductCSVExportViewTestCase(TestCase):
+    fixtures = [
+        'user-fixture.json',
+        'products-fixture.json',
+    ]
+
+    def test_download_csv_is_streamed(self):
+        with override('ru'):
+            url = reverse('shopapp:product-download-csv')
+        response = self.client.get(url, {'ordering': 'discount'})
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        content = b''.join(response.streaming_content).decode()
+        rows = list(csv.reader(content.splitlines()))
+        self.assertEqual(rows[0], ['name', 'description', 'price', 'discount', 'quantity'])
+        expected_rows = [
+            [product.name, product.description, str(product.price), str(product.discount), str(product.quantity)]
+            for product in Product.objects.order_by('discount')
+        ]
+        self.assertEqual(rows[1:], expected_rows)
+
+
+class ProductKeysetPaginationTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_user', password='test_password')
+        Product.objects.bulk_create([
+            Product(name=f'Product {index:02}', price=index % 4, discount=index % 3, created_by=cls.user)
+            for index in range(25)
+        ])
+
+    def collect_pages(self, url, params):
+        pks = []
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url, params)
+            self.assertEqual(response.status_code, 200)
+            data = response.json()
+            self.assertNotIn('count', data)
+            pks.extend(product['pk'] for product in data['results'])
+            url, params = data['next'], None
+        return pks
+
+    def test_cursor_pages_follow_ordering(self):
+        with override('ru'):
+            url = reverse('shopapp:product-list')
+        for ordering in ('price', '-discount', 'name'):
+            pks = self.collect_pages(url, {'pagination': 'cursor', 'ordering': ordering})
+            tie_breaker = '-pk' if ordering.startswith('-') else 'pk'
+            expected = list(Product.objects.order_by(ordering, tie_breaker).values_list('pk', flat=True))
+            self.assertEqual(pks, expected)
+
+    def test_previous_link_returns_previous_page(self):
+        with override('ru'):
+            url = reverse('shopapp:product-list')
+        first = self.client.get(url, {'pagination': 'cursor', 'ordering': 'price'}).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(self.client.get(second['previous']).json()['results'], first['results'])
+
+    def test_cursor_keeps_microseconds(self):
+        user = User.objects.create_superuser(username='cursor_admin', password='test_password')
+        orders = Order.objects.bulk_create([Order(delivery_address=f'Street {index}', user=user) for index in range(25)])
+        started = timezone.now().replace(microsecond=0)
+        for index, order in enumerate(orders):
+            # Все заказы в пределах одной миллисекунды.
+            Order.objects.filter(pk=order.pk).update(created_at=started + timedelta(microseconds=index * 10))
+        self.client.force_login(user)
+        with override('ru'):
+            url = reverse('shopapp:order-list')
+        params = {'pagination': 'cursor', 'ordering': 'created_at'}
+        pks = []
+        while url and len(pks) <= len(orders):
+            data = self.client.get(url, params).json()
+            pks.extend(order['pk'] for order in data['results'])
+            url, params = data['next'], None
+        self.assertEqual(pks, [order.pk for order in orders])
+
+    def test_invalid_cursor(self):
+        with override('ru'):
+            url = reverse('shopapp:product-list')
+        response = self.client.get(url, {'cursor': 'broken'})
+        self.assertEqual(response.status_code, 404)
+
+
+class ProductFullTextSearchTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_user', password='test_password')
+        Product.objects.bulk_create([
+            Product(name='Ноутбук', description='Легкий ноутбук для работы', created_by=cls.user),
+            Product(name='Сумка', description='Сумка для ноутбука', created_by=cls.user),
+            Product(name='Телефон', description='Смартфон', created_by=cls.user),
+        ])
+        with override('ru'):
+            cls.url = reverse('shopapp:product-list')
+
+    def search(self, query):
+        response = self.client.get(self.url, {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [product['name'] for product in response.json()['results']]
+
+    def test_results_ranked_by_relevance(self):
+        self.assertEqual(self.search('ноутбук'), ['Ноутбук', 'Сумка'])
+
+    def test_prefix_terms_are_combined(self):
+        self.assertEqual(self.search('сум ноут'), ['Сумка'])
+        self.assertEqual(self.search('"смарт OR'), [])
+
+    def test_index_follows_updates(self):
+        Product.objects.filter(name='Телефон').update(description='Смартфон и ноутбук')
+        Product.objects.filter(name='Сумка').delete()
+        self.assertEqual(self.search('ноутбук'), ['Ноутбук', 'Телефон'])
+
+    def test_cursor_requires_explicit_ordering(self):
+        response = self.client.get(self.url, {'search': 'ноутбук', 'pagination': 'cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('cursor', response.json())
+        response = self.client.get(self.url, {'search': 'ноутбук', 'pagination': 'cursor', 'ordering': 'name'})
+        self.assertEqual([product['name'] for product in response.json()['results']], ['Ноутбук', 'Сумка'])
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ExportCacheInvalidationTestCase(TestCase):
+    fixtures = [
+        'user-fixture.json',
+        'products-fixture.json',
+        'orders-fixture.json',
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_products_export_is_cached_until_product_changes(self):
+        response = self.client.get(reverse('shopapp:products_export'))
+        self.assertTrue(response.streaming)
+        expected_content = response.getvalue()
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('shopapp:products_export'))
+        self.assertEqual(response.content, expected_content)
+
+        product = Product.objects.order_by('pk').first()
+        product.name = 'Renamed'
+        with self.captureOnCommitCallbacks(execute=True):
+            product.save()
+        response = self.client.get(reverse('shopapp:products_export'))
+        self.assertEqual(json.loads(response.getvalue())['products'][0]['name'], 'Renamed')
+
+    def test_cached_export_is_served_compressed_with_etag(self):
+        plain_content = self.client.get(reverse('shopapp:orders_export')).getvalue()
+        response = self.client.get(reverse('shopapp:orders_export'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain_content)
+
+        response = self.client.get(reverse('shopapp:orders_export'), HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_user_orders_export_is_invalidated_by_m2m_change(self):
+        order = Order.objects.first()
+        url = reverse('shopapp:user_orders_export', kwargs={'pk': order.user_id})
+        response = self.client.get(url)
+        self.assertEqual(len(json.loads(response.getvalue())['orders'][0]['products']), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            order.products.clear()
+        response = self.client.get(url)
+        self.assertEqual(json.loads(response.getvalue())['orders'][0]['products'], [])
+
+    def test_version_is_bumped_after_commit(self):
+        product = Product.objects.order_by('pk').first()
+        version = get_version(Product)
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                product.name = 'Renamed'
+                product.save()
+                # До фиксации параллельный запрос закэшировал бы старые данные под новой версией.
+                self.assertEqual(get_version(Product), version)
+            self.assertEqual(get_version(Product), version)
+        self.assertGreater(get_version(Product), version)
+
+
+class OrderImportTestCase(TestCase):
+    fixtures = [
+        'user-fixture.json',
+        'products-fixture.json',
+    ]
+
+    def test_import_orders_in_chunks(self):
+        rows = [
+            'delivery_address,promocode,user,product',
+            'First street,PROMO1,1,"7,8"',
+            'Second street,,3,8',
+            'Broken street,,unknown,7',
+            'Lost street,,1,"7,999"',
+            'Nobody street,,999,7',
+            'Third street,PROMO3,1,7',
+        ]
+        reader = csv.DictReader(io.StringIO('\n'.join(rows)))
+
+        result = import_orders(reader, chunk_size=2)
+
+        self.assertEqual(result.created, 3)
+        self.assertEqual([rejected.line for rejected in result.rejected], [4, 5, 6])
+        order = Order.objects.get(delivery_address='First street')
+        self.assertEqual(order.user_id, 1)
+        self.assertEqual(sorted(order.products.values_list('pk', flat=True)), [7, 8])
+        self.assertEqual(Order.objects.get(delivery_address='Third street').products.count(), 1)
+        self.assertEqual(order.products_count, 2)
+        self.assertEqual(order.total_price, sum(order.products.values_list('price', flat=True)))
+
+
+class ImportProductsCommandTestCase(TestCase):
+    fixtures = [
+        'user-fixture.json',
+    ]
+
+    def run_import(self, *rows, workers=0):
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False, encoding='utf-8') as csv_file:
+            csv_file.write('name,description,price,discount,user,sku\n')
+            csv_file.write('\n'.join(rows))
+        self.addCleanup(os.remove, csv_file.name)
+        stdout, stderr = io.StringIO(), io.StringIO()
+        call_command('import_products', csv_file.name, workers=workers, batch_size=2, stdout=stdout, stderr=stderr)
+        return stdout.getvalue(), stderr.getvalue()
+
+    def test_import_upserts_by_sku(self):
+        self.run_import(
+            'Laptop,First,100.00,5,1,LAPTOP-1',
+            'Phone,Second,50.00,0,3,PHONE-1',
+            'Cable,No sku,5.00,0,1,',
+        )
+        stdout, stderr = self.run_import(
+            'Laptop Pro,Updated,120.50,10,1,LAPTOP-1',
+            'Mouse,New,15.00,0,999,MOUSE-1',
+            'Pad,Bad price,abc,0,1,PAD-1',
+        )
+
+        self.assertEqual(Product.objects.count(), 3)
+        laptop = Product.objects.get(sku='LAPTOP-1')
+        self.assertEqual((laptop.name, laptop.description, str(laptop.price), laptop.discount),
+                         ('Laptop Pro', 'Updated', '120.50', 10))
+        self.assertIn('Строка 3: Пользователь 999 не найден', stderr)
+        self.assertIn('Строка 4:', stderr)
+        self.assertIn('строк/с', stdout)
+
+    def test_upsert_refreshes_order_totals(self):
+        self.run_import('Laptop,First,10.00,0,1,LAPTOP-1', 'Phone,Second,5.00,0,1,PHONE-1')
+        order = Order.objects.create(delivery_address='TestStreet', user_id=1)
+        order.products.set(Product.objects.all())
+        self.run_import('Laptop,First,20.00,0,1,LAPTOP-1')
+        order.refresh_from_db()
+        self.assertEqual(str(order.total_price), '25.00')
+
+
+class SeedCommandTestCase(TestCase):
+    def seed(self):
+        call_command(
+            'seed', seed=42, users=5, products=20, orders=10, authors=2, categories=2, tags=4, articles=6,
+            stdout=io.StringIO(),
+        )
+        return list(Order.objects.values_list('pk', 'user_id', 'delivery_address', 'total_price', 'products_count'))
+
+    def test_seed_is_reproducible(self):
+        orders = self.seed()
+        self.assertEqual(len(orders), 10)
+        self.assertEqual(Product.objects.count(), 20)
+        self.assertEqual(Article.tags.through.objects.count(), 6 * 3)
+        for order in Order.objects.prefetch_related('products'):
+            self.assertEqual(order.products_count, len(order.products.all()))
+            self.assertEqual(order.total_price, sum(product.price for product in order.products.all()))
+
+        Order.objects.all().delete()
+        Product.objects.all().delete()
+        Article.objects.all().delete()
+        User.objects.all().delete()
+        self.assertEqual(self.seed(), orders)
+
+    def test_search_index_is_rebuilt(self):
+        self.seed()
+        name = Product.objects.order_by('pk').first().name
+        with override('ru'):
+            response = self.client.get(reverse('shopapp:product-list'), {'search': name})
+        self.assertIn(name, [product['name'] for product in response.json()['results']])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_versions_of_all_registered_models_are_bumped(self):
+        models = [User, Product, Order, Article, Author, Category, Tag]
+        versions = [get_version(model) for model in models]
+        self.seed()
+        for model, version in zip(models, versions):
+            self.assertGreater(get_version(model), version, model.__name__)
+
+
+class SeedDurabilityTestCase(TransactionTestCase):
+    def synchronous(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA synchronous')
+            return cursor.fetchone()[0]
+
+    def test_synchronous_is_restored(self):
+        before = self.synchronous()
+        call_command('seed', users=2, products=2, orders=2, authors=1, categories=1, tags=3, articles=1,
+                     stdout=io.StringIO())
+        self.assertEqual(self.synchronous(), before)
+
+
+class OrderTotalsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_user', password='test_password')
+        cls.laptop = Product.objects.create(name='Laptop', price='100.00', created_by=cls.user)
+        cls.phone = Product.objects.create(name='Phone', price='50.50', created_by=cls.user)
+        cls.order = Order.objects.create(delivery_address='TestStreet', user=cls.user)
+
+    def assertTotals(self, total_price, products_count):
+        self.order.refresh_from_db()
+        self.assertEqual(str(self.order.total_price), total_price)
+        self.assertEqual(self.order.products_count, products_count)
+
+    def test_totals_follow_products_and_prices(self):
+        self.order.products.add(self.laptop, self.phone)
+        self.assertTotals('150.50', 2)
+
+        self.phone.price = '60.00'
+        self.phone.save()
+        self.assertTotals('160.00', 2)
+
+        self.laptop.orders.remove(self.order)
+        self.assertTotals('60.00', 1)
+
+        self.phone.delete()
+        self.assertTotals('0.00', 0)
+
+    def test_rebuild_command(self):
+        self.order.products.add(self.laptop)
+        Order.objects.update(total_price=0, products_count=0)
+        call_command('rebuild_order_totals', stdout=io.StringIO())
+        self.assertTotals('100.00', 1)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class AsyncViewsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='test_user', password='test_password')
+        cls.laptop = Product.objects.create(name='Laptop', description='Ноутбук', price='100.00', created_by=cls.user)
+        cls.phone = Product.objects.create(name='Phone', description='Телефон', price='50.50', created_by=cls.user)
+        cls.order = Order.objects.create(delivery_address='TestStreet', user=cls.user)
+        cls.order.products.add(cls.laptop, cls.phone)
+
+    def setUp(self):
+        cache.clear()
+
+    async def get(self, name, **kwargs):
+        with override('ru'):
+            url = reverse(name, kwargs=kwargs)
+        return await self.async_client.get(url)
+
+    async def test_product_pages(self):
+        response = await self.get('shopapp:products_list')
+        self.assertContains(response, 'Laptop')
+        self.assertContains(response, 'Phone')
+        response = await self.get('shopapp:products_detail', pk=self.laptop.pk)
+        self.assertContains(response, 'Ноутбук')
+        response = await self.get('shopapp:products_detail', pk=0)
+        self.assertEqual(response.status_code, 404)
+
+    async def test_exports_are_streamed_asynchronously(self):
+        response = await self.get('shopapp:user_orders_export', pk=self.user.pk)
+        self.assertTrue(response.is_async)
+        content = b''.join([chunk async for chunk in response.streaming_content])
+        orders = json.loads(content)['orders']
+        self.assertEqual([product['name'] for product in orders[0]['products']], ['Laptop', 'Phone'])
+
+        response = await self.get('shopapp:user_orders_export', pk=self.user.pk)
+        self.assertFalse(response.streaming)
+        self.assertEqual(json.loads(response.content)['orders'], orders)
+
+    async def test_feeds(self):
+        response = await self.get('shopapp:latest_products')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<title>Phone</title>')
+        self.assertContains(response, '<title>Laptop</title>')
+        response = await self.get('blogapp:latest_articles')
+        self.assertEqual(response.status_code, 200)
+
+        class OrderFeed(AsyncFeed):
+            model = Order
+
+        self.assertEqual([order.pk async for order in OrderFeed().get_items()], [self.order.pk])
+        with self.assertRaises(ImproperlyConfigured):
+            AsyncFeed().get_items()
+
+
+@override_settings(
+    IMAGE_VARIANTS={'thumb': (40, 40), 'detail': (100, 100)},
+    CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}},
+)
+class ImageDerivativesTestCase(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media.name))
+        cache.clear()
+        self.user = User.objects.create_user(username='ImageTester', password='qwerty')
+
+    def upload(self, color='red'):
+        output = io.BytesIO()
+        Image.new('RGB', (300, 200), color).save(output, 'PNG')
+        return SimpleUploadedFile('photo.png', output.getvalue(), content_type='image/png')
+
+    def test_original_is_named_by_content_and_scheduled(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            product = Product.objects.create(name='Photo', price='1.00', created_by=self.user, preview=self.upload())
+        self.assertRegex(product.preview.name, r'/[0-9a-f]{40}\.png$')
+        job = Job.objects.get(kind='images.generate_derivatives')
+        self.assertEqual(job.params, {'names': [product.preview.name]})
+
+    def test_many_images_cost_as_one(self):
+        self.user.user_permissions.add(Permission.objects.get(codename='change_product'))
+        self.client.force_login(self.user)
+        product = Product.objects.create(name='Photo', price='1000', created_by=self.user)
+        with override('ru'):
+            url = reverse('shopapp:products_update', kwargs={'pk': product.pk})
+        data = {'name': 'Photo', 'price': '1000', 'description': 'Фото', 'discount': '10', 'quantity': '1'}
+        queries = []
+        for colors in (['red'], ['green', 'blue', 'white', 'black', 'blue']):
+            with CaptureQueriesContext(connection) as context, self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post(url, {**data, 'images': [self.upload(color) for color in colors]})
+            self.assertEqual(response.status_code, 302)
+            queries.append(len(context))
+        self.assertEqual(queries[0], queries[1])
+        self.assertEqual(product.images.count(), 6)
+        # Одинаковое содержимое хранится одним файлом.
+        self.assertEqual(len({image.image.name for image in product.images.all()}), 5)
+        job = Job.objects.filter(kind='images.generate_derivatives').latest('pk')
+        self.assertEqual(len(job.params['names']), 5)
+
+    def test_derivatives_and_picture(self):
+        product = Product.objects.create(name='Photo', price='1.00', created_by=self.user, preview=self.upload())
+        with override('ru'):
+            url = reverse('shopapp:products_detail', kwargs={'pk': product.pk})
+        response = self.client.get(url)
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, '?src=')
+
+        sizes = generate_derivatives(product.preview.name)
+        self.assertEqual(sizes, {'detail': (100, 67), 'thumb': (40, 27)})
+        key = image_key(product.preview.name)
+        for variant in sizes:
+            for fmt in ('webp', 'jpeg'):
+                self.assertTrue(product.preview.storage.exists(derivative_name(key, variant, fmt)))
+        response = self.client.get(url)
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, derivative_name(key, 'detail', 'webp') + ' 100w')
+
+    def test_on_demand_view(self):
+        product = Product.objects.create(name='Photo', price='1.00', created_by=self.user, preview=self.upload())
+        with override('ru'):
+            url = reverse('image_derivative', kwargs={'variant': 'thumb', 'fmt': 'webp'})
+        response = self.client.get(url, {'src': get_signer().sign(product.preview.name)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/webp')
+        self.assertIn('immutable', response['Cache-Control'])
+        response = self.client.get(url, {'src': product.preview.name + ':bad'})
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class ConditionalRequestsTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='ConditionalTester', password='qwerty')
+        cls.laptop = Product.objects.create(name='Laptop', price='100.00', created_by=cls.user)
+        cls.phone = Product.objects.create(name='Phone', price='50.00', created_by=cls.user)
+        cls.order = Order.objects.create(delivery_address='TestStreet', user=cls.user)
+        cls.order.products.add(cls.laptop)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def assertRevalidates(self, url, change):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        etag = response['ETag']
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def rename(self, product, name):
+        def change():
+            product.name = name
+            product.save()
+        return change
+
+    def test_product_pages(self):
+        with override('ru'):
+            detail = reverse('shopapp:products_detail', kwargs={'pk': self.laptop.pk})
+        self.assertRevalidates(detail, self.rename(self.laptop, 'Laptop 2'))
+        self.assertRevalidates(reverse('shopapp:product-detail', kwargs={'pk': self.laptop.pk}),
+                               self.rename(self.laptop, 'Laptop 3'))
+
+        def delete_phone():
+            self.phone.delete()
+            cache.clear()  # истек кэш страницы (cache_page)
+
+        self.assertRevalidates(reverse('shopapp:product-list'), delete_phone)
+
+    def test_order_pages(self):
+        with override('ru'):
+            detail = reverse('shopapp:orders_detail', kwargs={'pk': self.order.pk})
+        self.assertRevalidates(detail, self.rename(self.laptop, 'Laptop 2'))
+        self.assertRevalidates(reverse('shopapp:order-detail', kwargs={'pk': self.order.pk}),
+                               lambda: self.order.products.add(self.phone))
+        updated_at = Order.objects.get(pk=self.order.pk).updated_at
+        self.assertGreater(updated_at, self.order.updated_at)
+
+    def test_export_is_not_rendered_for_fresh_etag(self):
+        with override('ru'):
+            url = reverse('shopapp:products_export')
+        response = self.client.get(url)
+        self.assertTrue(response.streaming)
+        etag = response['ETag']
+        b''.join(response.streaming_content)
+        response = self.client.get(url, headers={'If-None-Match': etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertRevalidates(url, self.rename(self.phone, 'Phone 2'))
+
+
+@override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+class FragmentCacheTestCase(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_superuser(username='FragmentTester', password='qwerty')
+        cls.laptop = Product.objects.create(name='Laptop', price='100.00', created_by=cls.user)
+        cls.phone = Product.objects.create(name='Phone', price='50.00', created_by=cls.user)
+        cls.order = Order.objects.create(delivery_address='TestStreet', user=cls.user)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def product_queries(self, url):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response, [query for query in queries if 'shopapp_product' in query['sql']]
+
+    def test_cached_table_skips_query_and_rendering(self):
+        with override('ru'):
+            url = reverse('shopapp:products_list')
+        response, queries = self.product_queries(url)
+        self.assertContains(response, 'Laptop')
+        self.assertEqual(len(queries), 1)
+        response, queries = self.product_queries(url)
+        self.assertContains(response, 'Laptop')
+        self.assertEqual(queries, [])
+
+    def test_save_invalidates_table_and_row(self):
+        with override('ru'):
+            url = reverse('shopapp:products_list')
+        self.client.get(url)
+        self.laptop.name = 'Laptop 2'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.laptop.save()
+        response, queries = self.product_queries(url)
+        self.assertContains(response, 'Laptop 2')
+        self.assertEqual(len(queries), 1)
+
+    def test_related_save_invalidates_order_row(self):
+        with override('ru'):
+            url = reverse('shopapp:orders_list')
+        self.assertContains(self.client.get(url), 'FragmentTester')
+        self.user.first_name = 'Иван'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        self.assertContains(self.client.get(url), 'Иван')
+
+    def test_language_is_part_of_key(self):
+        for language in ('ru', 'en'):
+            with self.subTest(language=language), override(language):
+                response = self.client.get(reverse('shopapp:products_list'))
+                self.assertContains(response, reverse('shopapp:products_detail', kwargs={'pk': self.laptop.pk}))
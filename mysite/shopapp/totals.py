@@ -0,0 +1,82 @@
+"""
+Денормализованные итоги заказов: Order.total_price и Order.products_count.
+
+Итоги пересчитываются одним UPDATE с подзапросами по промежуточной
+таблице только для затронутых заказов: при изменении состава заказа
+(m2m_changed), цены продукта или его удалении. Полный пересчет
+выполняет команда rebuild_order_totals. UPDATE обновляет и Order.updated_at,
+по которому считаются валидаторы условных запросов (mysite.conditional).
+"""
+from decimal import Decimal
+from typing import Iterable
+
+from django.db.models import Count, DecimalField, OuterRef, QuerySet, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import Order, Product
+
+
+def refresh_order_totals(orders: QuerySet) -> int:
+    links = (
+        Order.products.through.objects
+        .filter(order_id=OuterRef("pk"))
+        .order_by()
+        .values("order_id")
+    )
+    total = links.annotate(total=Sum("product__price")).values("total")
+    count = links.annotate(count=Count("product_id")).values("count")
+    return orders.update(
+        total_price=Coalesce(Subquery(total), Value(Decimal(0)), output_field=DecimalField()),
+        products_count=Coalesce(Subquery(count), Value(0)),
+        updated_at=timezone.now(),
+    )
+
+
+def refresh_orders(order_ids: Iterable[int]) -> None:
+    order_ids = list(order_ids)
+    if order_ids:
+        refresh_order_totals(Order.objects.filter(pk__in=order_ids))
+
+
+@receiver(m2m_changed, sender=Order.products.through)
+def order_products_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ("post_add", "post_remove", "post_clear"):
+            refresh_orders([instance.pk])
+        return
+    # Изменение со стороны продукта: product.orders.add(...) и т.п.
+    if action == "pre_clear":
+        instance._cleared_order_ids = list(instance.orders.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove"):
+        refresh_orders(pk_set)
+    elif action == "post_clear":
+        refresh_orders(getattr(instance, "_cleared_order_ids", []))
+
+
+@receiver(pre_save, sender=Product)
+def product_price_pre_save(sender, instance: Product, raw, update_fields=None, **kwargs):
+    instance._price_changed = (
+        not raw
+        and instance.pk is not None
+        and (update_fields is None or "price" in update_fields)
+        and Product.objects.filter(pk=instance.pk).exclude(price=instance.price).exists()
+    )
+
+
+@receiver(post_save, sender=Product)
+def product_price_changed(sender, instance: Product, **kwargs):
+    if getattr(instance, "_price_changed", False):
+        refresh_order_totals(Order.objects.filter(products=instance))
+
+
+@receiver(pre_delete, sender=Product)
+def product_pre_delete(sender, instance: Product, **kwargs):
+    instance._deleted_order_ids = list(instance.orders.values_list("pk", flat=True))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance: Product, **kwargs):
+    refresh_orders(getattr(instance, "_deleted_order_ids", []))
@@ -54,7 +54,7 @@ urlpatterns = [
     path("orders/<int:pk>/delete/", OrderDeleteView.as_view(), name="orders_delete"),
 
     path("user/<int:pk>/orders/", UserOrdersListView.as_view(), name="user_orders"),
-    path("user/<int:pk>/orders/export/", UserOrdersDataExportView.as_view(), name="user_orders"),
+    path("user/<int:pk>/orders/export/", UserOrdersDataExportView.as_view(), name="user_orders_export"),
 
     path("api/", include(routers.urls)),
 ]
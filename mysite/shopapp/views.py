@@ -1,17 +1,16 @@
 """
 Наборы представлений интернет-магазина по товарам и заказам.
 """
-from csv import DictWriter
+from functools import partial
 from timeit import default_timer
 import logging
 
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.contrib.auth.models import Group, User
-from django.contrib.gis.feeds import Feed
 from django.core.exceptions import PermissionDenied
-from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, JsonResponse
-from django.shortcuts import render, reverse, get_object_or_404
-from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse, HttpResponseRedirect, StreamingHttpResponse
+from django.shortcuts import aget_object_or_404, render, reverse, get_object_or_404
+from django.template.response import TemplateResponse
 from django.utils.decorators import method_decorator
 from django.urls import reverse_lazy
 from django.views import View
@@ -28,10 +27,34 @@ from drf_spectacular.utils import extend_schema, OpenApiResponse
 from rest_framework.request import Request
 from rest_framework.decorators import action
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.filters import SearchFilter, OrderingFilter
-
+from rest_framework.filters import OrderingFilter
+
+from mysite.conditional import (
+    aconditional_response,
+    conditional_response,
+    not_modified,
+    set_validators,
+    versions_validators,
+)
+from mysite.feeds import AsyncFeed
+from mysite.images import store_images
+from mysite.model_versions import aget_versions_key
+from mysite.querycount import query_budget
+
+from .exports import (
+    EXPORT_CHUNK_SIZE,
+    aget_cached_export,
+    aiter_json_list,
+    is_async_request,
+    iter_csv_rows,
+    iter_json_list,
+    orders_json_chunks,
+    stream_export,
+)
 from .forms import GroupForm, OrderForm, ProductCreateForm, ProductUpdateForm
 from .models import Order, Product, ProductImage
+from .pagination import OptionalKeysetPagination
+from .search import ProductFullTextSearchFilter
 from .serializers import ProductSerializer, OrderSerializer
 
 
@@ -69,9 +92,11 @@ class GroupListView(ListView):
     context_object_name = "groups"
 
 
-class ProductListView(ListView):
+@query_budget(5)
+class ProductListView(View):
     """
-    Класс отображения продуктов
+    Класс отображения продуктов, асинхронный: продукты читаются асинхронным ORM,
+    шаблон рендерится обработчиком после выхода из представления
     template_name: String - Шаблон отрисовки HTML кода
     queryset: Class - Передает значение archived=False, что прекращает отображения продуктов с таким флагом
     context_object_name: String - Имя переменной в шаблоне
@@ -80,6 +105,10 @@ class ProductListView(ListView):
     queryset = Product.objects.filter(archived=False)
     context_object_name = "products"
 
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        # QuerySet выполняется при рендере, только если таблица не в кэше фрагментов.
+        return TemplateResponse(request, self.template_name, {self.context_object_name: self.queryset.all()})
+
 
 class GroupCreateView(PermissionRequiredMixin, CreateView):
     # permission_required =
@@ -96,16 +125,19 @@ class GroupCreateView(PermissionRequiredMixin, CreateView):
     success_url = reverse_lazy('shopapp:groups_list')
 
 
-class LatestProductsView(Feed):
+class LatestProductsView(AsyncFeed):
     title = "Последние продукты"
     description = "Последние добавленные товары в магазине"
     link = reverse_lazy('shopapp:products_list')
-
-    def items(self):
-        return Product.objects.filter(archived=False).sort_by("-created_at")[:5]
+    queryset = (
+        Product.objects
+        .filter(archived=False)
+        .only("pk", "name", "description", "created_at")
+        .order_by("-created_at", "-pk")[:5]
+    )
 
     def item_title(self, item):
-        return item.title
+        return item.name
 
     def item_description(self, item):
         return item.description[:100] + "..."
@@ -132,17 +164,26 @@ class ProductCreateView(PermissionRequiredMixin, CreateView):
         return response
 
 
-class ProductDetailView(DetailView):
+@query_budget(5)
+class ProductDetailView(View):
     """
-    Класс просмотра подробностей о продукте
+    Класс просмотра подробностей о продукте, асинхронный,
+    с условными запросами по Product.updated_at
     template_name: String - Шаблон отрисовки HTML кода
-    model: Class[models.Model] - Модель описания данных
+    queryset: Class - Продукт вместе с изображениями
     context_object_name: String - Имя переменной в шаблоне
     """
     template_name = "shopapp/products-detail.html"
     queryset = Product.objects.prefetch_related("images")
     context_object_name = "product"
 
+    async def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        return await aconditional_response(request, Product.objects.filter(pk=pk), partial(self.render, request, pk))
+
+    async def render(self, request: HttpRequest, pk: int) -> HttpResponse:
+        product = await aget_object_or_404(self.queryset, pk=pk)
+        return TemplateResponse(request, self.template_name, {self.context_object_name: product})
+
 
 class ProductUpdateView(PermissionRequiredMixin, UpdateView):
     """
@@ -172,11 +213,8 @@ class ProductUpdateView(PermissionRequiredMixin, UpdateView):
 
     def form_valid(self, form):
         response = super().form_valid(form)
-        for image in form.files.getlist("images"):
-            ProductImage.objects.create(
-                product=self.object,
-                image=image,
-            )
+        images = [ProductImage(product=self.object, image=image) for image in form.files.getlist("images")]
+        ProductImage.objects.bulk_create(store_images(images, "image"))
         return response
 
 
@@ -205,23 +243,17 @@ class ProductDeleteView(PermissionRequiredMixin, DeleteView):
 
 
 class ProductDataExportView(View):
-    def get(self, request: HttpRequest) -> JsonResponse:
-        cache_key = "products_data_export"
-        products_data = cache.get(cache_key)
-        if products_data is None:
-            products = Product.objects.order_by("pk").all()
-            products_data = [
-                {
-                    "pk": product.pk,
-                    "name": product.name,
-                    "price": product.price,
-                    "archived": product.archived,
-
-                }
-                for product in products
-            ]
-        cache.set(cache_key, products_data, 300)
-        return JsonResponse({"products": products_data})
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        cache_key = f"products_data_export:{await aget_versions_key(Product)}"
+        cached_response = await aget_cached_export(request, cache_key)
+        if cached_response is not None:
+            return cached_response
+        products = Product.objects.order_by("pk").values("pk", "name", "price", "archived")
+        if is_async_request(request):
+            chunks = aiter_json_list("products", products.aiterator(chunk_size=EXPORT_CHUNK_SIZE))
+        else:
+            chunks = iter_json_list("products", products.iterator(chunk_size=EXPORT_CHUNK_SIZE))
+        return stream_export(chunks, cache_key)
 
 
 @extend_schema(description="Просмотр продуктов CRUD")
@@ -235,8 +267,9 @@ class ProductSetView(ModelViewSet):
     """
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    pagination_class = OptionalKeysetPagination
     filter_backends = [
-        SearchFilter,
+        ProductFullTextSearchFilter,
         DjangoFilterBackend,
         OrderingFilter,
     ]
@@ -257,9 +290,17 @@ class ProductSetView(ModelViewSet):
         "discount",
     ]
 
-    @method_decorator(cache_page(120))
     def list(self, request, *args, **kwargs):
-        return super().list(request, *args, **kwargs)
+        self.validators = versions_validators(request, Product)
+        response = not_modified(request, self.validators)
+        if response is not None:
+            return response
+        return self.cached_list(request, *args, **kwargs)
+
+    @method_decorator(cache_page(120))
+    def cached_list(self, request, *args, **kwargs):
+        # ETag сохраняется в кэш вместе с телом, к которому относится.
+        return set_validators(super().list(request, *args, **kwargs), self.validators)
 
     @extend_schema(
         summary="Выдача одного продукта по ID",
@@ -270,13 +311,11 @@ class ProductSetView(ModelViewSet):
         },
     )
     def retrieve(self, request, *args, **kwargs):
-        return super().retrieve(*args, **kwargs)
+        queryset = self.get_queryset().filter(pk=kwargs[self.lookup_field])
+        return conditional_response(request, queryset, partial(super().retrieve, request, *args, **kwargs))
 
     @action(methods=['get'], detail=False)
     def download_csv(self, request: Request):
-        response = HttpResponse(content_type="text/csv")
-        filename = "products-export.csv"
-        response["Content-Disposition"] = f'attachment; filename={filename}'
         queryset = self.filter_queryset(self.get_queryset())
         fields = [
             "name",
@@ -285,35 +324,26 @@ class ProductSetView(ModelViewSet):
             "discount",
             "quantity",
         ]
-        queryset = queryset.only(*fields)
-        writer = DictWriter(response, fieldnames=fields)
-        writer.writeheader()
-
-        for product in queryset:
-            writer.writerow({
-                field: getattr(product, field)
-                for field in fields
-            })
-
+        response = StreamingHttpResponse(iter_csv_rows(queryset, fields), content_type="text/csv")
+        filename = "products-export.csv"
+        response["Content-Disposition"] = f'attachment; filename={filename}'
         return response
 
 
+@query_budget(3)
 class OrderListView(LoginRequiredMixin, ListView):
     """
     Класс отображения заказов
     template_name: String - Шаблон отрисовки HTML кода
-    queryset: Tuple[Class] - Достает из базы данных заказы со связями на их пользователя и продукты
+    queryset: Class - Достает из базы данных заказы со связью на их пользователя
     context_object_name: String - Имя переменной в шаблоне
     """
     template_name = "shopapp/orders-list.html"
-    queryset = (
-        Order.objects
-        .select_related("user")
-        .prefetch_related("products")
-    )
+    queryset = Order.objects.select_related("user")
     context_object_name = "orders"
 
 
+@query_budget(5)
 class UserOrdersListView(PermissionRequiredMixin, LoginRequiredMixin, ListView):
     template_name = "shopapp/orders-user-orders.html"
     model = Order
@@ -357,9 +387,11 @@ class OrderCreateView(LoginRequiredMixin, CreateView):
         return response
 
 
+@query_budget(7)
 class OrderDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     """
-    Класс просмотра подробностей о заказе
+    Класс просмотра подробностей о заказе с условными запросами
+    по времени изменения заказа и его продуктов
     template_name: String - Шаблон отрисовки HTML кода
     queryset: Tuple[Class] - Достает из базы данных заказы со связями на их пользователя и продукты
     context_object_name: String - Имя переменной в шаблоне
@@ -373,6 +405,14 @@ class OrderDetailView(LoginRequiredMixin, PermissionRequiredMixin, DetailView):
     )
     context_object_name = "orders"
 
+    def get(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            Order.objects.filter(pk=kwargs["pk"]),
+            partial(super().get, request, *args, **kwargs),
+            fields=("updated_at", "products__updated_at"),
+        )
+
 
 class OrderUpdateView(UpdateView):
     """
@@ -409,63 +449,28 @@ class OrderDeleteView(DeleteView):
 
 
 class OrderDataExportView(View):
-    def get(self, request: HttpRequest) -> JsonResponse:
-        orders = Order.objects.order_by("pk").all()
-        orders_data = [
-            {
-                "pk": order.pk,
-                "user": order.user.username,
-                "delivery_address": order.delivery_address,
-                "created_at": order.created_at.strftime("%Y-%m-%d"),
-                "promocode": order.promocode,
-                "products": [
-                    {
-                        "pk": product.pk,
-                        "name": product.name,
-                        "price": product.price,
-                        "archived": product.archived,
-                    }
-                    for product in order.products.all()
-                ]
-            }
-            for order in orders
-        ]
-        return JsonResponse({"orders": orders_data})
+    async def get(self, request: HttpRequest) -> HttpResponse:
+        cache_key = f"orders_data_export:{await aget_versions_key(Order, Product, User)}"
+        cached_response = await aget_cached_export(request, cache_key)
+        if cached_response is not None:
+            return cached_response
+        return stream_export(orders_json_chunks(request, Order.objects.all()), cache_key)
 
 
 class UserOrdersDataExportView(View):
-    def get(self, request: HttpRequest, pk: int) -> JsonResponse:
-        cache_key = f"users_orders_export_{pk}"
-        orders_data = cache.get(cache_key)
-        if orders_data is None:
-            user = get_object_or_404(User, pk=pk)
-            orders = Order.objects.filter(user=user).order_by("pk").all()
-            orders_data = [
-                {
-                    "pk": order.pk,
-                    "user": order.user.username,
-                    "delivery_address": order.delivery_address,
-                    "created_at": order.created_at.strftime("%Y-%m-%d"),
-                    "promocode": order.promocode,
-                    "products": [
-                        {
-                            "pk": product.pk,
-                            "name": product.name,
-                            "price": product.price,
-                            "archived": product.archived,
-                        }
-                        for product in order.products.all()
-                    ]
-                }
-                for order in orders
-            ]
-            cache.set(cache_key, orders_data, 300)
-        return JsonResponse({"orders": orders_data})
+    async def get(self, request: HttpRequest, pk: int) -> HttpResponse:
+        cache_key = f"users_orders_export:{pk}:{await aget_versions_key(Order, Product, User)}"
+        cached_response = await aget_cached_export(request, cache_key)
+        if cached_response is not None:
+            return cached_response
+        user = await aget_object_or_404(User, pk=pk)
+        return stream_export(orders_json_chunks(request, Order.objects.filter(user=user)), cache_key)
 
 
 class OrderSetView(ModelViewSet):
     queryset = Order.objects.all()
     serializer_class = OrderSerializer
+    pagination_class = OptionalKeysetPagination
     filter_backends = [
         DjangoFilterBackend,
         OrderingFilter,
@@ -474,10 +479,25 @@ class OrderSetView(ModelViewSet):
         "delivery_address",
         "promocode",
     ]
-    filterset_fields = [
-        "delivery_address",
-        "promocode",
-    ]
+    filterset_fields = {
+        "delivery_address": ["exact"],
+        "promocode": ["exact"],
+        "total_price": ["exact", "gte", "lte"],
+        "products_count": ["exact", "gte", "lte"],
+    }
     ordering_fields = [
         "created_at",
+        "total_price",
+        "products_count",
     ]
+
+    def list(self, request, *args, **kwargs):
+        validators = versions_validators(request, Order, Product)
+        response = not_modified(request, validators)
+        if response is not None:
+            return response
+        return set_validators(super().list(request, *args, **kwargs), validators)
+
+    def retrieve(self, request, *args, **kwargs):
+        queryset = self.get_queryset().filter(pk=kwargs[self.lookup_field])
+        return conditional_response(request, queryset, partial(super().retrieve, request, *args, **kwargs))